@@ -0,0 +1,64 @@
+"""Benchmark of MetricsCalculator.calculate_rolling_ratings
+
+Run from the repo root: python benchmarks/bench_calculate_rolling_ratings.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from src.wallet_analyzer_eth import MetricsCalculator
+
+
+def make_swap_txs_df(swaps_number: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Create random buy/sell swaps of swaps_number / 5 tokens over 2 years
+
+    :param swaps_number: number of swaps
+    :param seed: random seed
+    :return: dataframe like WalletAnalyzer.get_swap_txs
+    """
+    rng = np.random.default_rng(seed)
+    tokens = np.array([f'0x{i:040x}' for i in range(max(1, swaps_number // 5))])
+
+    return pd.DataFrame({
+        'blockNumber': np.arange(swaps_number),
+        'dateTime': pd.to_datetime(1700000000 + np.sort(rng.integers(0, 2 * 365 * 86400, swaps_number)), unit='s'),
+        'tokenCa': rng.choice(tokens, swaps_number),
+        'swapType': rng.choice(['swap_buy', 'swap_sell'], swaps_number),
+        'swapEth': rng.random(swaps_number),
+        'tokenValue': rng.random(swaps_number) * 10 ** 6,
+    })
+
+
+def legacy_rolling_columns(swap_txs_df: pd.DataFrame) -> None:
+    """Quadratic versions of trades_last_7d and of the number of tokens with 90% sold used before"""
+    days = (swap_txs_df['dateTime'] - swap_txs_df['dateTime'].min()).dt.days
+    days.expanding().apply(lambda window: len(window[window >= window.iloc[-1] - 7]))
+
+    sold_more_than_90p = pd.Series(np.random.default_rng(0).random(len(swap_txs_df)) < 0.3)
+    [swap_txs_df['tokenCa'].iloc[:i + 1][sold_more_than_90p.iloc[:i + 1]].nunique()
+     for i in range(len(swap_txs_df))]
+
+
+def timeit(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(f"{'swaps':>8} {'ratings [s]':>12} {'legacy [s]':>11}")
+    for swaps_number in [1_000, 10_000, 100_000]:
+        swap_txs_df = make_swap_txs_df(swaps_number)
+        metrics_calculator = MetricsCalculator(swap_txs_df, swap_txs_df, pd.DataFrame())
+        ratings_time = timeit(metrics_calculator.calculate_rolling_ratings)
+
+        # The legacy version is O(N^2), only run it for the small sizes
+        legacy_time = timeit(legacy_rolling_columns, swap_txs_df) if swaps_number <= 10_000 else float('nan')
+
+        print(f"{swaps_number:>8} {ratings_time:>12.3f} {legacy_time:>11.3f}")
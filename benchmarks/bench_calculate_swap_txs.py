@@ -0,0 +1,79 @@
+"""Benchmark of WalletAnalyzer.calculate_swap_txs (hash join of txs with token and internal transactions)
+
+Run from the repo root: python benchmarks/bench_calculate_swap_txs.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from src.wallet_analyzer_eth import WalletAnalyzer
+
+WALLET = '0xcecfce5556a66bf8cb1a9f3005ce5496363a88aa'
+ROUTER = '0x7a250d5630b4cf539739df2c5dacb4c659f2488d'
+
+
+def make_wallet_analyzer(txs_number: int, seed: int = 0) -> WalletAnalyzer:
+    """
+    Create a WalletAnalyzer with random buy/sell swaps (1 token tx per swap, 1 internal tx per sell)
+
+    :param txs_number: number of transactions
+    :param seed: random seed
+    :return: WalletAnalyzer with txs_df, token_txs_df and internal_txs_df set
+    """
+    rng = np.random.default_rng(seed)
+    hashes = np.array([f'0x{i:064x}' for i in range(txs_number)])
+    is_buy = rng.random(txs_number) < 0.5
+
+    wallet_analyzer = WalletAnalyzer(WALLET)
+    wallet_analyzer.txs_df = pd.DataFrame({
+        'hash': hashes,
+        'to': ROUTER,
+        'txType': np.where(is_buy, 'swap_tx_nonzero_value', 'swap_tx_zero_value'),
+        'value': np.where(is_buy, rng.random(txs_number), 0.0),
+    })
+    wallet_analyzer.token_txs_df = pd.DataFrame({
+        'hash': hashes,
+        'to': np.where(is_buy, WALLET, ROUTER),
+        'value': rng.random(txs_number) * 10 ** 6,
+        'tokenName': 'token',
+        'tokenSymbol': 'tkn',
+        'contractAddress': [f'0x{i % 500:040x}' for i in range(txs_number)],
+        'tokenDecimal': 18,
+    })
+    wallet_analyzer.internal_txs_df = pd.DataFrame({
+        'hash': hashes[~is_buy],
+        'to': WALLET,
+        'value': rng.random((~is_buy).sum()),
+    })
+
+    return wallet_analyzer
+
+
+def legacy_calculate_swap_txs(wallet_analyzer: WalletAnalyzer) -> pd.DataFrame:
+    """Row by row version (DataFrame.apply with get_info_from_token_txs) used before the hash join"""
+    return wallet_analyzer.txs_df.apply(
+        lambda row: wallet_analyzer.get_info_from_token_txs(row['hash'], row['txType'], row['value']), axis=1)
+
+
+def timeit(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(f"{'txs':>8} {'join [s]':>10} {'us/row':>8} {'legacy [s]':>11}")
+    for txs_number in [1_000, 10_000, 100_000, 1_000_000]:
+        wallet_analyzer = make_wallet_analyzer(txs_number)
+        join_time = timeit(wallet_analyzer.calculate_swap_txs)
+
+        # The legacy version is O(N*M), only run it for the small sizes
+        legacy_time = timeit(legacy_calculate_swap_txs, make_wallet_analyzer(txs_number)) \
+            if txs_number <= 10_000 else float('nan')
+
+        print(f"{txs_number:>8} {join_time:>10.3f} {join_time / txs_number * 10 ** 6:>8.2f} {legacy_time:>11.3f}")
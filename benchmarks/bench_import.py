@@ -0,0 +1,176 @@
+"""Benchmark of the cold start: every target runs in a new interpreter (python -X importtime), the wall time and the
+import time of the modules are saved to a JSON file, so the results of two commits can be compared
+
+Run from the repo root:
+    python benchmarks/bench_import.py -o benchmarks/results/import-$(git rev-parse --short HEAD).json
+    python benchmarks/bench_import.py --compare benchmarks/results/import-<base>.json
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+from bench_pipeline import REGRESSION_RATIO, format_number, get_commit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Code run in a new interpreter per target (the dashboard imports the analyzers without the src prefix)
+TARGETS = {
+    'python': 'pass',
+    'src.wallet_analyzer_eth': 'import src.wallet_analyzer_eth',
+    'src.wallet_analyzer_sol': 'import src.wallet_analyzer_sol',
+    'src.batch_runner': 'import src.batch_runner',
+    'wallet_analyzer_dashboard': 'import wallet_analyzer_dashboard',
+    'WalletAnalyzer x100': "from src.wallet_analyzer_eth import WalletAnalyzer\n"
+                           "for _ in range(100): WalletAnalyzer('0xcecfce5556a66bf8cb1a9f3005ce5496363a88aa')",
+}
+
+# Number of the slowest imported packages shown per target
+SLOWEST_NUMBER = 5
+
+
+def parse_importtime(output: str) -> tuple:
+    """
+    Parse the -X importtime output
+
+    :param output: stderr of the interpreter
+    :return: tuple of the total import seconds and dict top level package -> seconds spent in its modules
+    """
+    total_seconds = 0
+    packages = {}
+
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented
+        if not name.startswith('  '):
+            total_seconds += int(cumulative) / 10 ** 6
+
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_time) / 10 ** 6
+
+    return total_seconds, packages
+
+
+def run_target(code: str) -> tuple:
+    """
+    Run the code in a new interpreter
+
+    :param code: Python code
+    :return: tuple of the wall time, total import seconds, dict package -> import seconds and the error (None if it
+        was run)
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT_DIR, os.path.join(ROOT_DIR, 'src')]
+                                        + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                             env=env, cwd=ROOT_DIR)
+    seconds = time.perf_counter() - start
+
+    if process.returncode != 0:
+        return None, None, {}, process.stderr.strip().splitlines()[-1]
+
+    return (seconds, ) + parse_importtime(process.stderr) + (None, )
+
+
+def run_benchmark(targets: list, repeat: int = 5) -> dict:
+    """
+    Run every target repeat times, the median times are kept
+
+    :param targets: names of the TARGETS
+    :param repeat: number of runs per target
+    :return: dict with the metadata and the results per target
+    """
+    report = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': {},
+    }
+
+    for target in targets:
+        runs = [run_target(TARGETS[target]) for _ in range(repeat)]
+        errors = [error for _, _, _, error in runs if error is not None]
+
+        if errors:
+            print(f"{target} failed: {errors[0]}")
+            report['results'][target] = {'seconds': None, 'importSeconds': None, 'slowest': []}
+            continue
+
+        packages = {package: statistics.median(run[2].get(package, 0) for run in runs) for package in runs[0][2]}
+        slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_NUMBER]
+
+        report['results'][target] = {
+            'seconds': statistics.median(run[0] for run in runs),
+            'importSeconds': statistics.median(run[1] for run in runs),
+            'slowest': [[package, seconds] for package, seconds in slowest],
+        }
+
+    return report
+
+
+def print_report(report: dict, base_report: dict = None) -> None:
+    """
+    Print the results as a table (with the ratio to the base results if given)
+
+    :param report: dict created by run_benchmark
+    :param base_report: results of another commit
+    :return: None
+    """
+    print(f"commit {report['commit']}" + (f" vs {base_report['commit']}" if base_report else ""))
+    print(f"{'target':<28} {'wall [s]':>9} {'import [s]':>10}" + (f" {'base [s]':>9} {'ratio':>6}"
+                                                                  if base_report else "") + "  slowest imports")
+
+    base_results = (base_report or {}).get('results', {})
+    for target, result in report['results'].items():
+        line = f"{target:<28} {format_number(result['seconds'], 3):>9} {format_number(result['importSeconds'], 3):>10}"
+
+        if base_report:
+            base_seconds = base_results.get(target, {}).get('seconds')
+            ratio = result['seconds'] / base_seconds if result['seconds'] and base_seconds else None
+            line += f" {format_number(base_seconds, 3):>9} {format_number(ratio, 2):>6}"
+
+        line += "  " + ", ".join(f"{package} {seconds:.3f}" for package, seconds in result['slowest'])
+
+        if base_report and ratio is not None and ratio > REGRESSION_RATIO:
+            line += "  <- slower"
+
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the import time of the analyzer modules")
+    parser.add_argument('--targets', nargs='+', default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument('--repeat', type=int, default=5, help="number of runs per target")
+    parser.add_argument('-o', '--output', default=None, help="JSON file for the results")
+    parser.add_argument('--compare', default=None, help="JSON file with the results of another commit")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.targets, args.repeat)
+
+    base_report = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            base_report = json.load(file)
+
+    print_report(report, base_report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Benchmark of the whole pipeline: every WalletAnalyzer stage and every MetricsCalculator method on synthetic wallets
+of growing size. Wall time and peak memory (tracemalloc, measured in a separate run) are saved to a JSON file, so the
+results of two commits can be compared
+
+Run from the repo root:
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000 1000000 -o benchmarks/results/$(git rev-parse --short HEAD).json
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 --compare benchmarks/results/<base>.json
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.wallet_analyzer_eth import MetricsCalculator, WalletAnalyzer
+from synthetic_wallet import SyntheticDownloader, SyntheticWallet
+
+# MetricsCalculator methods (win_ratio_percent changes the token_trades_df, so it is the last one)
+METRICS = ['first_tx_datetime', 'last_tx_datetime', 'first_trade_datetime', 'last_trade_datetime',
+           'total_swaps_number', 'traded_tokens_number', 'avg_trade_result', 'final_trade_result', 'avg_trade_size',
+           'median_trade_size', 'snipes_percent', 'trades_per_day', 'cumulated_daily_trading_result',
+           'calculate_total_values', 'calculate_rolling_ratings', 'win_ratio_percent']
+
+# Stages slower than REGRESSION_RATIO * base time are marked in the comparison
+REGRESSION_RATIO = 1.2
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def enrich_txs(wallet_analyzer: WalletAnalyzer) -> None:
+    """Enrichment stage (separate steps in the commits before WalletAnalyzer.enrich_txs)"""
+    if hasattr(wallet_analyzer, 'enrich_txs'):
+        wallet_analyzer.enrich_txs()
+    else:
+        wallet_analyzer.check_token_transfers()
+        wallet_analyzer.check_internal_transfers()
+        wallet_analyzer.check_snipers()
+
+
+def get_stages(synthetic_wallet: SyntheticWallet) -> list:
+    """
+    Stages of the pipeline in the order of the dashboard, every stage uses the results of the previous ones
+
+    :param synthetic_wallet: wallet data
+    :return: list of (name, function) tuples
+    """
+    state = {}
+
+    def create():
+        # The benchmark does not change the local gas baseline
+        state['wallet_analyzer'] = WalletAnalyzer(synthetic_wallet.wallet, gas_baseline=False)
+        state['wallet_analyzer'].data_downloader = SyntheticDownloader(synthetic_wallet)
+
+    def create_metrics_calculator():
+        wallet_analyzer = state['wallet_analyzer']
+        state['metrics_calculator'] = MetricsCalculator(state['swap_txs_df'], wallet_analyzer.txs_df,
+                                                        state['token_trades_df'])
+
+    stages = [
+        ('WalletAnalyzer.__init__', create),
+        ('get_data', lambda: state['wallet_analyzer'].get_data()),
+        ('calculate_swap_txs', lambda: state['wallet_analyzer'].calculate_swap_txs()),
+        ('enrich_txs', lambda: enrich_txs(state['wallet_analyzer'])),
+        ('get_swap_txs', lambda: state.update(swap_txs_df=state['wallet_analyzer'].get_swap_txs())),
+        ('calculate_tokens_txs', lambda: state.update(token_trades_df=state['wallet_analyzer'].calculate_tokens_txs())),
+        ('calculate_tokens_txs (filters)',
+         lambda: state['wallet_analyzer'].calculate_tokens_txs(True, True, True)),
+        ('MetricsCalculator.__init__', create_metrics_calculator),
+    ]
+    stages += [(f'MetricsCalculator.{method}', lambda method=method: getattr(state['metrics_calculator'], method)())
+               for method in METRICS]
+
+    return stages
+
+
+def run_stages(synthetic_wallet: SyntheticWallet, measure_memory: bool = False) -> dict:
+    """
+    Run all the stages once
+
+    :param synthetic_wallet: wallet data
+    :param measure_memory: whether to measure the peak memory of every stage with tracemalloc (slower)
+    :return: dict stage -> seconds or peak MB
+    """
+    results = {}
+
+    for name, stage in get_stages(synthetic_wallet):
+        if measure_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        try:
+            stage()
+        except (ZeroDivisionError, KeyError, IndexError, ValueError, TypeError, AttributeError) as error:
+            print(f"{name} failed: {type(error).__name__}: {error}")
+            results[name] = None
+            continue
+        finally:
+            seconds = time.perf_counter() - start
+            if measure_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+        results[name] = peak / 1024 ** 2 if measure_memory else seconds
+
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmark(sizes: list, measure_memory: bool = True, seed: int = 0) -> dict:
+    """
+    Benchmark all the stages for every size (number of normal txs, the other tables are generated with the default
+    shares of SyntheticWallet)
+
+    :param sizes: numbers of txs
+    :param measure_memory: whether to measure the peak memory (second run of every size)
+    :param seed: random seed of the data
+    :return: dict with the metadata and the results per size and stage
+    """
+    report = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': {},
+    }
+
+    for size in sizes:
+        synthetic_wallet = SyntheticWallet(size, seed=seed)
+        seconds = run_stages(synthetic_wallet)
+        memory = run_stages(synthetic_wallet, measure_memory=True) if measure_memory else {}
+
+        report['results'][str(size)] = {name: {'seconds': seconds[name], 'peakMB': memory.get(name)}
+                                        for name in seconds}
+
+    return report
+
+
+def print_report(report: dict, base_report: dict = None) -> None:
+    """
+    Print the results as a table (with the ratio to the base results if given)
+
+    :param report: dict created by run_benchmark
+    :param base_report: results of another commit
+    :return: None
+    """
+    for size, stages in report['results'].items():
+        print(f"\n{size} txs (commit {report['commit']}"
+              + (f" vs {base_report['commit']})" if base_report else ")"))
+        print(f"{'stage':<48} {'time [s]':>9} {'peak [MB]':>10}" + (f" {'base [s]':>9} {'ratio':>6}"
+                                                                     if base_report else ""))
+
+        base_stages = (base_report or {}).get('results', {}).get(size, {})
+        for name, result in stages.items():
+            line = f"{name:<48} {format_number(result['seconds'], 3):>9} {format_number(result['peakMB'], 1):>10}"
+
+            if base_report:
+                base_seconds = base_stages.get(name, {}).get('seconds')
+                ratio = result['seconds'] / base_seconds if result['seconds'] and base_seconds else None
+                line += f" {format_number(base_seconds, 3):>9} {format_number(ratio, 2):>6}"
+                if ratio is not None and ratio > REGRESSION_RATIO:
+                    line += "  <- slower"
+
+            print(line)
+
+
+def format_number(value, decimals: int) -> str:
+    return '-' if value is None else f"{value:.{decimals}f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark of the WalletAnalyzer and MetricsCalculator stages")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="numbers of txs")
+    parser.add_argument('-o', '--output', default=None, help="JSON file for the results")
+    parser.add_argument('--compare', default=None, help="JSON file with the results of another commit")
+    parser.add_argument('--no-memory', action='store_true', help="do not measure the peak memory")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.sizes, not args.no_memory, args.seed)
+
+    base_report = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            base_report = json.load(file)
+
+    print_report(report, base_report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
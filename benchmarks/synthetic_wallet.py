@@ -0,0 +1,258 @@
+"""Synthetic Etherscan-shaped wallet data for the benchmarks (txlist, tokentx and txlistinternal pages with the same
+fields and string values as the API responses)
+
+Swaps via the known routers are paid with ETH or WETH, the swapped tokens are random tokens or stablecoins. Every swap
+has its token transfers (and the internal ETH transfer of the sells), the rest of the token/internal transfers are
+incoming transfers from other wallets
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import yaml
+
+WALLET = '0xcecfce5556a66bf8cb1a9f3005ce5496363a88aa'
+
+CONTRACTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'data',
+                              'contracts.yaml')
+
+# Method ids of the generated txs
+SWAP_ETH_FOR_TOKENS = '0x7ff36ab5'
+SWAP_TOKENS_FOR_ETH = '0x18cbafe5'
+SWAP_TOKENS_FOR_TOKENS = '0x38ed1739'
+APPROVE = '0x095ea7b3'
+
+# Max number of txs in one API page
+PAGE_SIZE = 10000
+
+
+def make_hashes(start: int, number: int) -> np.ndarray:
+    return np.array([f'0x{i:064x}' for i in range(start, start + number)], dtype=object)
+
+
+def make_addresses(start: int, number: int) -> np.ndarray:
+    return np.array([f'0x{i:040x}' for i in range(start, start + number)], dtype=object)
+
+
+def make_wei(rng: np.random.Generator, number: int, max_units: int) -> np.ndarray:
+    """
+    Random values in wei as strings (18 decimals, too big for np.int64 like the API values)
+
+    :param rng: random generator
+    :param number: number of values
+    :param max_units: max value (whole units)
+    :return: array of strings
+    """
+    micro_units = rng.integers(1, max_units * 10 ** 6, number)
+    return np.char.add(micro_units.astype(str), '0' * 12).astype(object)
+
+
+class SyntheticWallet:
+    """
+    Random wallet data with the given sizes and shares
+    """
+    def __init__(self, txs_number: int = 1000, token_txs_number: int = None, internal_txs_number: int = None,
+                 router_share: float = 0.6, weth_share: float = 0.1, stablecoin_share: float = 0.05,
+                 tokens_number: int = None, days: int = 365, seed: int = 0) -> None:
+        """
+        Generate the wallet data
+
+        :param txs_number: number of normal txs
+        :param token_txs_number: number of token transfers (at least 1 per swap, 2 per WETH swap), txs_number by
+            default
+        :param internal_txs_number: number of internal txs (at least 1 per ETH sell), txs_number / 4 by default
+        :param router_share: share of the normal txs that are swaps via the known routers
+        :param weth_share: share of the swaps paid with WETH instead of ETH
+        :param stablecoin_share: share of the swaps of stablecoins
+        :param tokens_number: number of different tokens, txs_number / 10 by default
+        :param days: number of days covered by the txs (ending on 2023-12-31)
+        :param seed: random seed
+        """
+        self.wallet = WALLET
+        self.rng = np.random.default_rng(seed)
+
+        with open(CONTRACTS_FILE, 'r') as file:
+            config = yaml.safe_load(file)
+        self.routers = np.array([router.lower() for router in config['eth']['routers']], dtype=object)
+        self.stablecoins = np.array([stablecoin.lower() for stablecoin in config['eth']['stablecoins']], dtype=object)
+        self.weth = config['eth']['weth'].lower()
+
+        self.tokens = make_addresses(1, max(1, tokens_number or txs_number // 10))
+        self.others = make_addresses(10 ** 6, 1000)
+        self.end_timestamp = 1704067199
+        self.days = days
+
+        self.txs_df, swaps_df = self.make_txs(txs_number, router_share, weth_share, stablecoin_share)
+        self.token_txs_df = self.make_token_txs(swaps_df, token_txs_number if token_txs_number is not None
+                                                else txs_number)
+        self.internal_txs_df = self.make_internal_txs(swaps_df, internal_txs_number if internal_txs_number is not None
+                                                      else txs_number // 4)
+
+    def make_timestamps(self, number: int) -> np.ndarray:
+        """Random timestamps, newest first (like the API pages)"""
+        start_timestamp = self.end_timestamp - self.days * 86400
+        return np.sort(self.rng.integers(start_timestamp, self.end_timestamp, number))[::-1]
+
+    def make_txs(self, txs_number: int, router_share: float, weth_share: float,
+                 stablecoin_share: float) -> tuple:
+        """
+        Normal txs: swaps via the routers, approvals and ETH transfers
+
+        :return: txs dataframe and dataframe with the info about the swaps (hash, timestamp, kind, token)
+        """
+        rng = self.rng
+        timestamps = self.make_timestamps(txs_number)
+        hashes = make_hashes(0, txs_number)
+
+        is_swap = rng.random(txs_number) < router_share
+        is_buy = rng.random(txs_number) < 0.5
+        is_weth = is_swap & (rng.random(txs_number) < weth_share)
+        is_approve = ~is_swap & (rng.random(txs_number) < 0.5)
+        is_eth_in = ~is_swap & ~is_approve & (rng.random(txs_number) < 0.5)
+
+        tokens = np.where(rng.random(txs_number) < stablecoin_share, rng.choice(self.stablecoins, txs_number),
+                          rng.choice(self.tokens, txs_number))
+
+        eth_buy = is_swap & is_buy & ~is_weth
+        eth_values = make_wei(rng, txs_number, 5)
+        values = np.where(eth_buy | (~is_swap & ~is_approve), eth_values, '0')
+
+        method_ids = np.select(
+            [is_weth, is_swap & is_buy, is_swap, is_approve],
+            [SWAP_TOKENS_FOR_TOKENS, SWAP_ETH_FOR_TOKENS, SWAP_TOKENS_FOR_ETH, APPROVE], default='0x')
+
+        # Gas price around 30 gwei, 5% of the txs with a high gas price
+        gas_prices = rng.normal(30, 5, txs_number).clip(1) * 10 ** 9
+        gas_prices[rng.random(txs_number) < 0.05] *= 3
+
+        txs_df = pd.DataFrame({
+            'blockNumber': (timestamps // 12).astype(str),
+            'timeStamp': timestamps.astype(str),
+            'hash': hashes,
+            'nonce': np.arange(txs_number)[::-1].astype(str),
+            'blockHash': hashes,
+            'transactionIndex': rng.integers(0, 300, txs_number).astype(str),
+            'from': np.where(is_eth_in, rng.choice(self.others, txs_number), self.wallet),
+            'to': np.select([is_swap, is_approve, is_eth_in], [rng.choice(self.routers, txs_number), tokens,
+                                                                self.wallet], default=rng.choice(self.others,
+                                                                                                 txs_number)),
+            'value': values,
+            'gas': rng.integers(21000, 500000, txs_number).astype(str),
+            'gasPrice': gas_prices.astype(np.int64).astype(str),
+            'isError': np.where(rng.random(txs_number) < 0.01, '1', '0'),
+            'txreceipt_status': '1',
+            'input': np.char.add(method_ids.astype(str), '0' * 64).astype(object),
+            'contractAddress': '',
+            'cumulativeGasUsed': rng.integers(21000, 30000000, txs_number).astype(str),
+            'gasUsed': rng.integers(21000, 300000, txs_number).astype(str),
+            'confirmations': rng.integers(1, 10 ** 6, txs_number).astype(str),
+            'methodId': method_ids,
+            'functionName': '',
+        })
+
+        swaps_df = pd.DataFrame({
+            'hash': hashes, 'timeStamp': timestamps, 'isBuy': is_buy, 'isWeth': is_weth, 'token': tokens,
+            'router': txs_df['to'], 'ethValue': eth_values,
+        }).loc[is_swap]
+
+        return txs_df, swaps_df
+
+    def make_token_txs(self, swaps_df: pd.DataFrame, token_txs_number: int) -> pd.DataFrame:
+        """
+        Token transfers of the swaps (tokens in for the buys, out for the sells, WETH out/in for the WETH swaps) and
+        incoming transfers from other wallets
+        """
+        rng = self.rng
+        weth_swaps_df = swaps_df.loc[swaps_df['isWeth']]
+        extra_number = max(0, token_txs_number - len(swaps_df) - len(weth_swaps_df))
+        extra_timestamps = self.make_timestamps(extra_number)
+
+        hashes = np.concatenate([swaps_df['hash'], weth_swaps_df['hash'], make_hashes(10 ** 9, extra_number)])
+        timestamps = np.concatenate([swaps_df['timeStamp'], weth_swaps_df['timeStamp'], extra_timestamps])
+        contracts = np.concatenate([swaps_df['token'], np.full(len(weth_swaps_df), self.weth, dtype=object),
+                                    rng.choice(self.tokens, extra_number)])
+
+        # Tokens to the wallet for the buys and from the wallet for the sells, WETH in the other direction
+        to_wallet = np.concatenate([swaps_df['isBuy'], ~weth_swaps_df['isBuy'], np.ones(extra_number, dtype=bool)])
+        counterparties = np.concatenate([swaps_df['router'], weth_swaps_df['router'],
+                                         rng.choice(self.others, extra_number)])
+        rows_number = len(hashes)
+
+        token_txs_df = pd.DataFrame({
+            'blockNumber': (timestamps // 12).astype(str),
+            'timeStamp': timestamps.astype(str),
+            'hash': hashes,
+            'nonce': rng.integers(0, 10 ** 4, rows_number).astype(str),
+            'blockHash': hashes,
+            'from': np.where(to_wallet, counterparties, self.wallet),
+            'contractAddress': contracts,
+            'to': np.where(to_wallet, self.wallet, counterparties),
+            'value': make_wei(rng, rows_number, 10 ** 6),
+            'tokenName': np.char.add('token ', contracts.astype(str)).astype(object),
+            'tokenSymbol': np.char.add('tkn', contracts.astype(str)).astype(object),
+            'tokenDecimal': '18',
+            'transactionIndex': rng.integers(0, 300, rows_number).astype(str),
+            'gas': rng.integers(21000, 500000, rows_number).astype(str),
+            'gasPrice': (rng.normal(30, 5, rows_number).clip(1) * 10 ** 9).astype(np.int64).astype(str),
+            'gasUsed': rng.integers(21000, 300000, rows_number).astype(str),
+            'cumulativeGasUsed': rng.integers(21000, 30000000, rows_number).astype(str),
+            'input': 'deprecated',
+            'confirmations': rng.integers(1, 10 ** 6, rows_number).astype(str),
+        })
+
+        return token_txs_df.sort_values('timeStamp', ascending=False, kind='stable').reset_index(drop=True)
+
+    def make_internal_txs(self, swaps_df: pd.DataFrame, internal_txs_number: int) -> pd.DataFrame:
+        """
+        ETH sent by the routers for the ETH sells and incoming ETH transfers via contracts
+        """
+        rng = self.rng
+        sells_df = swaps_df.loc[~swaps_df['isBuy'] & ~swaps_df['isWeth']]
+        extra_number = max(0, internal_txs_number - len(sells_df))
+
+        hashes = np.concatenate([sells_df['hash'], make_hashes(2 * 10 ** 9, extra_number)])
+        timestamps = np.concatenate([sells_df['timeStamp'], self.make_timestamps(extra_number)])
+        rows_number = len(hashes)
+
+        internal_txs_df = pd.DataFrame({
+            'blockNumber': (timestamps // 12).astype(str),
+            'timeStamp': timestamps.astype(str),
+            'hash': hashes,
+            'from': np.concatenate([sells_df['router'], rng.choice(self.others, extra_number)]),
+            'to': self.wallet,
+            'value': make_wei(rng, rows_number, 5),
+            'contractAddress': '',
+            'input': '',
+            'type': 'call',
+            'gas': rng.integers(0, 100000, rows_number).astype(str),
+            'gasUsed': '0',
+            'traceId': '0_1',
+            'isError': '0',
+            'errCode': '',
+        })
+
+        return internal_txs_df.sort_values('timeStamp', ascending=False, kind='stable').reset_index(drop=True)
+
+    def get_pages(self, action: str):
+        """
+        API pages of the action (lists of dicts with string values)
+
+        :param action: txlist, tokentx or txlistinternal
+        :return: generator of the pages
+        """
+        df = {'txlist': self.txs_df, 'tokentx': self.token_txs_df, 'txlistinternal': self.internal_txs_df}[action]
+
+        for start in range(0, len(df), PAGE_SIZE):
+            yield df.iloc[start:start + PAGE_SIZE].to_dict('records')
+
+
+class SyntheticDownloader:
+    """
+    Replaces the DataDownloader of a WalletAnalyzer, returns the pages of a SyntheticWallet
+    """
+    def __init__(self, synthetic_wallet: SyntheticWallet) -> None:
+        self.synthetic_wallet = synthetic_wallet
+
+    def download_concurrently(self, actions: list, page_callback) -> dict:
+        return {action: [page_callback(action, page) for page in self.synthetic_wallet.get_pages(action)]
+                for action in actions}
@@ -0,0 +1,235 @@
+"""Analyze many wallets at once: WalletAnalyzer -> MetricsCalculator pipeline in a process pool.
+The KPIs of every wallet are appended to a CSV file as soon as the wallet is done, so an interrupted batch can be
+resumed (the wallets already in the file are skipped)
+
+Usage: python src/batch_runner.py wallets.txt -o results.csv [--workers 8] [--chain eth] [--no-resume]
+"""
+import sys
+import os
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import src.download_wallet_txs as download_wallet_txs
+from src.gas_prices import get_daily_gas_prices
+from src.instrumentation import configure_logging, log_event, start_run
+from src.wallet_analyzer_eth import MetricsCalculator, WalletAnalyzer
+
+# Columns of the results table
+KPI_COLUMNS = ['first_tx_datetime', 'last_tx_datetime', 'total_swaps_number', 'traded_tokens_number',
+               'final_trade_result', 'avg_trade_result', 'avg_trade_result_percent', 'avg_trade_size',
+               'median_trade_size', 'snipes_percent', 'win_ratio_percent']
+RESULT_COLUMNS = ['wallet', 'status', 'error', 'seconds'] + KPI_COLUMNS
+
+
+def init_worker(etherscan_calls_per_second: float) -> None:
+    """
+    Set the API rate limit of the worker process (the limit of the API key is shared by all the workers)
+
+    :param etherscan_calls_per_second: calls per second allowed for one worker
+    :return: None
+    """
+    download_wallet_txs.etherscan_calls_per_second = etherscan_calls_per_second
+
+
+def calculate_kpi(func, *args):
+    """
+    Calculate one KPI, NaN if it can not be calculated for the wallet (e.g. no trades - division by zero)
+
+    :param func: MetricsCalculator method
+    :param args: arguments of the method
+    :return: KPI value or NaN
+    """
+    try:
+        return func(*args)
+    except (ZeroDivisionError, KeyError, IndexError, ValueError, TypeError):
+        return np.nan
+
+
+def analyze_wallet(wallet: str, chain: str = 'eth', incremental: bool = True) -> dict:
+    """
+    Run the whole pipeline for the wallet (same as Dashboard.get_wallet_data) and calculate the KPIs. Errors are
+    returned in the result, so one wallet does not stop the batch. The stages are recorded in a run report (saved to
+    the run_reports_dir if set)
+
+    :param wallet: wallet address
+    :param chain: eth or bsc
+    :param incremental: whether to download only the new blocks since the last analysis (txs stored locally)
+    :return: dict with the RESULT_COLUMNS
+    """
+    start = time.perf_counter()
+    result = {'wallet': wallet.lower(), 'status': 'ok', 'error': None}
+
+    try:
+        with start_run(wallet.lower()):
+            wallet_analyzer = WalletAnalyzer(wallet, chain, incremental=incremental)
+            wallet_analyzer.get_data()
+            wallet_analyzer.calculate_swap_txs()
+            wallet_analyzer.enrich_txs()
+
+            swap_txs_df = wallet_analyzer.get_swap_txs()
+            token_trades_df = wallet_analyzer.calculate_tokens_txs()
+            metrics_calculator = MetricsCalculator(swap_txs_df, wallet_analyzer.txs_df, token_trades_df)
+
+            result.update({
+                'first_tx_datetime': calculate_kpi(metrics_calculator.first_tx_datetime),
+                'last_tx_datetime': calculate_kpi(metrics_calculator.last_tx_datetime),
+                'total_swaps_number': calculate_kpi(metrics_calculator.total_swaps_number),
+                'traded_tokens_number': calculate_kpi(metrics_calculator.traded_tokens_number),
+                'final_trade_result': calculate_kpi(metrics_calculator.final_trade_result),
+                'avg_trade_result': calculate_kpi(metrics_calculator.avg_trade_result),
+                'avg_trade_result_percent': calculate_kpi(metrics_calculator.avg_trade_result, True),
+                'avg_trade_size': calculate_kpi(metrics_calculator.avg_trade_size),
+                'median_trade_size': calculate_kpi(metrics_calculator.median_trade_size),
+                'snipes_percent': calculate_kpi(metrics_calculator.snipes_percent),
+                # Changes token_trades_df, so it is the last one
+                'win_ratio_percent': calculate_kpi(metrics_calculator.win_ratio_percent),
+            })
+
+    except Exception as error:
+        result['status'] = 'error'
+        result['error'] = f"{type(error).__name__}: {error}"
+
+    result['seconds'] = round(time.perf_counter() - start, 3)
+
+    return result
+
+
+def load_wallets(file: str) -> list:
+    """
+    Load the wallet list (one address per line, lines starting with # are skipped)
+
+    :param file: text file with the wallets
+    :return: list of unique wallet addresses (in the order of the file)
+    """
+    with open(file, 'r') as wallets_file:
+        wallets = [line.strip() for line in wallets_file if line.strip() and not line.strip().startswith('#')]
+
+    return list(dict.fromkeys(wallet.lower() for wallet in wallets))
+
+
+def load_results(results_file: str) -> pd.DataFrame:
+    """
+    Load the results of the previous runs
+
+    :param results_file: CSV file with the results
+    :return: dataframe with the RESULT_COLUMNS (empty if there is no file)
+    """
+    if results_file is None or not os.path.exists(results_file):
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    return pd.read_csv(results_file)
+
+
+def append_result(results_file: str, result: dict) -> None:
+    """
+    Append the result of one wallet to the CSV file
+
+    :param results_file: CSV file with the results
+    :param result: dict with the RESULT_COLUMNS
+    :return: None
+    """
+    if results_file is None:
+        return
+
+    write_header = not os.path.exists(results_file)
+    pd.DataFrame([result], columns=RESULT_COLUMNS).to_csv(results_file, mode='a', header=write_header, index=False)
+
+
+def run_batch(wallets: list, results_file: str = None, workers: int = None, chain: str = 'eth',
+              resume: bool = True, incremental: bool = True) -> pd.DataFrame:
+    """
+    Analyze all the wallets in a process pool. There are more workers than CPUs by default, so the downloads of some
+    wallets overlap with the calculations of the others
+
+    :param wallets: list of wallet addresses
+    :param results_file: CSV file the results are appended to (None - results are only returned)
+    :param workers: number of worker processes (2 * number of CPUs by default)
+    :param chain: eth or bsc
+    :param resume: whether to skip the wallets with the 'ok' status in the results file (wallets with errors are
+        analyzed again)
+    :param incremental: whether to download only the new blocks since the last analysis (txs stored locally)
+    :return: dataframe with one row of KPIs per wallet (RESULT_COLUMNS), the results of the previous runs included
+    """
+    wallets = list(dict.fromkeys(wallet.lower() for wallet in wallets))
+
+    previous_results_df = load_results(results_file)
+
+    if resume:
+        done_wallets = set(previous_results_df.loc[previous_results_df['status'] == 'ok', 'wallet'])
+        previous_results_df = previous_results_df.loc[previous_results_df['wallet'].isin(done_wallets)]
+    else:
+        previous_results_df = previous_results_df.iloc[0:0]
+        if results_file is not None and os.path.exists(results_file):
+            os.remove(results_file)
+
+    todo_wallets = [wallet for wallet in wallets if wallet not in set(previous_results_df['wallet'])]
+    log_event('batch_started', wallets=len(wallets), alreadyAnalyzed=len(wallets) - len(todo_wallets))
+
+    results = []
+    if len(todo_wallets) > 0:
+        workers = workers or 2 * (os.cpu_count() or 1)
+        workers = min(workers, len(todo_wallets))
+
+        # Create the gas price array before the workers start, they all map the same file
+        get_daily_gas_prices()
+
+        # All the workers share the API key limit
+        calls_per_second = download_wallet_txs.etherscan_calls_per_second / workers
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(calls_per_second,)) as executor:
+            futures = {executor.submit(analyze_wallet, wallet, chain, incremental): wallet for wallet in todo_wallets}
+
+            for done_number, future in enumerate(as_completed(futures), start=1):
+                try:
+                    result = future.result()
+                except Exception as error:
+                    # The worker process died (e.g. out of memory)
+                    result = {'wallet': futures[future], 'status': 'error',
+                              'error': f"{type(error).__name__}: {error}"}
+
+                append_result(results_file, result)
+                results.append(result)
+
+                log_event('wallet_analyzed', done=done_number, total=len(todo_wallets), wallet=result['wallet'],
+                          status=result['status'], error=result['error'], seconds=result.get('seconds'))
+
+    results_df = pd.concat([previous_results_df, pd.DataFrame(results, columns=RESULT_COLUMNS)], ignore_index=True)
+
+    errors_number = (results_df['status'] != 'ok').sum()
+    log_event('batch_finished', ok=int(len(results_df) - errors_number), errors=int(errors_number))
+
+    return results_df
+
+
+def main() -> None:
+    """
+    Command line interface of the batch runner
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Analyze many wallets and save their KPIs to a CSV file")
+    parser.add_argument('wallets_file', help="text file with one wallet address per line")
+    parser.add_argument('-o', '--output', default='results.csv', help="CSV file with the results")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="number of worker processes")
+    parser.add_argument('-c', '--chain', default='eth', choices=['eth', 'bsc'])
+    parser.add_argument('--no-resume', action='store_true', help="analyze all the wallets again")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    run_batch(load_wallets(args.wallets_file), args.output, args.workers, args.chain, not args.no_resume)
+
+
+if __name__ == '__main__':
+    main()
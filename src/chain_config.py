@@ -0,0 +1,200 @@
+"""Contract addresses per chain (routers, stablecoins, wrapped native token) from data/contracts.yaml.
+The file is parsed once per process (with the C YAML parser if available) and compiled per chain: frozensets for the
+single address tests and integer codes of the known addresses for the vectorized tests of the dataframe columns.
+The registry is shared by all the analyzers and reloaded when the file changes (checked at most once per
+chain_config_check_seconds)
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import log_event
+
+CONTRACTS_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'contracts.yaml')
+
+# Settings
+chain_config_check_seconds = float(os.environ.get('chain_config_check_seconds', 5))
+
+# Solana addresses (base58) are case sensitive, the addresses of the other chains are compared in lowercase
+CASE_SENSITIVE_CHAINS = ['sol']
+
+# Lists of addresses compiled per chain and the key of the wrapped native token
+ADDRESS_GROUPS = ['routers', 'stablecoins']
+WRAPPED_TOKENS = {'eth': 'weth', 'bsc': 'wbnb', 'sol': 'wsol'}
+
+
+def load_config(file: str = CONTRACTS_FILE) -> dict:
+    """
+    Parse the contracts file
+
+    :param file: YAML file with the contracts per chain
+    :return: dict chain -> dict with the lists of addresses and the wrapped token address
+    """
+    # PyYAML is imported only when the file is parsed
+    import yaml
+
+    with open(file, 'r') as config_file:
+        return yaml.load(config_file, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+class ChainContracts:
+    """
+    Compiled contract addresses of one chain (immutable, a reload creates new objects)
+    """
+    def __init__(self, chain: str, config: dict):
+        """
+        Normalize the addresses and build the lookup tables
+
+        :param chain: eth, bsc or sol
+        :param config: contracts of the chain from the config file
+        """
+        normalize = str if chain in CASE_SENSITIVE_CHAINS else str.lower
+
+        self.chain = chain
+        self.wrapped_token = normalize(config[WRAPPED_TOKENS[chain]]) if WRAPPED_TOKENS.get(chain) in config else None
+
+        # Addresses of every group in the order of the file
+        self.groups = {group: tuple(dict.fromkeys(normalize(address) for address in config.get(group) or []))
+                       for group in ADDRESS_GROUPS}
+        self.routers = frozenset(self.groups['routers'])
+        self.stablecoins = frozenset(self.groups['stablecoins'])
+
+        # Code of an address is its position in the index (-1 for the unknown addresses). The group tables have one
+        # more False item, so they can be indexed with the codes directly
+        self.addresses = pd.Index(list(dict.fromkeys(address for group in ADDRESS_GROUPS
+                                                     for address in self.groups[group])), dtype=object)
+        self.group_tables = {group: np.append(self.addresses.isin(self.groups[group]), False)
+                             for group in ADDRESS_GROUPS}
+
+    def codes(self, values) -> np.ndarray:
+        """
+        Get the integer codes of the addresses
+
+        :param values: addresses (array-like)
+        :return: array of the codes, -1 for the unknown addresses
+        """
+        return self.addresses.get_indexer(values)
+
+    def isin(self, values, group: str) -> np.ndarray:
+        """
+        Vectorized membership test of the addresses. Only the categories of the categorical columns are looked up
+        (codes of the categories -> group table), other columns are hashed against the compiled address tuple, which
+        is faster than coding every value
+
+        :param values: addresses (Series, Index or array-like)
+        :param group: routers or stablecoins
+        :return: bool array, same length as the values
+        """
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+            categorical = values.array if isinstance(values, (pd.Series, pd.Index)) else values
+            return np.append(self.group_tables[group][self.codes(categorical.categories)], False)[categorical.codes]
+
+        return pd.Series(values, copy=False).isin(self.groups[group]).to_numpy()
+
+    def is_router(self, values) -> np.ndarray:
+        return self.isin(values, 'routers')
+
+    def is_stablecoin(self, values) -> np.ndarray:
+        return self.isin(values, 'stablecoins')
+
+
+class ChainRegistry:
+    """
+    Compiled contracts of all the chains from the config file
+    """
+    def __init__(self, file: str = CONTRACTS_FILE):
+        """
+        Load and compile the config file
+
+        :param file: YAML file with the contracts per chain
+        """
+        self.file = file
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked = None
+        self.chains = {}
+
+        self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Compile the config file again if it was changed since the last load. The chains are replaced at once, the
+        analyzers created before keep the previous contracts
+
+        :param force: whether to reload the unchanged file too
+        :return: whether the file was reloaded
+        """
+        self.checked = time.monotonic()
+        stat = os.stat(self.file)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            if version == self.version and not force:
+                return False
+
+            config = load_config(self.file)
+            self.chains = {chain: ChainContracts(chain, chain_config) for chain, chain_config in config.items()}
+            self.version = version
+
+        log_event('chain_config_loaded', file=os.path.basename(self.file), chains=','.join(self.chains))
+
+        return True
+
+    def check(self) -> bool:
+        """
+        Reload the config file if it was changed, the file is checked at most once per chain_config_check_seconds
+
+        :return: whether the file was reloaded
+        """
+        if self.checked is not None and time.monotonic() - self.checked < chain_config_check_seconds:
+            return False
+
+        return self.reload()
+
+    def get(self, chain: str) -> ChainContracts:
+        """
+        Get the compiled contracts of the chain
+
+        :param chain: eth, bsc or sol
+        :return: ChainContracts
+        """
+        if chain not in self.chains:
+            raise ValueError(f"Unknown chain: {chain}")
+
+        return self.chains[chain]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ChainRegistry:
+    """
+    Get the registry shared by the whole process (loaded on the first call)
+
+    :return: ChainRegistry
+    """
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = ChainRegistry()
+
+        return _registry
+
+
+def get_chain(chain: str) -> ChainContracts:
+    """
+    Get the compiled contracts of the chain from the shared registry, the config file is reloaded if it was changed
+    (see ChainRegistry.check)
+
+    :param chain: eth, bsc or sol
+    :return: ChainContracts
+    """
+    registry = get_registry()
+    registry.check()
+
+    return registry.get(chain)
@@ -0,0 +1,65 @@
+"""Scale raw integer token amounts (strings from the block explorers APIs) by the token decimals"""
+import logging
+from decimal import Decimal, localcontext
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import log_event
+
+
+def scale_decimals(values: pd.Series, decimals, precision: int = None, exact: bool = False) -> pd.Series:
+    """
+    Change the decimal of the whole column of values, e.g. '1500000000000000000' with 18 decimals -> 1.5
+    Values are parsed as Python ints (no size limit) in one pass and divided by 10 ** decimals, so the float result
+    is correctly rounded even for 24+ decimals tokens. Values that are not integers are changed to NaN.
+
+    :param values: raw integer values (str or int)
+    :param decimals: number of decimals, one for all the values or one per value (same length as values)
+    :param precision: number of decimal places to round the result to (None - no rounding)
+    :param exact: whether to return decimal.Decimal values (object column) instead of floats
+    :return: Series with the scaled values, same index as values
+    """
+    values = pd.Series(values)
+
+    if np.ndim(decimals) == 0:
+        decimals = np.full(len(values), decimals)
+    decimals = np.asarray(decimals, dtype=np.int64)
+
+    scaled = []
+    invalid_number = 0
+
+    for value, decimal in zip(values.to_numpy(), decimals.tolist()):
+        try:
+            integer = int(value)
+        except (TypeError, ValueError):
+            invalid_number += 1
+            scaled.append(Decimal('NaN') if exact else np.nan)
+            continue
+
+        if exact:
+            # Created from a string, so not rounded to the decimal context precision
+            scaled.append(Decimal(f'{integer}E{-decimal}'))
+        else:
+            scaled.append(integer / 10 ** decimal)
+
+    if invalid_number:
+        log_event('invalid_values', logging.WARNING, count=invalid_number)
+
+    if exact:
+        scaled = pd.Series(scaled, index=values.index, dtype=object)
+
+        if precision is not None:
+            # uint256 values have up to 78 digits
+            with localcontext() as context:
+                context.prec = 80
+                scaled = scaled.map(lambda value: round(value, precision))
+
+        return scaled
+
+    scaled = pd.Series(scaled, index=values.index, dtype=float)
+
+    if precision is not None:
+        scaled = scaled.round(precision)
+
+    return scaled
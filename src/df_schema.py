@@ -0,0 +1,140 @@
+"""Compact dtypes of the transaction dataframes.
+Addresses and labels with few different values are categoricals, counters are narrow integers and the big unused
+columns (calldata, block hashes) are dropped while the API pages are parsed
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import log_event
+
+# All the values of the txType column (categories of the column)
+TX_TYPES = ['eth_transfer_out', 'eth_transfer_in', 'approve', 'swap_tx_zero_value', 'swap_tx_nonzero_value', 'other',
+            'tokens_transfer_in', 'tokens_transfer_out', 'stablecoins_transfer_in', 'stablecoins_transfer_out',
+            'eth_other_transfer_in']
+
+# Not used by the analysis, 'input' (calldata) is the biggest column of the API txs
+DROPPED_COLUMNS = ['input', 'blockHash']
+
+TXS_SCHEMA = {
+    'blockNumber': 'uint32',
+    'nonce': 'uint32',
+    'transactionIndex': 'uint16',
+    'gas': 'uint32',
+    'isError': 'int8',
+    'cumulativeGasUsed': 'uint32',
+    'gasUsed': 'uint32',
+    'confirmations': 'uint32',
+    'from': 'category',
+    'to': 'category',
+    'contractAddress': 'category',
+    'txreceipt_status': 'category',
+    'methodId': 'category',
+    'functionName': 'category',
+    'txType': pd.CategoricalDtype(TX_TYPES),
+}
+
+TOKEN_TXS_SCHEMA = {
+    'blockNumber': 'uint32',
+    'nonce': 'uint32',
+    'transactionIndex': 'uint16',
+    'gas': 'uint32',
+    'gasUsed': 'uint32',
+    'cumulativeGasUsed': 'uint32',
+    'confirmations': 'uint32',
+    'tokenDecimal': 'uint8',
+    'from': 'category',
+    'to': 'category',
+    'contractAddress': 'category',
+    'tokenName': 'category',
+    'tokenSymbol': 'category',
+    'methodId': 'category',
+    'functionName': 'category',
+}
+
+INTERNAL_TXS_SCHEMA = {
+    'blockNumber': 'uint32',
+    'gas': 'uint32',
+    'gasUsed': 'uint32',
+    'isError': 'int8',
+    'from': 'category',
+    'to': 'category',
+    'contractAddress': 'category',
+    'type': 'category',
+    'errCode': 'category',
+}
+
+
+def fits_dtype(values: pd.Series, dtype) -> bool:
+    """
+    Check if all the integer values can be stored in the integer dtype (astype would silently wrap them)
+
+    :param values: integer values
+    :param dtype: numpy integer dtype
+    :return: whether the values fit
+    """
+    if len(values) == 0:
+        return True
+
+    info = np.iinfo(dtype)
+
+    return info.min <= values.min() and values.max() <= info.max
+
+
+def apply_schema(df: pd.DataFrame, schema: dict, categories: bool = True) -> pd.DataFrame:
+    """
+    Drop the unused columns and change the dtypes of the columns in the schema (missing columns are skipped).
+    Integer columns with values out of the range of the dtype are kept as they are
+
+    :param df: dataframe of the txs
+    :param schema: dict column -> dtype (TXS_SCHEMA, TOKEN_TXS_SCHEMA or INTERNAL_TXS_SCHEMA)
+    :param categories: whether to change the categorical columns too (categories of separately created dataframes are
+        different, so they should be set after the dataframes are concatenated)
+    :return: dataframe with the changed dtypes
+    """
+    df = df.drop(columns=[column for column in DROPPED_COLUMNS if column in df.columns])
+
+    for column, dtype in schema.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+
+        if isinstance(dtype, pd.CategoricalDtype) or dtype == 'category':
+            if categories:
+                df[column] = df[column].astype(dtype)
+            continue
+
+        if pd.api.types.is_integer_dtype(df[column]) and not fits_dtype(df[column], dtype):
+            log_event('dtype_not_fitting', logging.WARNING, column=column, dtype=str(dtype),
+                      keptAs=str(df[column].dtype))
+            continue
+
+        df[column] = df[column].astype(dtype)
+
+    return df
+
+
+def memory_report(dfs: dict) -> pd.DataFrame:
+    """
+    Memory used by the dataframes (including the Python strings)
+
+    :param dfs: dict table name -> dataframe
+    :return: dataframe with the number of rows, columns and MB per table (and the total)
+    """
+    rows = [
+        {
+            'table': name,
+            'rows': len(df),
+            'columns': len(df.columns),
+            'memoryMB': df.memory_usage(deep=True).sum() / 1024 ** 2,
+        }
+        for name, df in dfs.items() if df is not None
+    ]
+    rows.append({
+        'table': 'total',
+        'rows': sum(row['rows'] for row in rows),
+        'columns': sum(row['columns'] for row in rows),
+        'memoryMB': sum(row['memoryMB'] for row in rows),
+    })
+
+    return pd.DataFrame(rows).set_index('table')
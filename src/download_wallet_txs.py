@@ -1,44 +1,180 @@
 """Download wallet txs history using bscscan or etherscan api.
-Use cache to avoid api rate limit (cache expires after 3 hours)
+Responses are cached in src/cache (see response_cache.py), finalized block ranges are cached forever
 """
+import logging
 import os
-import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
-import requests_cache
+
+from src.instrumentation import log_event, submit_in_context
+from src.rate_limiting import TokenBucket, get_bucket, request_with_retry
+from src.response_cache import FINALIZED_BLOCKS, ResponseCache
+from src.sync_store import SyncStore, tx_key
 
 etherscan_api_key = os.environ.get('etherscan_api_key')
 helius_api_key = os.environ.get('helius_api_key')
 
-# requests_cache.install_cache('cache/cache', backend='sqlite', expire_after=60 * 60 * 3)
+# API plans limits
+etherscan_calls_per_second = float(os.environ.get('etherscan_calls_per_second', 5))
+helius_calls_per_second = float(os.environ.get('helius_calls_per_second', 10))
+solana_fm_calls_per_second = float(os.environ.get('solana_fm_calls_per_second', 0.5))
+
+# Max number of the newest Solana txs downloaded per wallet (0 - the whole history)
+helius_max_txs = int(os.environ.get('helius_max_txs', 4000))
+
+# HTTP cache settings
+http_cache_enabled = os.environ.get('http_cache', '1') != '0'
+http_cache_max_size_mb = float(os.environ.get('http_cache_max_size_mb', 200))
+
+# Max number of txs returned by the API in one query
+MAX_PAGE_SIZE = 10000
+LAST_BLOCK = 99999999
+
+ACTIONS = ['txlist', 'tokentx', 'txlistinternal']
+
+# Max number of parsed txs per Helius request and signatures per getSignaturesForAddress call
+HELIUS_PAGE_SIZE = 100
+SIGNATURES_PAGE_SIZE = 1000
+
+# Max number of concurrent requests (and pooled connections per host)
+MAX_WORKERS = 8
+
+
+def create_session() -> ResponseCache:
+    """
+    Create a cached HTTP session with a connection pool big enough for the concurrent requests
+
+    :return: session
+    """
+    return ResponseCache(enabled=http_cache_enabled, max_size_mb=http_cache_max_size_mb, pool_size=MAX_WORKERS)
+
+
+def cache_params(http_session, action: str, finalized: bool = False) -> dict:
+    """
+    Cache arguments of the request (only for the cached session)
+
+    :param http_session: HTTP session
+    :param action: API action, selects the TTL of the response
+    :param finalized: whether the response will contain only finalized blocks (cached forever)
+    :return: dict of request arguments
+    """
+    if not isinstance(http_session, ResponseCache):
+        return {}
+
+    return {'action': action, 'finalized': finalized}
+
+
+def split_block_range(startblock: int, endblock: int, parts: int) -> list:
+    """
+    Split the block range into the given number of disjoint ranges (newest first)
+
+    :param startblock: first block of the range
+    :param endblock: last block of the range
+    :param parts: number of ranges
+    :return: list of (startblock, endblock) tuples
+    """
+    parts = max(1, min(parts, endblock - startblock + 1))
+    bounds = [startblock + (endblock - startblock + 1) * i // parts for i in range(parts + 1)]
+
+    return [(bounds[i], bounds[i + 1] - 1) for i in reversed(range(parts))]
+
+
+def is_etherscan_rate_limited(response: requests.Response) -> bool:
+    """
+    Etherscan returns status 200 with status "0" and "Max rate limit reached" (or similar) message in the result
+
+    :param response: API response
+    :return: whether the request was refused because of the rate limit
+    """
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+
+    return data.get('status') == '0' and 'rate limit' in str(data.get('result')).lower()
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> ResponseCache:
+    """
+    Get the HTTP session shared by all the downloaders (created on the first call, so importing the module does not
+    open the cache)
+
+    :return: session
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+
+        return _session
 
 
 class DataDownloader:
     """
     Download wallet txs history using bscscan or etherscan api
     """
-    def __init__(self, address: str, endpoint: str = 'etherscan.com', startblock: int = 0):
+    def __init__(self, address: str, endpoint: str = 'etherscan.com', startblock: int = 0, incremental: bool = False,
+                 sync_store: SyncStore = None, page_size: int = MAX_PAGE_SIZE, block_ranges: int = 4,
+                 http_session: requests.Session = None, rate_limiter: TokenBucket = None):
         """
         Create a new DataDownloader object with given address, endpoint and startblock
 
         :param address: Wallet address
         :param endpoint: bscscan.com or etherscan.com
         :param startblock: Number of block to start from
+        :param incremental: whether to download only the blocks newer than the last synced block (txs stored locally)
+        :param sync_store: local store of the synced txs (used only if incremental is True, not created otherwise)
+        :param page_size: number of txs per request (max 10000)
+        :param block_ranges: number of block ranges downloaded concurrently if the history has more than 1 page
+        :param http_session: HTTP session (shared cached session by default)
+        :param rate_limiter: token bucket of the API calls (shared by all the downloaders with the same key by default)
         """
         self.address = address
         self.endpoint = endpoint
         self.startblock = startblock
+        self.incremental = incremental
+        self.sync_store = sync_store if sync_store is not None else SyncStore() if incremental else None
+        self.page_size = min(page_size, MAX_PAGE_SIZE)
+        self.block_ranges = block_ranges
+        self.session = http_session if http_session is not None else get_session()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_bucket(
+            f'{endpoint}:{etherscan_api_key}', etherscan_calls_per_second)
+
+        # Highest block number of the downloaded txs, the blocks FINALIZED_BLOCKS older can not change anymore
+        self.newest_block = None
+
+    def is_finalized(self, endblock: int) -> bool:
+        """
+        Check if the block range ending with the endblock can not change anymore (its responses are cached forever).
+        The chain head is at least the newest block of the wallet txs
 
-    def get_txs(self) -> list:
+        :param endblock: Number of the last block of the range
+        :return: whether the range is finalized
         """
-        Get normal transactions for a given address
+        return self.newest_block is not None and endblock < self.newest_block - FINALIZED_BLOCKS
+
+    def request_txs(self, action: str, startblock: int, endblock: int = LAST_BLOCK) -> list:
+        """
+        Request one page of the txs of the given type from the API (newest first)
 
+        :param action: txlist, tokentx or txlistinternal
+        :param startblock: Number of block to start from
+        :param endblock: Number of the last block
         :return: List of transactions
         """
-        url = f"https://api.{self.endpoint}/api?module=account&action=txlist&address={self.address}&startblock=" \
-              f"{self.startblock}&endblock=99999999&page=1&offset=10000&sort=desc&apikey={etherscan_api_key}"
+        url = f"https://api.{self.endpoint}/api?module=account&action={action}&address={self.address}&startblock=" \
+              f"{startblock}&endblock={endblock}&page=1&offset={self.page_size}&sort=desc&apikey={etherscan_api_key}"
 
-        response = requests.request("GET", url)
+        response = request_with_retry(self.session, "GET", url, self.rate_limiter, is_etherscan_rate_limited,
+                                      **cache_params(self.session, action, self.is_finalized(endblock)))
 
         txs = response.json()
         txs = txs['result']
@@ -46,45 +182,201 @@ class DataDownloader:
         if txs is None:
             return []
 
+        if isinstance(txs, list) and len(txs) > 0 and 'blockNumber' in txs[0]:
+            newest_block = int(txs[0]['blockNumber'])
+            if self.newest_block is None or newest_block > self.newest_block:
+                self.newest_block = newest_block
+
         return txs
 
-    def get_token_txs(self) -> list:
+    def iter_pages(self, action: str, startblock: int, endblock: int = LAST_BLOCK, seen_keys: set = None):
         """
-        Get token transactions for a given address
+        Download all the txs of the given type in the block range page by page. The API returns max 10000 txs per
+        query, so the block window slides down: the next query ends at the lowest block of the previous page (this
+        block is downloaded again and the duplicates are removed)
 
-        :return: List of transactions
+        :param action: txlist, tokentx or txlistinternal
+        :param startblock: Number of block to start from
+        :param endblock: Number of the last block
+        :param seen_keys: keys of the already downloaded txs from the endblock
+        :return: generator of pages (lists of txs, newest first)
         """
-        url = f"https://api.{self.endpoint}/api?module=account&action=tokentx&address={self.address}&startblock=" \
-              f"{self.startblock}&endblock=99999999&page=1&offset=10000&sort=desc&apikey={etherscan_api_key}"
+        seen_keys = seen_keys or set()
 
-        response = requests.request("GET", url)
+        while True:
+            page = self.request_txs(action, startblock, endblock)
 
-        txs = response.json()
-        txs = txs['result']
+            if isinstance(page, str):
+                raise ValueError(f"Could not download {action}: {page}")
 
-        if txs is None:
-            return []
+            new_txs = [tx for tx in page if tx_key(tx) not in seen_keys] if seen_keys else page
 
-        return txs
+            if len(new_txs) > 0:
+                yield new_txs
 
-    def get_internal_txs(self) -> list:
+            if len(page) < self.page_size:
+                break
+
+            lowest_block = int(page[-1]['blockNumber'])
+
+            if lowest_block == endblock:
+                log_event('block_overflow', logging.WARNING, action=action, block=lowest_block,
+                          pageSize=self.page_size)
+                break
+
+            seen_keys = {tx_key(tx) for tx in page if int(tx['blockNumber']) == lowest_block}
+            endblock = lowest_block
+
+    def sync(self, action: str) -> None:
         """
-        Get internal transactions for a given address
+        Download the txs of the given type from the last synced block to the local store. Every page is stored as
+        soon as it is downloaded, an interrupted sync is resumed from the last stored page
+
+        :param action: txlist, tokentx or txlistinternal
+        :return: None
+        """
+        pending = self.sync_store.get_pending(self.address, self.endpoint, action)
+
+        if pending is not None and pending['endblock'] is not None:
+            # Resume from the checkpoint
+            startblock = pending['startblock']
+            endblock = pending['endblock']
+            seen_keys = self.sync_store.get_pending_keys(self.address, self.endpoint, action)
+            log_event('sync_resumed', action=action, block=endblock)
+
+        else:
+            last_block = self.sync_store.last_block(self.address, self.endpoint, action)
+
+            # The last synced block is downloaded again (duplicates are removed), it could be synced only partially
+            startblock = self.startblock if last_block is None else max(self.startblock, last_block)
+            endblock = LAST_BLOCK
+            seen_keys = None
+            self.sync_store.start_segment(self.address, self.endpoint, action, startblock)
+
+        new_txs_number = 0
+
+        for page in self.iter_pages(action, startblock, endblock, seen_keys):
+            self.sync_store.append_page(self.address, self.endpoint, action, page)
+            new_txs_number += len(page)
+
+        self.sync_store.finish_segment(self.address, self.endpoint, action)
+
+        log_event('sync_finished', action=action, startblock=startblock, newTxs=new_txs_number)
+
+    def iter_action_pages(self, action: str):
+        """
+        Get the txs of the given type page by page (max self.page_size txs in memory). In the incremental mode only
+        the blocks from the last synced block are downloaded and the pages are read from the local store
+
+        :param action: txlist, tokentx or txlistinternal
+        :return: generator of pages (lists of txs, newest first)
+        """
+        if not self.incremental:
+            yield from self.iter_pages(action, self.startblock)
+            return
+
+        self.sync(action)
+
+        page = []
+        for tx in self.sync_store.iter_txs(self.address, self.endpoint, action, self.startblock):
+            page.append(tx)
+
+            if len(page) == self.page_size:
+                yield page
+                page = []
+
+        if len(page) > 0:
+            yield page
+
+    def download_concurrently(self, actions: list = None, page_callback=None) -> dict:
+        """
+        Download the txs of all the given types at the same time (thread pool, pooled HTTP session, shared rate
+        limiter). If the first page of the history is full, the rest of the block range is split into
+        self.block_ranges ranges downloaded concurrently too. In the incremental mode only the types are synced
+        concurrently (every type has one checkpoint)
+
+        :param actions: txlist, tokentx and/or txlistinternal (all by default)
+        :param page_callback: function (action, page) -> result called for every page in the worker thread,
+            e.g. to create a dataframe (by default the page is kept as it is)
+        :return: dict with the list of page results per action (newest first)
+        """
+        actions = actions or ACTIONS
+        page_callback = page_callback or (lambda action, page: page)
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            if self.incremental:
+                futures = {action: submit_in_context(
+                    executor,
+                    lambda action_: [page_callback(action_, page) for page in self.iter_action_pages(action_)], action)
+                    for action in actions}
+
+                return {action: future.result() for action, future in futures.items()}
+
+            first_page_futures = {action: submit_in_context(executor, self.request_txs, action, self.startblock)
+                                  for action in actions}
+
+            results = {}
+            range_futures = {}
+
+            for action in actions:
+                first_page = first_page_futures[action].result()
+
+                if isinstance(first_page, str):
+                    raise ValueError(f"Could not download {action}: {first_page}")
+
+                results[action] = [page_callback(action, first_page)] if len(first_page) > 0 else []
+
+                if len(first_page) < self.page_size:
+                    continue
+
+                lowest_block = int(first_page[-1]['blockNumber'])
+                seen_keys = {tx_key(tx) for tx in first_page if int(tx['blockNumber']) == lowest_block}
+
+                range_futures[action] = [
+                    submit_in_context(
+                        executor, lambda action_, start, end, keys: [page_callback(action_, page) for page in
+                                                           self.iter_pages(action_, start, end, keys)],
+                        action, startblock, endblock, seen_keys if endblock == lowest_block else None)
+                    for startblock, endblock in split_block_range(self.startblock, lowest_block, self.block_ranges)]
+
+            for action, futures in range_futures.items():
+                for future in futures:
+                    results[action].extend(future.result())
+
+        return results
+
+    def get_action_txs(self, action: str) -> list:
+        """
+        Get all the txs of the given type
+
+        :param action: txlist, tokentx or txlistinternal
+        :return: List of transactions (newest first)
+        """
+        return [tx for page in self.iter_action_pages(action) for tx in page]
+
+    def get_txs(self) -> list:
+        """
+        Get normal transactions for a given address
 
         :return: List of transactions
         """
-        url = f"https://api.{self.endpoint}/api?module=account&action=txlistinternal&address={self.address}&startblock=" \
-              f"{self.startblock}&endblock=99999999&page=1&offset=10000&sort=desc&apikey={etherscan_api_key}"
+        return self.get_action_txs('txlist')
 
-        response = requests.request("GET", url)
+    def get_token_txs(self) -> list:
+        """
+        Get token transactions for a given address
 
-        txs = response.json()
-        txs = txs['result']
+        :return: List of transactions
+        """
+        return self.get_action_txs('tokentx')
 
-        if txs is None:
-            return []
+    def get_internal_txs(self) -> list:
+        """
+        Get internal transactions for a given address
 
-        return txs
+        :return: List of transactions
+        """
+        return self.get_action_txs('txlistinternal')
 
 
 class SolanaDataDownloader:
@@ -92,13 +384,20 @@ class SolanaDataDownloader:
     Download wallet txs history using solana.fm api
     """
 
-    def __init__(self, address: str):
+    def __init__(self, address: str, http_session: requests.Session = None):
         """
         Create a new DataDownloader object with given address
 
         :param address: Wallet address
+        :param http_session: HTTP session (shared cached session by default)
         """
         self.address = address
+        self.session = http_session if http_session is not None else get_session()
+        self.solana_fm_bucket = get_bucket('solana.fm', solana_fm_calls_per_second)
+        self.helius_bucket = get_bucket(f'helius:{helius_api_key}', helius_calls_per_second)
+
+        # Whether the last listing of the signatures reached the first tx of the wallet
+        self.first_tx_reached = False
 
     def get_txs(self) -> list:
         """
@@ -109,28 +408,28 @@ class SolanaDataDownloader:
         all_txs = []
         page = 1
         url = f"https://api.solana.fm/v0/accounts/{self.address}/transfers?page={page}"
-        response = requests.request("GET", url)
+        response = request_with_retry(self.session, "GET", url, self.solana_fm_bucket,
+                                      **cache_params(self.session, 'solana.fm'))
         data = response.json()
         total_pages = data['pagination']['totalPages']
-        print("Total pages: ", total_pages)
+        log_event('solana_fm_pages', pages=total_pages)
 
         page += 1
         if data['status'] == 'success':
             all_txs.extend(data['results'])
         else:
-            print("Error: ", data['message'])
+            log_event('api_error', logging.ERROR, api='solana.fm', message=data['message'])
 
         while page <= total_pages:
-            import time
-            time.sleep(2)
-            print("Page: ", page)
+            log_event('solana_fm_page', page=page)
             url = f"https://api.solana.fm/v0/accounts/{self.address}/transfers?page={page}"
-            response = requests.request("GET", url)
+            response = request_with_retry(self.session, "GET", url, self.solana_fm_bucket,
+                                          **cache_params(self.session, 'solana.fm'))
             data = response.json()
             if data['status'] == 'success':
                 all_txs.extend(data['results'])
             else:
-                print("Error: ", data['message'])
+                log_event('api_error', logging.ERROR, api='solana.fm', message=data['message'])
 
             page += 1
 
@@ -141,77 +440,152 @@ class SolanaDataDownloader:
             json.dump({'results': all_txs}, file)
         return all_txs
 
-    def get_txs_helius(self, break_time=30 * 60) -> list:
+    def iter_signatures(self, max_signatures: int = None, before: str = None, until: str = None):
         """
-        Get transactions for a given address using the Helius API
-        :return:
+        List the signatures of the wallet txs (newest first) with the getSignaturesForAddress RPC method, it returns
+        SIGNATURES_PAGE_SIZE signatures per call without the parsed txs
+
+        :param max_signatures: max number of signatures (None - the whole history)
+        :param before: list the txs older than this signature (None - from the newest tx)
+        :param until: list the txs newer than this signature (None - to the first tx)
+        :return: generator of signatures
         """
+        url = f'https://mainnet.helius-rpc.com/?api-key={helius_api_key}'
+        signatures_number = 0
+        self.first_tx_reached = False
+
+        while max_signatures is None or signatures_number < max_signatures:
+            options = {'limit': SIGNATURES_PAGE_SIZE}
+            if before is not None:
+                options['before'] = before
+            if until is not None:
+                options['until'] = until
+
+            response = request_with_retry(self.session, "POST", url, self.helius_bucket, json={
+                'jsonrpc': '2.0', 'id': 1, 'method': 'getSignaturesForAddress', 'params': [self.address, options]})
+            data = response.json()
 
-        all_txs = []
-        transactions = []
+            if 'result' not in data:
+                raise ValueError(f"Could not list the signatures: {data.get('error')}")
 
-        url = f'https://api.helius.xyz/v0/addresses/{self.address}/transactions'
+            page = data['result'][:None if max_signatures is None else max_signatures - signatures_number]
+            for signature_info in page:
+                yield signature_info['signature']
+                signatures_number += 1
 
-        headers = {
-            'Content-Type': 'application/json',
-        }
-
-        body = {
-            'api-key': helius_api_key,
-            'limit': 100
-            # 'type': ['TRANSFER', 'SWAP', 'UNKNOWN'],
-            # 'source': ['SYSTEM_PROGRAM', 'RAYDIUM', 'JUPITER', 'ORCA', 'PHANTOM']
-        }
-        response = requests.get(url, headers=headers, params=body)
-
-        if response.status_code == 200:
-            transactions = response.json()
-            # print(transactions)
-            all_txs.extend(transactions)
-        else:
-            print(f"Error: {response.status_code}, {response.text}")
-            return []
+            # Only a short page listed to its end means there are no older txs
+            if len(data['result']) < SIGNATURES_PAGE_SIZE:
+                self.first_tx_reached = until is None and len(page) == len(data['result'])
+                return
 
-        last_tx_signature = transactions[-1]['signature']
+            before = data['result'][-1]['signature']
+
+    def get_helius_slice(self, before: str = None, until: str = None, last: str = None) -> list:
+        """
+        Get the parsed txs between two signatures (both excluded). A slice of max HELIUS_PAGE_SIZE signatures is
+        downloaded in one request, the newest slice may need more requests if there are new txs since the signatures
+        were listed
+
+        :param before: signature of the tx after the slice (None - from the newest tx)
+        :param until: signature of the tx before the slice (None - to the first tx)
+        :param last: signature of the oldest tx of the slice, the slice is complete when it is downloaded
+        :return: list of the parsed txs (newest first)
+        """
+        url = f'https://api.helius.xyz/v0/addresses/{self.address}/transactions'
+        txs = []
 
         while True:
-            print(f"Last tx signature: {last_tx_signature}")
-            # time.sleep(1)
-            body = {
-                'api-key': helius_api_key,
-                'before': last_tx_signature,
-                'limit': 100
-            }
-            response = requests.get(url, headers=headers, params=body)
-
-            if response.status_code == 200:
-                transactions = response.json()
-                all_txs.extend(transactions)
-
-                # Stop if there are less than 10 transactions in the last response
-                if len(transactions) < 10:
-                    break
-            elif response.status_code == 404:
-                print("No more transactions")
+            params = {'api-key': helius_api_key, 'limit': HELIUS_PAGE_SIZE}
+            if before is not None:
+                params['before'] = before
+            if until is not None:
+                params['until'] = until
+
+            # Txs before a given signature never change
+            response = request_with_retry(self.session, "GET", url, self.helius_bucket, params=params,
+                                          **cache_params(self.session, 'helius',
+                                                         finalized=before is not None and until is not None))
+
+            if response.status_code == 404:
                 break
-            else:
-                print(f"Error: {response.status_code}, {response.text}")
+            if response.status_code != 200:
+                raise ValueError(f"Could not download the parsed txs: {response.status_code} {response.text}")
 
-            last_tx_timestamp = transactions[-1]['timestamp']
-            first_tx_timestamp = transactions[0]['timestamp']
+            page = response.json()
+            txs.extend(page)
 
-            # If the time between the first and last transaction is less than 2 hours, stop (to prevent API overusage)
-            if first_tx_timestamp - last_tx_timestamp < break_time:
-                # print(last_tx_timestamp, first_tx_timestamp, last_tx_timestamp - first_tx_timestamp)
-                print(f"Less than {break_time} seconds between transactions")
+            if len(page) < HELIUS_PAGE_SIZE or page[-1]['signature'] == last:
                 break
 
-            if len(all_txs) > 4000:
-                break
+            before = page[-1]['signature']
+
+        return txs
 
-            last_tx_signature = transactions[-1]['signature']
+    def iter_txs_helius(self, max_txs: int = None, workers: int = MAX_WORKERS, before: str = None,
+                        until: str = None):
+        """
+        Download the parsed txs of the wallet page by page (newest first). The signatures are listed first and split
+        into slices of HELIUS_PAGE_SIZE txs, which are independent and downloaded concurrently (shared rate limiter).
+        Max 2 * workers slices are downloaded or waiting at once, so the memory does not grow with the history
+
+        :param max_txs: max number of the newest txs (None - the helius_max_txs setting, 0 - the whole history)
+        :param workers: number of concurrent requests
+        :param before: download the txs older than this signature (None - from the newest tx)
+        :param until: download the txs newer than this signature (None - to the first tx)
+        :return: generator of pages (lists of parsed txs)
+        """
+        max_txs = helius_max_txs if max_txs is None else max_txs
 
-        # Remove duplicates by signature
-        all_txs = list({v['signature']: v for v in all_txs}.values())
+        # One more signature is listed to end the last slice
+        signatures = self.iter_signatures(max_txs + 1 if max_txs > 0 else None, before, until)
 
-        return all_txs
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = deque()
+            slice_signatures = []
+            signatures_number = 0
+
+            for signature in signatures:
+                signatures_number += 1
+                slice_signatures.append(signature)
+
+                if len(slice_signatures) <= HELIUS_PAGE_SIZE:
+                    continue
+
+                # The slice ends before the next signature
+                futures.append(submit_in_context(executor, self.get_helius_slice, before, signature,
+                                                 slice_signatures[-2]))
+                before = slice_signatures[-2]
+                slice_signatures = [signature]
+
+                if len(futures) >= 2 * workers:
+                    yield futures.popleft().result()
+
+            # Otherwise the last slice ends at the until signature (or the first tx)
+            if 0 < max_txs < signatures_number:
+                # The extra signature only ends the last slice
+                until = slice_signatures.pop()
+                self.first_tx_reached = False
+
+            if len(slice_signatures) > 0:
+                futures.append(submit_in_context(executor, self.get_helius_slice, before, until,
+                                                 slice_signatures[-1]))
+
+            while len(futures) > 0:
+                yield futures.popleft().result()
+
+        log_event('helius_finished', signatures=min(signatures_number, max_txs) if max_txs > 0 else signatures_number)
+
+    def get_txs_helius(self, max_txs: int = None) -> list:
+        """
+        Get transactions for a given address using the Helius API
+
+        :param max_txs: max number of the newest txs (None - the helius_max_txs setting, 0 - the whole history)
+        :return: list of the parsed txs (newest first, without duplicates)
+        """
+        all_txs = {}
+
+        for page in self.iter_txs_helius(max_txs):
+            for tx in page:
+                all_txs.setdefault(tx['signature'], tx)
+
+        return list(all_txs.values())
@@ -0,0 +1,314 @@
+"""Gas price baseline built from the downloaded transactions (SQLite in src/cache).
+The gas prices of all the txs downloaded for any wallet are stored once per hash. Percentiles per hour and per day are
+updated for the periods touched by every new batch of txs, so the snipes can be detected against the gas prices of the
+same hour without any network requests (the txs of the analyzed wallet are left out of its baseline). Other exports
+(CSV or Parquet files with txs) can be imported in bulk. One GasBaseline is shared by the whole process
+
+Usage: python src/gas_baseline.py import txs.csv [txs.parquet ...]
+"""
+import sys
+import os
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+import argparse
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import configure_logging, log_event
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cache', 'gas_baseline.sqlite')
+
+# Settings
+gas_baseline_enabled = os.environ.get('gas_baseline', '1') != '0'
+gas_baseline_min_samples = int(os.environ.get('gas_baseline_min_samples', 20))
+
+# Resolutions of the percentiles: name -> seconds
+RESOLUTIONS = {'hour': 60 * 60, 'day': 24 * 60 * 60}
+PERCENTILES = {'p25': 0.25, 'p50': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+# Columns needed to add the txs to the baseline
+SAMPLE_COLUMNS = ['hash', 'blockNumber', 'timeStamp', 'gasPrice']
+
+# Max number of SQL parameters in one query
+QUERY_CHUNK_SIZE = 500
+
+
+class GasBaseline:
+    """
+    Gas price samples (one per tx hash) and their percentiles per hour and day
+    """
+    def __init__(self, file: str = BASELINE_FILE, min_samples: int = None) -> None:
+        """
+        Create a new GasBaseline, the database is opened on the first use
+
+        :param file: SQLite file
+        :param min_samples: min number of samples in a period to use its percentiles
+        """
+        self.file = file
+        self.min_samples = gas_baseline_min_samples if min_samples is None else min_samples
+        self.connection = None
+        # The connection is shared by the threads of the process (e.g. dashboard sessions)
+        self.lock = threading.RLock()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open the database and create the tables (WAL mode, many processes can add the samples at once)
+
+        :return: connection
+        """
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.file), exist_ok=True)
+
+            self.connection = sqlite3.connect(self.file, timeout=60, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    hash TEXT PRIMARY KEY, blockNumber INTEGER, timeStamp INTEGER, hour INTEGER, day INTEGER,
+                    gasPrice INTEGER);
+                CREATE INDEX IF NOT EXISTS samples_hour ON samples (hour);
+                CREATE INDEX IF NOT EXISTS samples_day ON samples (day);
+                CREATE TABLE IF NOT EXISTS percentiles (
+                    resolution TEXT, period INTEGER, count INTEGER, p25 REAL, p50 REAL, p75 REAL, p90 REAL,
+                    PRIMARY KEY (resolution, period));
+            """)
+
+        return self.connection
+
+    def close(self) -> None:
+        """
+        Close the database
+
+        :return: None
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def add_txs(self, txs_df: pd.DataFrame) -> int:
+        """
+        Add the gas prices of the txs (already known hashes are skipped) and update the percentiles of the touched
+        hours and days
+
+        :param txs_df: dataframe with the hash, blockNumber, timeStamp and gasPrice columns
+        :return: number of the new samples
+        """
+        if txs_df is None or not set(SAMPLE_COLUMNS) <= set(txs_df.columns):
+            return 0
+
+        samples_df = txs_df[SAMPLE_COLUMNS].dropna().drop_duplicates(subset='hash')
+        if len(samples_df) == 0:
+            return 0
+
+        timestamps = samples_df['timeStamp'].to_numpy(dtype=np.int64)
+        rows = zip(samples_df['hash'].astype(str), samples_df['blockNumber'].to_numpy(dtype=np.int64).tolist(),
+                   timestamps.tolist(), (timestamps // RESOLUTIONS['hour']).tolist(),
+                   (timestamps // RESOLUTIONS['day']).tolist(), samples_df['gasPrice'].to_numpy(dtype=np.int64).tolist())
+
+        with self.lock, self.connect() as connection:
+            changes = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO samples VALUES (?, ?, ?, ?, ?, ?)", rows)
+            added_samples = connection.total_changes - changes
+
+            if added_samples > 0:
+                for resolution, seconds in RESOLUTIONS.items():
+                    self.update_percentiles(resolution, np.unique(timestamps // seconds))
+
+        return added_samples
+
+    def calculate_percentiles(self, resolution: str, periods, exclude_hashes=None) -> pd.DataFrame:
+        """
+        Calculate the percentiles of the periods from their samples
+
+        :param resolution: hour or day
+        :param periods: period numbers (timestamp // seconds of the resolution)
+        :param exclude_hashes: hashes of the samples left out (None - all the samples)
+        :return: dataframe indexed by the period number with the count and percentile columns
+        """
+        connection = self.connect()
+        percentiles_dfs = []
+
+        for start in range(0, len(periods), QUERY_CHUNK_SIZE):
+            chunk = [int(period) for period in periods[start:start + QUERY_CHUNK_SIZE]]
+            samples_df = pd.read_sql_query(
+                f"SELECT {resolution} AS period, gasPrice{', hash' if exclude_hashes is not None else ''} "
+                f"FROM samples WHERE {resolution} IN ({','.join('?' * len(chunk))})", connection, params=chunk)
+
+            if exclude_hashes is not None:
+                samples_df = samples_df.loc[~samples_df['hash'].isin(exclude_hashes)]
+            if len(samples_df) == 0:
+                continue
+
+            grouped = samples_df.groupby('period')['gasPrice']
+            percentiles_df = grouped.quantile(list(PERCENTILES.values())).unstack()
+            percentiles_df.columns = list(PERCENTILES)
+            percentiles_df.insert(0, 'count', grouped.size())
+            percentiles_dfs.append(percentiles_df)
+
+        if len(percentiles_dfs) == 0:
+            return pd.DataFrame(columns=['count'] + list(PERCENTILES))
+
+        return pd.concat(percentiles_dfs)
+
+    def update_percentiles(self, resolution: str, periods: np.ndarray) -> None:
+        """
+        Calculate the percentiles of the periods again from all their samples
+
+        :param resolution: hour or day
+        :param periods: period numbers (timestamp // seconds of the resolution)
+        :return: None
+        """
+        percentiles_df = self.calculate_percentiles(resolution, periods)
+
+        self.connect().executemany(
+            "INSERT OR REPLACE INTO percentiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(resolution, int(period), int(row[0]), *map(float, row[1:]))
+             for period, row in zip(percentiles_df.index, percentiles_df.to_numpy())])
+
+    def get_percentiles(self, resolution: str, start: int = None, stop: int = None,
+                        exclude_hashes=None) -> pd.DataFrame:
+        """
+        Percentiles of the periods with at least min_samples samples
+
+        :param resolution: hour or day
+        :param start: first timestamp (None - from the first period)
+        :param stop: last timestamp (None - to the last period)
+        :param exclude_hashes: hashes of the samples left out, the percentiles of their periods are calculated again
+            without them (None - the stored percentiles)
+        :return: dataframe indexed by the period number with the count and percentile columns
+        """
+        seconds = RESOLUTIONS[resolution]
+        first_period = -1 if start is None else int(start) // seconds
+        last_period = 2 ** 62 if stop is None else int(stop) // seconds
+
+        with self.lock:
+            percentiles_df = pd.read_sql_query(
+                "SELECT period, count, p25, p50, p75, p90 FROM percentiles "
+                "WHERE resolution = ? AND period BETWEEN ? AND ? ORDER BY period", self.connect(),
+                params=[resolution, first_period, last_period], index_col='period')
+
+            if exclude_hashes is not None and len(exclude_hashes) > 0:
+                exclude_hashes = pd.Index(exclude_hashes).unique()
+                periods = set()
+
+                for start in range(0, len(exclude_hashes), QUERY_CHUNK_SIZE):
+                    chunk = [str(tx_hash) for tx_hash in exclude_hashes[start:start + QUERY_CHUNK_SIZE]]
+                    periods.update(period for period, in self.connect().execute(
+                        f"SELECT DISTINCT {resolution} FROM samples WHERE hash IN ({','.join('?' * len(chunk))}) "
+                        f"AND {resolution} BETWEEN ? AND ?", chunk + [first_period, last_period]))
+
+                if len(periods) > 0:
+                    percentiles_df = pd.concat([
+                        percentiles_df.drop(index=list(periods), errors='ignore'),
+                        self.calculate_percentiles(resolution, sorted(periods), exclude_hashes)]).sort_index()
+
+        return percentiles_df.loc[percentiles_df['count'] >= self.min_samples]
+
+    def lookup(self, timestamps, percentile: str = 'p50', exclude_hashes=None) -> np.ndarray:
+        """
+        Baseline gas price of the timestamps: percentile of the same hour, of the same day if the hour does not have
+        enough samples
+
+        :param timestamps: unix timestamps (seconds)
+        :param percentile: p25, p50, p75 or p90
+        :param exclude_hashes: hashes of the samples left out of the baseline (e.g. the txs of the analyzed wallet)
+        :return: float array with the gas prices (NaN if there are not enough samples)
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        gas_prices = np.full(len(timestamps), np.nan)
+
+        known = ~np.isnan(timestamps)
+        if not known.any():
+            return gas_prices
+
+        for resolution, seconds in RESOLUTIONS.items():
+            missing = known & np.isnan(gas_prices)
+            if not missing.any():
+                break
+
+            percentiles_df = self.get_percentiles(resolution, timestamps[known].min(), timestamps[known].max(),
+                                                  exclude_hashes)
+            periods = percentiles_df.index.to_numpy()
+            if len(periods) == 0:
+                continue
+
+            tx_periods = (timestamps[missing] // seconds).astype(np.int64)
+            positions = np.clip(np.searchsorted(periods, tx_periods), 0, len(periods) - 1)
+            found = periods[positions] == tx_periods
+
+            values = np.full(len(tx_periods), np.nan)
+            values[found] = percentiles_df[percentile].to_numpy()[positions[found]]
+            gas_prices[missing] = values
+
+        return gas_prices
+
+    def import_file(self, file: str, chunk_size: int = 100000) -> int:
+        """
+        Bulk import of the gas prices from a CSV or Parquet file with the SAMPLE_COLUMNS (e.g. export of all the
+        txs of a block range)
+
+        :param file: CSV or Parquet file
+        :param chunk_size: number of rows added at once (CSV files)
+        :return: number of the new samples
+        """
+        if file.endswith('.parquet'):
+            chunks = [pd.read_parquet(file, columns=SAMPLE_COLUMNS)]
+        else:
+            chunks = pd.read_csv(file, usecols=SAMPLE_COLUMNS, chunksize=chunk_size)
+
+        added_samples = 0
+        for chunk in chunks:
+            chunk['hash'] = chunk['hash'].str.lower()
+            added_samples += self.add_txs(chunk)
+            log_event('gas_prices_imported', file=file, samples=added_samples)
+
+        return added_samples
+
+
+_gas_baseline = None
+_gas_baseline_lock = threading.Lock()
+
+
+def get_gas_baseline() -> GasBaseline:
+    """
+    Get the gas baseline shared by the whole process (one database connection)
+
+    :return: GasBaseline
+    """
+    global _gas_baseline
+
+    with _gas_baseline_lock:
+        if _gas_baseline is None:
+            _gas_baseline = GasBaseline()
+
+        return _gas_baseline
+
+
+def main() -> None:
+    """
+    Command line interface of the bulk import
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Import the gas prices of txs to the local gas baseline")
+    parser.add_argument('command', choices=['import'])
+    parser.add_argument('files', nargs='+', help="CSV or Parquet files with the hash, blockNumber, timeStamp and "
+                                                "gasPrice columns")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    gas_baseline = GasBaseline()
+    for file in args.files:
+        gas_baseline.import_file(file)
+    gas_baseline.close()
+
+
+if __name__ == '__main__':
+    main()
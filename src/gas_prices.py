@@ -0,0 +1,135 @@
+"""Daily average gas price history (Etherscan export) for the snipe detection.
+The CSV file is parsed once into an int64 array indexed by the day number (timestamp // 86400) and saved as a .npy file
+in src/cache. The array is memory-mapped, so all the processes share the same pages, and it is loaded only once per
+process
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+CURRENT_LOCATION = os.path.dirname(os.path.realpath(__file__))
+GAS_PRICE_FILE = os.path.join(CURRENT_LOCATION, 'data', 'export-AvgGasPrice.csv')
+GAS_PRICE_CACHE_FILE = os.path.join(CURRENT_LOCATION, 'cache', 'avg_gas_price.npy')
+
+SECONDS_PER_DAY = 86400
+
+# Value of the days without the avg gas price in the array
+MISSING_PRICE = -1
+
+# Arrays loaded in this process, (file, cache_file) -> DailyGasPrices
+_loaded = {}
+_lock = threading.Lock()
+
+
+def read_gas_price_csv(file: str = GAS_PRICE_FILE) -> pd.DataFrame:
+    """
+    Load gas price history (export data from Etherscan.io)
+
+    :param file: CSV file with gas price history
+    :return: dataframe with the date and avgGasPrice columns
+    """
+    gas_price_df = pd.read_csv(file, header=0)
+
+    gas_price_df["date"] = pd.to_datetime(gas_price_df["Date(UTC)"])
+    gas_price_df["avgGasPrice"] = gas_price_df["Value (Wei)"].astype(np.int64)
+    gas_price_df = gas_price_df.drop(columns=["UnixTimeStamp", "Date(UTC)", "Value (Wei)"])
+
+    return gas_price_df
+
+
+class DailyGasPrices:
+    """
+    Avg gas price per day, array indexed by the day number (days since 1970-01-01 UTC)
+    """
+    def __init__(self, prices: np.ndarray) -> None:
+        """
+        :param prices: int64 array with the avg gas price of every day (MISSING_PRICE if unknown)
+        """
+        self.prices = prices
+
+    @classmethod
+    def from_csv(cls, file: str = GAS_PRICE_FILE) -> 'DailyGasPrices':
+        """
+        Create the array from the Etherscan export
+
+        :param file: CSV file with gas price history
+        :return: DailyGasPrices
+        """
+        gas_price_df = read_gas_price_csv(file).drop_duplicates(subset='date')
+        days = gas_price_df['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+
+        prices = np.full(days.max() + 1 if len(days) > 0 else 0, MISSING_PRICE, dtype=np.int64)
+        prices[days] = gas_price_df['avgGasPrice'].to_numpy()
+
+        return cls(prices)
+
+    @classmethod
+    def load(cls, file: str = GAS_PRICE_FILE, cache_file: str = GAS_PRICE_CACHE_FILE) -> 'DailyGasPrices':
+        """
+        Memory-map the cached array, it is created again if the CSV file has changed since it was saved
+
+        :param file: CSV file with gas price history
+        :param cache_file: .npy file with the array
+        :return: DailyGasPrices
+        """
+        if not os.path.exists(cache_file) or os.path.getmtime(cache_file) < os.path.getmtime(file):
+            daily_gas_prices = cls.from_csv(file)
+            daily_gas_prices.save(cache_file)
+
+        return cls(np.load(cache_file, mmap_mode='r'))
+
+    def save(self, cache_file: str = GAS_PRICE_CACHE_FILE) -> None:
+        """
+        Save the array as a .npy file (written to a temporary file first, other processes may read the old one)
+
+        :param cache_file: .npy file
+        :return: None
+        """
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp.npy"
+        np.save(tmp_file, self.prices)
+        os.replace(tmp_file, cache_file)
+
+    def lookup(self, timestamps) -> np.ndarray:
+        """
+        Avg gas price of the days of the timestamps
+
+        :param timestamps: unix timestamps (seconds)
+        :return: float array with the avg gas prices (NaN for the days without the price)
+        """
+        days = np.asarray(timestamps, dtype=float) // SECONDS_PER_DAY
+
+        known = (days >= 0) & (days < len(self.prices))
+        avg_gas_prices = np.full(len(days), np.nan)
+        avg_gas_prices[known] = self.prices[days[known].astype(np.int64)]
+        avg_gas_prices[avg_gas_prices == MISSING_PRICE] = np.nan
+
+        return avg_gas_prices
+
+
+def get_daily_gas_prices(file: str = GAS_PRICE_FILE, cache_file: str = GAS_PRICE_CACHE_FILE) -> DailyGasPrices:
+    """
+    Get the daily gas prices, loaded only once per process
+
+    :param file: CSV file with gas price history
+    :param cache_file: .npy file with the array
+    :return: DailyGasPrices
+    """
+    with _lock:
+        if (file, cache_file) not in _loaded:
+            _loaded[(file, cache_file)] = DailyGasPrices.load(file, cache_file)
+
+        return _loaded[(file, cache_file)]
+
+
+def clear_loaded() -> None:
+    """
+    Forget the arrays loaded in this process (they are loaded again on the next use)
+
+    :return: None
+    """
+    with _lock:
+        _loaded.clear()
@@ -0,0 +1,462 @@
+"""Lightweight instrumentation of the pipeline.
+Every instrumented stage records its wall time, rows in/out, the full copies of the main dataframe it made and the
+peak RSS of the process, every API request its
+time, bytes and retries. The records of one run (one wallet analysis) are collected in a RunReport, which can be saved
+as JSON. Nothing is recorded outside of a run, so the instrumented functions cost one context variable lookup.
+
+The log messages of all the modules are structured events of the 'wallet_analyzer' logger (text or JSON lines, see
+configure_logging). A run can be profiled with cProfile or pyinstrument (if installed)
+
+Usage:
+    with start_run(wallet, profiler='cprofile') as run_report:
+        wallet_analyzer.get_data()
+        ...
+    run_report.to_json('report.json')
+"""
+import contextlib
+import contextvars
+import datetime
+import functools
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+logger = logging.getLogger('wallet_analyzer')
+
+# Settings
+log_format = os.environ.get('log_format', 'text')
+# cprofile or pyinstrument, every run is profiled
+profiler_name = os.environ.get('profiler') or None
+# Folder the reports of all the runs are saved to (None - not saved)
+run_reports_dir = os.environ.get('run_reports_dir') or None
+
+PROFILERS = ['cprofile', 'pyinstrument']
+
+# Number of the functions in the cProfile stats of the report
+PROFILE_LINES = 40
+
+# Report of the current run and the stage being run (copied to the downloader threads, see submit_in_context)
+_run_report = contextvars.ContextVar('run_report', default=None)
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+_current_record = contextvars.ContextVar('current_record', default=None)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of the process (high-water mark since the start)
+
+    :return: MB or None if it is not available
+    """
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes on Linux
+    return max_rss / 1024 ** 2 if sys.platform == 'darwin' else max_rss / 1024
+
+
+def count_rows(value):
+    """
+    Number of rows of a dataframe (or any sized value)
+
+    :param value: dataframe, list, ...
+    :return: number of rows or None
+    """
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+class RunReport:
+    """
+    Stage and download records of one run. Records can be added from many threads at once
+    """
+    def __init__(self, name: str) -> None:
+        """
+        :param name: name of the run (e.g. wallet address)
+        """
+        self.name = name
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.seconds = None
+        self.stages = []
+        self.downloads = []
+        self.profile = None
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+
+    def add_stage(self, record: dict) -> None:
+        with self.lock:
+            self.stages.append(record)
+
+    def add_download(self, record: dict) -> None:
+        with self.lock:
+            self.downloads.append(record)
+
+    def finish(self) -> None:
+        """
+        Set the wall time of the whole run
+
+        :return: None
+        """
+        self.seconds = time.perf_counter() - self.start_time
+
+    def stages_df(self) -> pd.DataFrame:
+        """
+        All the stage calls in the order they finished
+
+        :return: dataframe with one row per call
+        """
+        return pd.DataFrame(self.stages, columns=['stage', 'parent', 'seconds', 'rowsIn', 'rowsOut', 'frameCopies',
+                                                  'copiedMB', 'peakRssMB', 'rssGrowthMB', 'error'])
+
+    def downloads_df(self) -> pd.DataFrame:
+        """
+        All the API requests
+
+        :return: dataframe with one row per request
+        """
+        return pd.DataFrame(self.downloads, columns=['url', 'status', 'seconds', 'bytes', 'attempts', 'fromCache',
+                                                     'stage'])
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Time, rows and memory per stage (the stages called many times, e.g. per page, are summed up) and one row with
+        all the downloads
+
+        :return: dataframe indexed by the stage name
+        """
+        stages_df = self.stages_df()
+        summary_df = stages_df.groupby('stage', sort=False).agg(
+            calls=('seconds', 'size'), seconds=('seconds', 'sum'), rowsIn=('rowsIn', 'sum'),
+            rowsOut=('rowsOut', 'sum'), frameCopies=('frameCopies', 'sum'), copiedMB=('copiedMB', 'sum'),
+            peakRssMB=('peakRssMB', 'max'), rssGrowthMB=('rssGrowthMB', 'sum'))
+
+        downloads_df = self.downloads_df()
+        if len(downloads_df) > 0:
+            summary_df.loc['downloads', ['calls', 'seconds']] = [len(downloads_df), downloads_df['seconds'].sum()]
+            summary_df.loc['downloads', 'bytes'] = downloads_df['bytes'].sum()
+
+        return summary_df
+
+    def to_dict(self) -> dict:
+        """
+        The whole report (JSON serializable)
+
+        :return: dict with the run metadata, stages, downloads and profile
+        """
+        with self.lock:
+            stages = list(self.stages)
+            downloads = list(self.downloads)
+
+        return {
+            'name': self.name,
+            'started': self.started.isoformat(),
+            'seconds': self.seconds,
+            'peakRssMB': peak_rss_mb(),
+            'downloadedBytes': sum(download['bytes'] for download in downloads),
+            'stages': stages,
+            'downloads': downloads,
+            'profile': self.profile,
+        }
+
+    def to_json(self, file: str = None) -> str:
+        """
+        The report as JSON
+
+        :param file: file to save the report to (None - not saved)
+        :return: JSON string
+        """
+        report_json = json.dumps(self.to_dict(), indent=2, default=str)
+
+        if file is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok=True)
+            with open(file, 'w') as report_file:
+                report_file.write(report_json)
+
+        return report_json
+
+
+class Profiler:
+    """
+    cProfile or pyinstrument profiler of a run, the result is text for the report
+    """
+    def __init__(self, name: str) -> None:
+        """
+        :param name: cprofile or pyinstrument
+        """
+        if name not in PROFILERS:
+            raise ValueError(f"Unknown profiler {name}, use one of {PROFILERS}")
+
+        self.name = name
+
+        if name == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                raise ImportError("pyinstrument is not installed, use pip install pyinstrument or the cprofile "
+                                  "profiler") from None
+            self.profiler = pyinstrument.Profiler()
+        else:
+            import cProfile
+            self.profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.name == 'pyinstrument':
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self) -> str:
+        """
+        Stop the profiler
+
+        :return: text output (cProfile - PROFILE_LINES functions with the highest cumulative time)
+        """
+        if self.name == 'pyinstrument':
+            self.profiler.stop()
+            return self.profiler.output_text()
+
+        import pstats
+
+        self.profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+
+        return output.getvalue()
+
+
+def get_run_report():
+    """
+    Report of the current run
+
+    :return: RunReport or None outside of a run
+    """
+    return _run_report.get()
+
+
+@contextlib.contextmanager
+def start_run(name: str, profiler: str = None, report_file: str = None):
+    """
+    Collect the records of all the instrumented stages and requests in the block (the run can be nested in another
+    run, e.g. the dashboard stages)
+
+    :param name: name of the run (e.g. wallet address)
+    :param profiler: cprofile or pyinstrument (None - the profiler setting)
+    :param report_file: JSON file to save the report to (None - saved to run_reports_dir if set)
+    :return: context manager yielding the RunReport
+    """
+    run_report = RunReport(name)
+    profiler = profiler or profiler_name
+    run_profiler = Profiler(profiler) if profiler else None
+
+    token = _run_report.set(run_report)
+    if run_profiler is not None:
+        run_profiler.start()
+
+    try:
+        yield run_report
+    finally:
+        if run_profiler is not None:
+            run_report.profile = run_profiler.stop()
+
+        _run_report.reset(token)
+        run_report.finish()
+
+        log_event('run_finished', run=name, seconds=round(run_report.seconds, 3), stages=len(run_report.stages),
+                  downloads=len(run_report.downloads), peakRssMB=peak_rss_mb())
+
+        if report_file is None and run_reports_dir is not None:
+            report_file = os.path.join(run_reports_dir,
+                                       f"{name}-{run_report.started.strftime('%Y%m%dT%H%M%S%f')}.json")
+        if report_file is not None:
+            run_report.to_json(report_file)
+
+
+@contextlib.contextmanager
+def stage(name: str, rows_in=None):
+    """
+    Record one stage of the current run (nothing is recorded outside of a run)
+
+    :param name: stage name
+    :param rows_in: number of the input rows
+    :return: context manager yielding the record, the stage sets its 'rowsOut'
+    """
+    run_report = _run_report.get()
+    if run_report is None:
+        yield {}
+        return
+
+    record = {'stage': name, 'parent': _current_stage.get(), 'seconds': None, 'rowsIn': rows_in, 'rowsOut': None,
+              'frameCopies': 0, 'copiedMB': 0.0, 'peakRssMB': None, 'rssGrowthMB': None, 'error': None}
+    token = _current_stage.set(name)
+    record_token = _current_record.set(record)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+
+    try:
+        yield record
+    except Exception as error:
+        record['error'] = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        record['peakRssMB'] = peak_rss_mb()
+        if rss_before is not None:
+            record['rssGrowthMB'] = record['peakRssMB'] - rss_before
+        _current_stage.reset(token)
+        _current_record.reset(record_token)
+
+        run_report.add_stage(record)
+        log_event('stage_finished', logging.DEBUG, **record)
+
+
+def instrumented_stage(name: str = None, rows_attribute: str = 'txs_df'):
+    """
+    Decorator of the pipeline methods: the call is recorded as a stage of the current run. The input rows are the rows
+    of the first argument if it is a dataframe (else of the rows_attribute of the object), the output rows are the
+    rows of the result if it is a dataframe (else of the rows_attribute)
+
+    :param name: stage name (the qualified name of the method by default)
+    :param rows_attribute: attribute of the object with the main dataframe
+    :return: decorator
+    """
+    def decorator(method):
+        stage_name = name or method.__qualname__
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if _run_report.get() is None:
+                return method(self, *args, **kwargs)
+
+            rows_in = args[0] if len(args) > 0 and isinstance(args[0], pd.DataFrame) \
+                else getattr(self, rows_attribute, None)
+
+            with stage(stage_name, count_rows(rows_in)) as record:
+                result = method(self, *args, **kwargs)
+                record['rowsOut'] = count_rows(result if isinstance(result, pd.DataFrame)
+                                               else getattr(self, rows_attribute, None))
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def record_frame_copy(df: pd.DataFrame) -> None:
+    """
+    Count a new full copy of the main dataframe (e.g. concat of all its rows) in the record of the current stage
+
+    :param df: the new dataframe
+    :return: None
+    """
+    record = _current_record.get()
+
+    if record is not None:
+        record['frameCopies'] += 1
+        record['copiedMB'] += df.memory_usage(index=False).sum() / 1024 ** 2
+
+
+def record_download(url: str, status, seconds: float, size: int, attempts: int, from_cache: bool) -> None:
+    """
+    Record one API request in the current run (the url is recorded without the query, it contains the API keys)
+
+    :param url: request url
+    :param status: HTTP status code (None if the request failed)
+    :param seconds: wall time with the rate limiter waits and retries
+    :param size: bytes of the response body
+    :param attempts: number of the sent requests
+    :param from_cache: whether the response was read from the HTTP cache
+    :return: None
+    """
+    record = {'url': url.split('?')[0], 'status': status, 'seconds': seconds, 'bytes': size, 'attempts': attempts,
+              'fromCache': from_cache, 'stage': _current_stage.get()}
+
+    run_report = _run_report.get()
+    if run_report is not None:
+        run_report.add_download(record)
+
+    log_event('request_finished', logging.DEBUG, **record)
+
+
+def submit_in_context(executor, function, *args):
+    """
+    Submit the function to a thread pool with a copy of the current context, so its stages and requests are recorded
+    in the current run
+
+    :param executor: ThreadPoolExecutor
+    :param function: function to run
+    :param args: arguments of the function
+    :return: future
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:
+    """
+    Log a structured event of the 'wallet_analyzer' logger
+
+    :param event: event name, e.g. stage_finished
+    :param level: logging level
+    :param fields: values of the event
+    :return: None
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'event': event, 'fields': fields})
+
+
+class EventFormatter(logging.Formatter):
+    """
+    Formatter of the events: 'event key=value ...' text or one JSON object per line
+    """
+    def __init__(self, json_lines: bool = False) -> None:
+        """
+        :param json_lines: whether to format the events as JSON
+        """
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        event = getattr(record, 'event', record.getMessage())
+        fields = getattr(record, 'fields', {})
+
+        if self.json_lines:
+            return json.dumps({'time': datetime.datetime.fromtimestamp(record.created).isoformat(),
+                               'level': record.levelname, 'event': event, **fields}, default=str)
+
+        return ' '.join([event] + [f"{key}={value}" for key, value in fields.items()])
+
+
+def configure_logging(level: int = logging.INFO, json_lines: bool = None) -> None:
+    """
+    Print the events to stderr (command line tools), only the first call adds the handler
+
+    :param level: min logging level
+    :param json_lines: whether to print JSON lines (None - the log_format setting)
+    :return: None
+    """
+    json_lines = log_format == 'json' if json_lines is None else json_lines
+    logger.setLevel(level)
+
+    if not any(getattr(handler, 'wallet_analyzer', False) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.wallet_analyzer = True
+        logger.addHandler(handler)
+    else:
+        handler = next(handler for handler in logger.handlers if getattr(handler, 'wallet_analyzer', False))
+
+    handler.setFormatter(EventFormatter(json_lines))
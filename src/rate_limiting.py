@@ -0,0 +1,175 @@
+"""Rate limiting (token bucket per API key) and retries with backoff for all the API downloaders"""
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from src.instrumentation import log_event, record_download
+
+# HTTP status codes worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RateLimitError(Exception):
+    """
+    The API still refused the request after all the retries
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows bursts of up to 'capacity' calls and 'rate' calls per second on average
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        :param rate: number of tokens (calls) added per second
+        :param capacity: max number of tokens (burst size), rate by default
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.last_refill_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Take one token, sleep until it is available
+
+        :return: None
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill_time) * self.rate)
+                self.last_refill_time = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait_time = (1 - self.tokens) / self.rate
+
+            time.sleep(wait_time)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Empty the bucket for the given time (e.g. after the API asked to retry later), so all the threads using the
+        same API key wait
+
+        :param seconds: pause length
+        :return: None
+        """
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+            self.last_refill_time = time.monotonic()
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(key: str, rate: float, capacity: float = None) -> TokenBucket:
+    """
+    Get the token bucket shared by all the downloaders using the same API key (created on the first call)
+
+    :param key: API name and key
+    :param rate: calls per second allowed for the key
+    :param capacity: max burst size
+    :return: token bucket
+    """
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(rate, capacity)
+
+        return _buckets[key]
+
+
+def get_retry_after(response: requests.Response):
+    """
+    Get the number of seconds from the Retry-After header
+
+    :param response: API response
+    :return: seconds or None if there is no header (or it is a date)
+    """
+    retry_after = response.headers.get('Retry-After')
+
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Exponential backoff with full jitter
+
+    :param attempt: number of the retry (from 0)
+    :param base_delay: delay of the first retry
+    :param max_delay: max delay
+    :return: seconds to wait
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def request_with_retry(session: requests.Session, method: str, url: str, bucket: TokenBucket,
+                       is_rate_limited=None, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                       **kwargs) -> requests.Response:
+    """
+    Send the request when the bucket allows it (requests answered from the session cache do not wait). Retry on connection errors, 429 and 5xx responses and responses
+    recognized by is_rate_limited, waiting Retry-After seconds or the jittered exponential backoff. The request is
+    recorded in the current run report (time with the waits, bytes, attempts)
+
+    :param session: HTTP session
+    :param method: HTTP method
+    :param url: request url
+    :param bucket: token bucket of the API key
+    :param is_rate_limited: function (response) -> bool for APIs that report the rate limit in the body
+    :param max_retries: max number of retries
+    :param base_delay: delay of the first retry (seconds)
+    :param max_delay: max delay between the retries (seconds)
+    :param kwargs: other arguments of session.request
+    :return: response
+    """
+    start = time.perf_counter()
+
+    for attempt in range(max_retries + 1):
+        is_cached = getattr(session, 'is_cached', None)
+        if is_cached is None or not is_cached(method, url, **kwargs):
+            bucket.acquire()
+
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if attempt == max_retries:
+                record_download(url, None, time.perf_counter() - start, 0, attempt + 1, False)
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            log_event('request_error', logging.WARNING, url=url.split('?')[0], error=str(error),
+                      retryIn=round(delay, 1))
+            time.sleep(delay)
+            continue
+
+        rate_limited = response.status_code in RETRY_STATUS_CODES or (
+                is_rate_limited is not None and is_rate_limited(response))
+
+        if not rate_limited:
+            record_download(url, response.status_code, time.perf_counter() - start, len(response.content),
+                            attempt + 1, bool(getattr(response, 'from_cache', False)))
+            return response
+
+        if attempt == max_retries:
+            break
+
+        retry_after = get_retry_after(response)
+        delay = retry_after if retry_after is not None else backoff_delay(attempt, base_delay, max_delay)
+
+        # Slow down all the threads using the same key
+        bucket.pause(delay)
+        log_event('rate_limited', logging.WARNING, url=url.split('?')[0], status=response.status_code,
+                  retryIn=round(delay, 1))
+
+    record_download(url, response.status_code, time.perf_counter() - start, len(response.content), max_retries + 1,
+                    False)
+    raise RateLimitError(f"Request still rate limited after {max_retries} retries: {url.split('?')[0]}")
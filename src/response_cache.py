@@ -0,0 +1,200 @@
+"""Persistent HTTP response cache (SQLite in src/cache) for the API downloaders.
+Responses with only finalized blocks never change, so they are cached forever. Other responses expire after the TTL
+of their action
+"""
+import os
+import threading
+
+import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+
+from src.instrumentation import log_event
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cache', 'http_cache')
+
+# Blocks older than (newest known block - FINALIZED_BLOCKS) can not change anymore
+FINALIZED_BLOCKS = 128
+
+# Default TTL of the responses per action (seconds)
+ACTION_TTLS = {
+    'txlist': 10 * 60,
+    'tokentx': 10 * 60,
+    'txlistinternal': 10 * 60,
+    'helius': 10 * 60,
+    'solana.fm': 60 * 60,
+}
+DEFAULT_TTL = 10 * 60
+
+# URL params not used in the cache keys (and not stored)
+IGNORED_PARAMETERS = ['apikey', 'api-key']
+
+# Check the cache size every EVICTION_INTERVAL downloaded (not cached) responses
+EVICTION_INTERVAL = 100
+
+
+def is_cacheable(response) -> bool:
+    """
+    Etherscan returns errors (rate limit, invalid API key) with status 200 and "NOTOK" message, they are not cached
+
+    :param response: API response
+    :return: whether to cache the response
+    """
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+
+    return not (isinstance(data, dict) and data.get('message') == 'NOTOK')
+
+
+class ResponseCache:
+    """
+    HTTP session with a persistent response cache, TTLs per action, size-based eviction and hit/miss counters.
+    Use it like requests.Session (only the request method)
+    """
+    def __init__(self, cache_file: str = CACHE_FILE, enabled: bool = True, ttls: dict = None,
+                 max_size_mb: float = 200, pool_size: int = 8):
+        """
+        :param cache_file: SQLite file of the cache (without .sqlite)
+        :param enabled: whether to cache the responses (if False it is a plain pooled session)
+        :param ttls: TTL per action in seconds (ACTION_TTLS by default)
+        :param max_size_mb: max size of the cache file, the oldest responses are evicted above it
+        :param pool_size: number of pooled connections per host
+        """
+        self.enabled = enabled
+        self.ttls = {**ACTION_TTLS, **(ttls or {})}
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+
+        if enabled:
+            self.session = requests_cache.CachedSession(cache_file, backend='sqlite', expire_after=DEFAULT_TTL,
+                                                        ignored_parameters=IGNORED_PARAMETERS,
+                                                        allowable_codes=(200,), filter_fn=is_cacheable)
+        else:
+            self.session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_ttl(self, action: str, finalized: bool = False):
+        """
+        Get the TTL of the response
+
+        :param action: API action (txlist, tokentx, txlistinternal, helius, solana.fm)
+        :param finalized: whether the response contains only finalized blocks (never changes)
+        :return: TTL in seconds or requests_cache.NEVER_EXPIRE
+        """
+        if finalized:
+            return requests_cache.NEVER_EXPIRE
+
+        return self.ttls.get(action, DEFAULT_TTL)
+
+    def request(self, method: str, url: str, action: str = None, finalized: bool = False, **kwargs):
+        """
+        Send the request, return the cached response if there is one
+
+        :param method: HTTP method
+        :param url: request url
+        :param action: API action, used to select the TTL
+        :param finalized: whether the response will contain only finalized blocks
+        :param kwargs: other arguments of requests.Session.request
+        :return: response
+        """
+        if not self.enabled:
+            return self.session.request(method, url, **kwargs)
+
+        response = self.session.request(method, url, expire_after=self.get_ttl(action, finalized), **kwargs)
+
+        check_size = False
+
+        with self.lock:
+            if getattr(response, 'from_cache', False):
+                self.hits += 1
+            else:
+                self.misses += 1
+                check_size = self.misses % EVICTION_INTERVAL == 0
+
+        if check_size:
+            self.evict()
+
+        return response
+
+    def is_cached(self, method: str, url: str, params: dict = None, headers: dict = None, **kwargs) -> bool:
+        """
+        Check if there is a not expired cached response for the request (cached responses are not rate limited)
+
+        :param method: HTTP method
+        :param url: request url
+        :param params: URL params
+        :param headers: request headers
+        :param kwargs: other arguments of the request (not used in the cache key)
+        :return: whether the response will be read from the cache
+        """
+        if not self.enabled:
+            return False
+
+        request = self.session.prepare_request(requests.Request(method, url, params=params, headers=headers))
+        response = self.session.cache.get_response(self.session.cache.create_key(request))
+
+        return response is not None and not response.is_expired
+
+    def size(self) -> int:
+        """
+        Size of the cache file
+
+        :return: size in bytes
+        """
+        if not self.enabled:
+            return 0
+
+        return self.session.cache.responses.size()
+
+    def evict(self) -> None:
+        """
+        Remove the expired responses and then the oldest responses until the cache is smaller than the max size
+
+        :return: None
+        """
+        if not self.enabled or self.size() <= self.max_size_bytes:
+            return
+
+        self.session.cache.delete(expired=True, vacuum=True)
+
+        if self.size() <= self.max_size_bytes:
+            return
+
+        responses = sorted(self.session.cache.responses.values(), key=lambda response: response.created_at)
+
+        # Evict down to 80% of the max size, so it is not done after every request
+        size_to_free = self.size() - 0.8 * self.max_size_bytes
+        keys = []
+
+        for response in responses:
+            if size_to_free <= 0:
+                break
+            keys.append(response.cache_key)
+            size_to_free -= len(response.content)
+
+        self.session.cache.delete(*keys, vacuum=True)
+        log_event('cache_evicted', responses=len(keys))
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters
+
+        :return: dict with hits, misses and size in bytes
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': self.size()}
+
+    def clear(self) -> None:
+        """
+        Remove all the cached responses
+
+        :return: None
+        """
+        if self.enabled:
+            self.session.cache.clear()
@@ -0,0 +1,167 @@
+"""Local store of the parsed Solana txs used for the incremental sync.
+The txs are kept in Arrow IPC segment files (newest segment first) with the signatures of the newest and the oldest
+synced tx. Refreshes add the txs newer than the newest signature, older history is added only when it is needed.
+Segments are not compressed, so they are memory-mapped when loaded and only the selected columns are read
+"""
+import json
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cache', 'solana')
+
+
+class SolanaStore:
+    """
+    Store the parsed txs per wallet in <folder>/<wallet>/*.arrow files with the synced signatures range
+    """
+    def __init__(self, folder: str = STORE_DIR):
+        """
+        Create a new SolanaStore in the given folder
+
+        :param folder: directory of the store
+        """
+        self.folder = folder
+
+    def get_dir(self, address: str) -> str:
+        """
+        Directory with the files of the given wallet (Solana addresses are case sensitive)
+
+        :param address: Wallet address
+        :return: directory path
+        """
+        return os.path.join(self.folder, address)
+
+    def load_state(self, address: str) -> dict:
+        """
+        Load the sync state: signatures of the newest and the oldest stored tx, whether the whole history is stored
+        and the list of segments (newest first)
+
+        :param address: Wallet address
+        :return: dict with 'newest_signature', 'oldest_signature', 'complete' and 'segments' keys
+        """
+        state_file = os.path.join(self.get_dir(address), 'state.json')
+
+        if not os.path.exists(state_file):
+            return {'newest_signature': None, 'oldest_signature': None, 'complete': False, 'segments': []}
+
+        with open(state_file, 'r') as file:
+            return json.load(file)
+
+    def save_state(self, address: str, state: dict) -> None:
+        """
+        Save the sync state
+
+        :param address: Wallet address
+        :param state: dict with 'newest_signature', 'oldest_signature', 'complete' and 'segments' keys
+        :return: None
+        """
+        state_file = os.path.join(self.get_dir(address), 'state.json')
+
+        # Write to a temp file first, so the state is never left half written
+        with open(state_file + '.tmp', 'w') as file:
+            json.dump(state, file)
+        os.replace(state_file + '.tmp', state_file)
+
+    def rows(self, address: str) -> int:
+        """
+        Get the number of the stored txs
+
+        :param address: Wallet address
+        :return: number of txs
+        """
+        return sum(segment['rows'] for segment in self.load_state(address)['segments'])
+
+    def add_segment(self, address: str, table: pa.Table, older: bool, complete: bool = False) -> None:
+        """
+        Store the txs downloaded after the newest or before the oldest stored tx and move the signatures range
+
+        :param address: Wallet address
+        :param table: parsed txs (newest first) with the 'hash' column
+        :param older: whether the txs are older than the stored ones (newer otherwise)
+        :param complete: whether the txs reach the first tx of the wallet
+        :return: None
+        """
+        os.makedirs(self.get_dir(address), exist_ok=True)
+        state = self.load_state(address)
+
+        if table.num_rows > 0:
+            segment_file = f"{len(state['segments']):06d}-{uuid.uuid4().hex[:8]}.arrow"
+            segment_path = os.path.join(self.get_dir(address), segment_file)
+
+            # The segment is added to the state only when it is fully written
+            with pa.OSFile(segment_path + '.tmp', 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(segment_path + '.tmp', segment_path)
+
+            segment = {'file': segment_file, 'rows': table.num_rows}
+            hashes = table.column('hash')
+
+            if state['newest_signature'] is None:
+                state['newest_signature'] = hashes[0].as_py()
+                state['oldest_signature'] = hashes[-1].as_py()
+                state['segments'] = [segment]
+            elif older:
+                state['oldest_signature'] = hashes[-1].as_py()
+                state['segments'].append(segment)
+            else:
+                state['newest_signature'] = hashes[0].as_py()
+                state['segments'].insert(0, segment)
+
+        state['complete'] = state['complete'] or complete
+
+        self.save_state(address, state)
+
+    def load_table(self, address: str, columns: list = None) -> pa.Table:
+        """
+        Read the stored txs (newest first). The segments are memory-mapped, only the pages of the selected columns
+        are read from the disk
+
+        :param address: Wallet address
+        :param columns: columns to read (all by default)
+        :return: Arrow table or None if nothing was stored
+        """
+        tables = []
+
+        for segment in self.load_state(address)['segments']:
+            table = pa.ipc.open_file(pa.memory_map(os.path.join(self.get_dir(address), segment['file']))).read_all()
+            if columns is not None:
+                table = table.select([name for name in columns if name in table.schema.names])
+            tables.append(table)
+
+        if len(tables) == 0:
+            return None
+
+        return pa.concat_tables(tables)
+
+    def load(self, address: str, columns: list = None) -> pd.DataFrame:
+        """
+        Read the stored txs as a dataframe (newest first)
+
+        :param address: Wallet address
+        :param columns: columns to read (all by default)
+        :return: dataframe (empty if nothing was stored)
+        """
+        table = self.load_table(address, columns)
+
+        if table is None:
+            return pd.DataFrame()
+
+        return table.to_pandas()
+
+    def clear(self, address: str) -> None:
+        """
+        Remove all the stored txs of the given wallet
+
+        :param address: Wallet address
+        :return: None
+        """
+        for segment in self.load_state(address)['segments']:
+            os.remove(os.path.join(self.get_dir(address), segment['file']))
+
+        state_file = os.path.join(self.get_dir(address), 'state.json')
+        if os.path.exists(state_file):
+            os.remove(state_file)
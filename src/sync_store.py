@@ -0,0 +1,234 @@
+"""Local store of the downloaded txs used for the incremental sync.
+Every sync appends only the txs from the blocks newer than the last synced block (one segment file per sync)
+"""
+import json
+import os
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cache', 'sync')
+
+# Fields that identify a tx: hash for normal txs, hash + traceId for internal txs, hash + logIndex for token txs
+# (token txs without logIndex are identified by the transfer details)
+KEY_FIELDS = ('hash', 'traceId', 'logIndex', 'contractAddress', 'from', 'to', 'value')
+
+
+def tx_key(tx: dict) -> tuple:
+    """
+    Get the key that identifies the tx (used to remove duplicates)
+
+    :param tx: tx from the API
+    :return: tuple with the values of KEY_FIELDS
+    """
+    return tuple(tx.get(field) for field in KEY_FIELDS)
+
+
+class SyncStore:
+    """
+    Store the txs per wallet/endpoint/action with the highest synced block number
+    """
+    def __init__(self, folder: str = STORE_DIR):
+        """
+        Create a new SyncStore in the given folder
+
+        :param folder: directory of the store
+        """
+        self.folder = folder
+
+    def get_dir(self, address: str, endpoint: str, action: str) -> str:
+        """
+        Directory with the files of the given wallet/endpoint/action
+
+        :param address: Wallet address
+        :param endpoint: bscscan.com or etherscan.io
+        :param action: txlist, tokentx or txlistinternal
+        :return: directory path
+        """
+        return os.path.join(self.folder, endpoint, address.lower(), action)
+
+    def load_state(self, address: str, endpoint: str, action: str) -> dict:
+        """
+        Load the sync state: last synced block, the list of segments (oldest first) and the unfinished segment
+
+        :return: dict with 'last_block', 'segments' and 'pending' keys
+        """
+        state_file = os.path.join(self.get_dir(address, endpoint, action), 'state.json')
+
+        if not os.path.exists(state_file):
+            return {'last_block': None, 'segments': [], 'pending': None}
+
+        with open(state_file, 'r') as file:
+            return json.load(file)
+
+    def save_state(self, address: str, endpoint: str, action: str, state: dict) -> None:
+        """
+        Save the sync state
+
+        :param state: dict with 'last_block', 'segments' and 'pending' keys
+        :return: None
+        """
+        state_file = os.path.join(self.get_dir(address, endpoint, action), 'state.json')
+
+        # Write to a temp file first, so the state is never left half written
+        with open(state_file + '.tmp', 'w') as file:
+            json.dump(state, file)
+        os.replace(state_file + '.tmp', state_file)
+
+    def last_block(self, address: str, endpoint: str, action: str):
+        """
+        Get the highest synced block number
+
+        :return: block number or None if nothing was synced yet
+        """
+        return self.load_state(address, endpoint, action)['last_block']
+
+    def start_segment(self, address: str, endpoint: str, action: str, startblock: int) -> None:
+        """
+        Start a new segment (pending until self.finish_segment). Pages are appended to it as they are downloaded,
+        so an interrupted sync can be resumed from the last downloaded page
+
+        :param startblock: block number the txs are downloaded from
+        :return: None
+        """
+        os.makedirs(self.get_dir(address, endpoint, action), exist_ok=True)
+        state = self.load_state(address, endpoint, action)
+
+        segment_file = f"{len(state['segments']):06d}.jsonl"
+        open(os.path.join(self.get_dir(address, endpoint, action), segment_file), 'w').close()
+
+        state['pending'] = {'file': segment_file, 'startblock': startblock, 'endblock': None, 'last_block': None}
+
+        self.save_state(address, endpoint, action, state)
+
+    def get_pending(self, address: str, endpoint: str, action: str):
+        """
+        Get the checkpoint of the unfinished segment
+
+        :return: dict with 'file', 'startblock', 'endblock' (lowest downloaded block) and 'last_block' keys or None
+        """
+        return self.load_state(address, endpoint, action).get('pending')
+
+    def get_pending_keys(self, address: str, endpoint: str, action: str) -> set:
+        """
+        Keys of the txs from the lowest downloaded block of the unfinished segment (this block is downloaded again
+        when the sync is resumed)
+
+        :return: set of tx keys
+        """
+        pending = self.get_pending(address, endpoint, action)
+
+        if pending is None or pending['endblock'] is None:
+            return set()
+
+        keys = set()
+        with open(os.path.join(self.get_dir(address, endpoint, action), pending['file']), 'r') as file:
+            for line in file:
+                tx = json.loads(line)
+                if int(tx['blockNumber']) == pending['endblock']:
+                    keys.add(tx_key(tx))
+
+        return keys
+
+    def append_page(self, address: str, endpoint: str, action: str, txs: list) -> None:
+        """
+        Append a page of txs (newest first) to the unfinished segment and move the checkpoint
+
+        :param txs: list of txs (dicts from the API)
+        :return: None
+        """
+        if len(txs) == 0:
+            return
+
+        state = self.load_state(address, endpoint, action)
+        pending = state['pending']
+
+        with open(os.path.join(self.get_dir(address, endpoint, action), pending['file']), 'a') as file:
+            for tx in txs:
+                file.write(json.dumps(tx) + '\n')
+
+        block_numbers = [int(tx['blockNumber']) for tx in txs]
+        pending['endblock'] = min(block_numbers) if pending['endblock'] is None else \
+            min(pending['endblock'], min(block_numbers))
+        pending['last_block'] = max(block_numbers) if pending['last_block'] is None else \
+            max(pending['last_block'], max(block_numbers))
+
+        self.save_state(address, endpoint, action, state)
+
+    def finish_segment(self, address: str, endpoint: str, action: str) -> None:
+        """
+        Add the unfinished segment to the synced segments and update the last synced block
+
+        :return: None
+        """
+        state = self.load_state(address, endpoint, action)
+        pending = state['pending']
+        state['pending'] = None
+
+        if pending['last_block'] is None:
+            # Nothing new
+            os.remove(os.path.join(self.get_dir(address, endpoint, action), pending['file']))
+        else:
+            state['segments'].append({'file': pending['file'], 'startblock': pending['startblock']})
+            state['last_block'] = pending['last_block'] if state['last_block'] is None else \
+                max(state['last_block'], pending['last_block'])
+
+        self.save_state(address, endpoint, action, state)
+
+    def append(self, address: str, endpoint: str, action: str, txs: list, startblock: int) -> None:
+        """
+        Append the txs downloaded from the startblock as a new segment and update the last synced block
+
+        :param txs: list of txs (dicts from the API)
+        :param startblock: block number the txs were downloaded from
+        :return: None
+        """
+        if len(txs) == 0:
+            return
+
+        self.start_segment(address, endpoint, action, startblock)
+        self.append_page(address, endpoint, action, txs)
+        self.finish_segment(address, endpoint, action)
+
+    def iter_txs(self, address: str, endpoint: str, action: str, startblock: int = 0):
+        """
+        Iterate over all the stored txs (newest segment first) without duplicates. Unfinished segment is skipped
+
+        :param startblock: skip the txs older than this block
+        :return: generator of txs
+        """
+        state = self.load_state(address, endpoint, action)
+
+        # Only the txs from the first block of a segment can be in the older segments too
+        seen_keys = set()
+
+        for segment in reversed(state['segments']):
+            with open(os.path.join(self.get_dir(address, endpoint, action), segment['file']), 'r') as file:
+                for line in file:
+                    tx = json.loads(line)
+                    block_number = int(tx['blockNumber'])
+
+                    if block_number < startblock:
+                        continue
+
+                    key = tx_key(tx)
+                    if key in seen_keys:
+                        continue
+
+                    if block_number <= segment['startblock']:
+                        seen_keys.add(key)
+
+                    yield tx
+
+    def clear(self, address: str, endpoint: str, action: str) -> None:
+        """
+        Remove all the stored txs of the given wallet/endpoint/action
+
+        :return: None
+        """
+        state = self.load_state(address, endpoint, action)
+
+        segments = state['segments'] + ([state['pending']] if state.get('pending') else [])
+        for segment in segments:
+            os.remove(os.path.join(self.get_dir(address, endpoint, action), segment['file']))
+
+        state_file = os.path.join(self.get_dir(address, endpoint, action), 'state.json')
+        if os.path.exists(state_file):
+            os.remove(state_file)
@@ -0,0 +1,158 @@
+"""Columnar (Parquet) store of the wallet dataframes, partitioned by wallet and table.
+Every save writes a new part file (append only), the dtypes are kept. Columns and timeStamp/blockNumber ranges are
+selected while reading, so only the needed data is loaded
+"""
+import os
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+TABLES = ['txs_df', 'token_txs_df', 'internal_txs_df']
+
+
+class TxStore:
+    """
+    Store the dataframes in <folder>/<wallet>/<table>/part-*.parquet files
+    """
+    def __init__(self, folder: str = "data"):
+        """
+        Create a new TxStore in the given folder
+
+        :param folder: directory of the store
+        """
+        self.folder = folder
+
+    def get_dir(self, wallet: str, table: str) -> str:
+        """
+        Directory with the part files of the given wallet/table
+
+        :param wallet: Wallet address
+        :param table: txs_df, token_txs_df or internal_txs_df
+        :return: directory path
+        """
+        return os.path.join(self.folder, wallet.lower(), table)
+
+    def get_parts(self, wallet: str, table: str) -> list:
+        """
+        Get the part files of the table (oldest first)
+
+        :return: list of file paths
+        """
+        table_dir = self.get_dir(wallet, table)
+
+        if not os.path.isdir(table_dir):
+            return []
+
+        return [os.path.join(table_dir, file) for file in sorted(os.listdir(table_dir)) if file.endswith('.parquet')]
+
+    def append(self, wallet: str, table: str, df: pd.DataFrame) -> None:
+        """
+        Write the dataframe as a new part of the table
+
+        :param wallet: Wallet address
+        :param table: txs_df, token_txs_df or internal_txs_df
+        :param df: dataframe to store (index is not stored)
+        :return: None
+        """
+        if len(df.columns) == 0:
+            return
+
+        table_dir = self.get_dir(wallet, table)
+        os.makedirs(table_dir, exist_ok=True)
+
+        # Parts are sorted by name, so the number (one more than the last part, save removes the older parts) keeps
+        # the order of the writes
+        parts = self.get_parts(wallet, table)
+        number = int(os.path.basename(parts[-1]).split('-')[1]) + 1 if len(parts) > 0 else 0
+        part_file = f'part-{number:06d}-{uuid.uuid4().hex[:8]}.parquet'
+
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(table_dir, part_file))
+
+    def save(self, wallet: str, table: str, df: pd.DataFrame) -> None:
+        """
+        Replace all the parts of the table with the dataframe
+
+        :param wallet: Wallet address
+        :param table: txs_df, token_txs_df or internal_txs_df
+        :param df: dataframe to store
+        :return: None
+        """
+        old_parts = self.get_parts(wallet, table)
+
+        self.append(wallet, table, df)
+
+        for part in old_parts:
+            os.remove(part)
+
+    def max_value(self, wallet: str, table: str, column: str = 'blockNumber'):
+        """
+        Get the max value of the column from the parquet statistics (the data is not read)
+
+        :param wallet: Wallet address
+        :param table: txs_df, token_txs_df or internal_txs_df
+        :param column: column name
+        :return: max value or None if the table is empty
+        """
+        max_value = None
+
+        for part in self.get_parts(wallet, table):
+            metadata = pq.ParquetFile(part).metadata
+
+            if column not in metadata.schema.names:
+                continue
+
+            column_index = metadata.schema.names.index(column)
+
+            for row_group in range(metadata.num_row_groups):
+                statistics = metadata.row_group(row_group).column(column_index).statistics
+
+                if statistics is not None and statistics.has_min_max:
+                    max_value = statistics.max if max_value is None else max(max_value, statistics.max)
+
+        return max_value
+
+    def load(self, wallet: str, table: str, columns: list = None, start: int = None, stop: int = None,
+             column: str = 'timeStamp') -> pd.DataFrame:
+        """
+        Read the table. Only the given columns and the row groups with the values of the column in the range are read
+
+        :param wallet: Wallet address
+        :param table: txs_df, token_txs_df or internal_txs_df
+        :param columns: columns to read (all by default)
+        :param start: min value of the column (included)
+        :param stop: max value of the column (included)
+        :param column: column used to select the range (timeStamp or blockNumber)
+        :return: dataframe (empty if nothing was stored)
+        """
+        parts = self.get_parts(wallet, table)
+
+        if len(parts) == 0:
+            return pd.DataFrame()
+
+        # Parts written at different times can have different types of the empty (null) columns
+        schema = pa.unify_schemas([pq.read_schema(part) for part in parts])
+        dataset = ds.dataset(parts, schema=schema, format='parquet')
+
+        row_filter = None
+        if column in schema.names:
+            if start is not None:
+                row_filter = ds.field(column) >= start
+            if stop is not None:
+                row_filter = ds.field(column) <= stop if row_filter is None else row_filter & (ds.field(column) <= stop)
+
+        if columns is not None:
+            columns = [name for name in columns if name in schema.names]
+
+        return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+    def clear(self, wallet: str, table: str) -> None:
+        """
+        Remove all the parts of the table
+
+        :return: None
+        """
+        for part in self.get_parts(wallet, table):
+            os.remove(part)
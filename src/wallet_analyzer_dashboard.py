@@ -1,12 +1,177 @@
 """Simple traders dashboard with Streamlit"""
+import datetime
+
 import pandas as pd
-import plotly.express as px
 import streamlit as st
 from io import StringIO
 import base64
 from wallet_analyzer_eth import WalletAnalyzer
 from wallet_analyzer_eth import MetricsCalculator
-from wallet_analyzer_sol import SolanaWalletAnalyzer
+from src.instrumentation import PROFILERS, RunReport, start_run
+
+# Pipeline stages cache: max number of cached wallets/options (least recently used are removed) and time to live
+CACHE_MAX_ENTRIES = 32
+CACHE_TTL = 60 * 60
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner="Downloading the wallet transactions...")
+def download_wallet_data(wallet_address: str, blockchain: str, data_version: int = 0) -> dict:
+    """
+    Download the wallet transactions (cached per wallet and blockchain)
+
+    :param wallet_address: Wallet address
+    :param blockchain: eth or sol
+    :param data_version: number of the wallet data reloads, a new version is downloaded again
+    :return: dict with the txs dataframes
+    """
+    if blockchain == "eth":
+        wallet_analyzer = WalletAnalyzer(wallet_address, incremental=True)
+        wallet_analyzer.get_data()
+
+        return {
+            'txs_df': wallet_analyzer.txs_df,
+            'token_txs_df': wallet_analyzer.token_txs_df,
+            'internal_txs_df': wallet_analyzer.internal_txs_df,
+        }
+
+    elif blockchain == 'sol':
+        # The Solana stack is imported only when it is used
+        from wallet_analyzer_sol import SolanaWalletAnalyzer
+
+        wallet_analyzer = SolanaWalletAnalyzer(wallet_address, incremental=True)
+        wallet_analyzer.get_data()
+
+        return {'txs_df': wallet_analyzer.txs_df}
+
+    raise ValueError("Invalid blockchain")
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner="Analyzing the transactions...")
+def classify_wallet_txs(wallet_address: str, blockchain: str, start: int = None, stop: int = None,
+                        data_version: int = 0) -> dict:
+    """
+    Classify the transactions and build the token trades index (cached per wallet, blockchain and time range, the
+    filters do not change it)
+
+    :param wallet_address: Wallet address
+    :param blockchain: eth or sol
+    :param start: start timestamp (None - from the first tx)
+    :param stop: stop timestamp (None - to the last tx)
+    :param data_version: number of the wallet data reloads
+    :return: dict with the txs_df (and the token_trades_index for eth)
+    """
+    wallet_data = download_wallet_data(wallet_address, blockchain, data_version)
+
+    if blockchain == "eth":
+        # Nothing is downloaded in this stage (no local sync store), the shared gas baseline is used for the snipes
+        wallet_analyzer = WalletAnalyzer(wallet_address)
+        wallet_analyzer.txs_df = wallet_data['txs_df']
+        wallet_analyzer.token_txs_df = wallet_data['token_txs_df']
+        wallet_analyzer.internal_txs_df = wallet_data['internal_txs_df']
+        wallet_analyzer.select_data_by_timestamp(start, stop)
+
+        wallet_analyzer.calculate_swap_txs()
+        wallet_analyzer.enrich_txs()
+
+        return {'txs_df': wallet_analyzer.txs_df, 'token_trades_index': wallet_analyzer.build_token_trades_index()}
+
+    txs_df = wallet_data['txs_df']
+
+    if start:
+        txs_df = txs_df.loc[txs_df['timeStamp'] >= start]
+    if stop:
+        txs_df = txs_df.loc[txs_df['timeStamp'] <= stop]
+
+    return {'txs_df': txs_df}
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner="Analyzing the transactions...")
+def analyze_wallet_data(wallet_address: str, blockchain: str, start: int = None, stop: int = None,
+                        drop_snipes: bool = False, include_other_swap_types: bool = False,
+                        drop_in_out_tokens: bool = False, data_version: int = 0) -> dict:
+    """
+    Aggregate the trades with the selected filters (cached per wallet, blockchain, time range and filters). The
+    filters only mask the token trades index, so changing them does not classify the transactions again
+
+    :param wallet_address: Wallet address
+    :param blockchain: eth or sol
+    :param start: start timestamp (None - from the first tx)
+    :param stop: stop timestamp (None - to the last tx)
+    :param drop_snipes: whether to drop all transaction of tokens that have snipe transactions
+    :param include_other_swap_types: whether to include other swap types (other_buy, other_sell)
+    :param drop_in_out_tokens: whether to drop all transaction of tokens that have in/out transactions
+    :param data_version: number of the wallet data reloads
+    :return: dict with the txs_df, swap_txs_df and token_trades_df dataframes
+    """
+    wallet_data = classify_wallet_txs(wallet_address, blockchain, start, stop, data_version)
+
+    if blockchain == "eth":
+        # Only the token trades index is masked, no download and no snipe detection
+        wallet_analyzer = WalletAnalyzer(wallet_address, gas_baseline=False)
+        wallet_analyzer.txs_df = wallet_data['txs_df']
+        wallet_analyzer.token_trades_index = wallet_data['token_trades_index']
+        wallet_analyzer.token_trades_index_source = wallet_analyzer.txs_df
+
+        swap_txs_df = wallet_analyzer.get_swap_txs(drop_snipes, include_other_swap_types, drop_in_out_tokens)
+        token_trades_df = wallet_analyzer.calculate_tokens_txs(drop_snipes, include_other_swap_types,
+                                                               drop_in_out_tokens)
+
+    else:
+        from wallet_analyzer_sol import SolanaWalletAnalyzer
+
+        wallet_analyzer = SolanaWalletAnalyzer(wallet_address)
+        wallet_analyzer.txs_df = wallet_data['txs_df']
+        token_trades_df = wallet_analyzer.calculate_tokens_txs()
+        swap_txs_df = wallet_analyzer.txs_df
+
+    return {'txs_df': wallet_analyzer.txs_df, 'swap_txs_df': swap_txs_df, 'token_trades_df': token_trades_df}
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner="Calculating the metrics...")
+def calculate_dashboard_metrics(wallet_address: str, blockchain: str, start: int = None, stop: int = None,
+                                drop_snipes: bool = False, include_other_swap_types: bool = False,
+                                drop_in_out_tokens: bool = False, data_version: int = 0) -> dict:
+    """
+    Calculate all the metrics, charts data and tables shown in the dashboard (cached with the same keys as
+    analyze_wallet_data), so the UI-only interactions do not calculate anything again
+
+    :return: dict with the metrics and dataframes
+    """
+    wallet_data = analyze_wallet_data(wallet_address, blockchain, start, stop, drop_snipes, include_other_swap_types,
+                                      drop_in_out_tokens, data_version)
+    metrics_calculator = MetricsCalculator(wallet_data['swap_txs_df'], wallet_data['txs_df'],
+                                           wallet_data['token_trades_df'])
+
+    # Dataframes
+    transactions_df = wallet_data['txs_df'].copy()
+    transactions_df['dateTime'] = pd.to_datetime(transactions_df.loc[:, 'timeStamp'], unit='s')
+    transactions_df = transactions_df.loc[:, ['dateTime', 'hash', 'from', 'to', 'value', 'gasPrice', 'txType',
+                                              'swapType', 'swapEth', 'tokenValue', 'tokenName', 'tokenSymbol',
+                                              'tokenCa', 'snipe', 'txFee']]
+
+    return {
+        'total_values': metrics_calculator.calculate_total_values(),
+        'final_trade_result': metrics_calculator.final_trade_result(),
+        'snipes_percent': metrics_calculator.snipes_percent(),
+        'avg_trade_size': metrics_calculator.avg_trade_size(),
+        'avg_trade_result': metrics_calculator.avg_trade_result(),
+        # Charts
+        'trades_per_day_df': metrics_calculator.trades_per_day(),
+        'cum_res_df': metrics_calculator.cumulated_daily_trading_result(),
+        'transactions_df': transactions_df,
+    }
+
+
+def clear_cache() -> None:
+    """
+    Remove all the cached pipeline stages (all the wallets)
+
+    :return: None
+    """
+    download_wallet_data.clear()
+    classify_wallet_txs.clear()
+    analyze_wallet_data.clear()
+    calculate_dashboard_metrics.clear()
 
 
 class Dashboard:
@@ -18,48 +183,143 @@ class Dashboard:
         self.swap_txs_df = None
         self.token_trades_df = None
         self.tokens_txs_df = None
-        self.wallet_analyzer = None
         self.metrics_calculator = None
         self.wallet_address = initial_wallet_address
         self.blockchain = blockchain
 
+        # Analysis options (part of the cache keys)
+        self.start = None
+        self.stop = None
+        self.drop_snipes = False
+        self.include_other_swap_types = False
+        self.drop_in_out_tokens = False
+
+        # Performance report of the run (the stages not loaded from the cache) and the optional profiler
+        self.show_performance_report = False
+        self.profiler = None
+
+    def normalize_address(self, wallet_address: str) -> str:
+        """
+        Address used in the cache keys and passed to the analyzers (Solana addresses are case sensitive, only the ETH
+        addresses are lowercased)
+
+        :param wallet_address: Wallet address
+        :return: normalized address
+        """
+        return wallet_address.lower() if self.blockchain == 'eth' else wallet_address
+
+    def get_data_version(self, wallet_address: str) -> int:
+        """
+        Get the number of the reloads of the wallet data in this session
+
+        :param wallet_address: Wallet address
+        :return: data version
+        """
+        data_versions = st.session_state.setdefault('data_versions', {})
+        return data_versions.get((self.normalize_address(wallet_address), self.blockchain), 0)
+
+    def reload_wallet_data(self, wallet_address: str) -> None:
+        """
+        Invalidate the cached data of the wallet, it is downloaded again on the next run
+
+        :param wallet_address: Wallet address
+        :return: None
+        """
+        data_versions = st.session_state.setdefault('data_versions', {})
+        key = (self.normalize_address(wallet_address), self.blockchain)
+        data_versions[key] = data_versions.get(key, 0) + 1
+
+    def get_cache_key(self, wallet_address: str) -> tuple:
+        """
+        Arguments of the cached pipeline stages
+
+        :param wallet_address: Wallet address
+        :return: tuple with the wallet, blockchain, time range, filters and data version
+        """
+        return (self.normalize_address(wallet_address), self.blockchain, self.start, self.stop, self.drop_snipes,
+                self.include_other_swap_types, self.drop_in_out_tokens, self.get_data_version(wallet_address))
+
     def get_wallet_data(self, wallet_address: str) -> None:
         """
-        Get wallet data and calculate all the metrics
+        Get wallet data and calculate all the metrics. Every stage is cached, only the first run with the given
+        wallet and options downloads and analyzes the data
 
         :param wallet_address: Wallet address
         :return: None
         """
-        if self.blockchain == "eth":
-            wallet_analyzer = WalletAnalyzer(wallet_address)
-            wallet_analyzer.get_data()
-            wallet_analyzer.calculate_swap_txs()
-            wallet_analyzer.check_token_transfers()
-            wallet_analyzer.check_internal_transfers()
-            wallet_analyzer.check_snipers()
+        if self.blockchain not in ("eth", "sol"):
+            raise ValueError("Invalid blockchain")
 
-            self.swap_txs_df = wallet_analyzer.get_swap_txs()
-            self.txs_df = wallet_analyzer.txs_df
-            self.token_trades_df = wallet_analyzer.calculate_tokens_txs()
+        wallet_data = analyze_wallet_data(*self.get_cache_key(wallet_address))
 
-            self.metrics_calculator = MetricsCalculator(self.swap_txs_df, self.txs_df, self.token_trades_df)
+        self.txs_df = wallet_data['txs_df']
+        self.swap_txs_df = wallet_data['swap_txs_df']
+        self.token_trades_df = wallet_data['token_trades_df']
 
-        elif self.blockchain == 'sol':
-            wallet_analyzer = SolanaWalletAnalyzer(wallet_address)
-            # wallet_analyzer.load_transactions('../temp/solana_fm_transfers.json')
+        self.metrics_calculator = MetricsCalculator(self.swap_txs_df, self.txs_df, self.token_trades_df)
 
-            # self.swap_txs_df = wallet_analyzer.get_swaps()
-            # self.txs_df = self.swap_txs_df
-            wallet_analyzer.get_data()
-            self.txs_df = wallet_analyzer.txs_df
-            self.token_trades_df = wallet_analyzer.calculate_tokens_txs()
+    def select_options(self) -> None:
+        """
+        Sidebar with the time range, filters and cache controls
+
+        :return: None
+        """
+        st.sidebar.markdown("### Analysis options")
 
-            self.metrics_calculator = MetricsCalculator(self.txs_df, self.txs_df, self.token_trades_df)
+        time_range = st.sidebar.date_input("Time range (UTC)", value=())
 
+        if len(time_range) == 2:
+            start_date, stop_date = time_range
+            self.start = int(datetime.datetime.combine(start_date, datetime.time.min,
+                                                       datetime.timezone.utc).timestamp())
+            self.stop = int(datetime.datetime.combine(stop_date, datetime.time.max,
+                                                      datetime.timezone.utc).timestamp())
         else:
-            raise ValueError("Invalid blockchain")
+            self.start = None
+            self.stop = None
+
+        if self.blockchain == "eth":
+            self.drop_snipes = st.sidebar.checkbox("Drop tokens with snipes")
+            self.include_other_swap_types = st.sidebar.checkbox("Include other swap types")
+            self.drop_in_out_tokens = st.sidebar.checkbox("Drop tokens with in/out transfers")
+
+        if st.sidebar.button("Reload wallet data", help="Download the transactions of the wallet again"):
+            self.reload_wallet_data(self.wallet_address)
+
+        if st.sidebar.button("Clear cache", help="Remove the cached data of all the wallets"):
+            clear_cache()
+
+        self.show_performance_report = st.sidebar.checkbox(
+            "Show performance report", help="Time, rows and memory of the pipeline stages run for this page")
+        if self.show_performance_report:
+            profiler = st.sidebar.selectbox("Profiler", ['none'] + PROFILERS)
+            self.profiler = None if profiler == 'none' else profiler
+
+    def performance_report(self, run_report: RunReport) -> None:
+        """
+        Collapsible panel with the stages and downloads of the run, the profile and the JSON report
+
+        :param run_report: report of the run
+        :return: None
+        """
+        with st.expander("Performance report"):
+            st.markdown(f"Total time: {run_report.seconds:.2f} s")
+
+            if len(run_report.stages) == 0:
+                st.info("All the stages were loaded from the cache")
+            else:
+                st.dataframe(run_report.summary())
+
+            if len(run_report.downloads) > 0:
+                st.markdown("#### Downloads")
+                st.dataframe(run_report.downloads_df())
 
-        self.wallet_analyzer = wallet_analyzer
+            if run_report.profile:
+                st.markdown(f"#### Profile ({self.profiler})")
+                st.code(run_report.profile)
+
+            st.download_button("Download the report (JSON)", run_report.to_json(),
+                               file_name=f"{self.wallet_address}_run_report.json", mime="application/json")
 
     def main(self) -> None:
         """
@@ -79,27 +339,31 @@ class Dashboard:
         st.markdown("### Wallet address")
         self.wallet_address = st.text_input("Enter the wallet address", self.wallet_address)
 
+        self.select_options()
+
         # Data
-        self.get_wallet_data(self.wallet_address)
+        with start_run(self.normalize_address(self.wallet_address), self.profiler) as run_report:
+            self.get_wallet_data(self.wallet_address)
+            metrics = calculate_dashboard_metrics(*self.get_cache_key(self.wallet_address))
+
+        if self.show_performance_report:
+            self.performance_report(run_report)
+
         total_eth_in, total_eth_internal_in, total_eth_out, total_eth_buy, total_eth_sell, total_stablecoins_in,\
             total_stablecoins_out, total_fees_eth, count_tokens_in,\
-            count_tokens_out = self.metrics_calculator.calculate_total_values()
+            count_tokens_out = metrics['total_values']
 
-        final_trade_result = self.metrics_calculator.final_trade_result()
-        snipes_percent = self.metrics_calculator.snipes_percent()
-        avg_trade_size = self.metrics_calculator.avg_trade_size()
-        avg_trade_result = self.metrics_calculator.avg_trade_result()
+        final_trade_result = metrics['final_trade_result']
+        snipes_percent = metrics['snipes_percent']
+        avg_trade_size = metrics['avg_trade_size']
+        avg_trade_result = metrics['avg_trade_result']
 
         # Charts
-        trades_per_day_df = self.metrics_calculator.trades_per_day()
-        cum_res_df = self.metrics_calculator.cumulated_daily_trading_result()
+        trades_per_day_df = metrics['trades_per_day_df']
+        cum_res_df = metrics['cum_res_df']
 
         # Dataframes
-        transactions_df = self.txs_df.copy()
-        transactions_df['dateTime'] = pd.to_datetime(transactions_df.loc[:, 'timeStamp'], unit='s')
-        transactions_df = transactions_df.loc[:, ['dateTime', 'hash', 'from', 'to', 'value', 'gasPrice', 'txType',
-                                                  'swapType', 'swapEth', 'tokenValue', 'tokenName', 'tokenSymbol',
-                                                  'tokenCa', 'snipe', 'txFee']]
+        transactions_df = metrics['transactions_df']
 
         placeholder = st.empty()
 
@@ -188,6 +452,9 @@ class Dashboard:
 
             st.divider()
 
+            # Plotly is imported only when the charts are rendered
+            import plotly.express as px
+
             # Create two columns for charts
             fig_col10, fig_col20 = st.columns(2)
             with fig_col10:
@@ -4,187 +4,287 @@ import os
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
-sys.path.append(parent_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
 
 import datetime
-import os
+from src.chain_config import get_chain
+from src.decimal_scaling import scale_decimals
+from src.df_schema import INTERNAL_TXS_SCHEMA, TOKEN_TXS_SCHEMA, TXS_SCHEMA, apply_schema, memory_report
 from src.download_wallet_txs import DataDownloader
+from src.gas_baseline import GasBaseline, gas_baseline_enabled, get_gas_baseline
+from src.gas_prices import get_daily_gas_prices, read_gas_price_csv
+from src.instrumentation import instrumented_stage, log_event, record_frame_copy, stage
 import pandas as pd
 import numpy as np
-import yaml
+
+# Columns filled in the txs_df with the info from the token transactions
+TOKEN_INFO_COLUMNS = ['swapType', 'swapEth', 'tokenValue', 'tokenName', 'tokenSymbol', 'tokenCa', 'tokenDecimal']
+
+# Swaps via the known routers and swaps that look like trades (other_buy, other_sell)
+SWAP_TYPES = ['swap_buy', 'swap_sell']
+OTHER_SWAP_TYPES = ['other_buy', 'other_sell']
 
 
 class WalletAnalyzer:
     """
     Class for analyzing the wallet transactions of a given wallet
     """
-    def __init__(self, wallet: str, chain='eth') -> None:
+    def __init__(self, wallet: str, chain='eth', precision: int = None, incremental: bool = False,
+                 gas_baseline: GasBaseline = None) -> None:
         """
         Analyzes wallet transactions
 
         :param wallet: wallet address
+        :param chain: eth or bsc
+        :param precision: number of decimal places of the ETH and token values (None - full float precision)
+        :param incremental: whether to download only the new blocks since the last analysis (txs stored locally)
+        :param gas_baseline: gas baseline for the snipe detection (None - the shared one in src/cache if enabled by
+            the gas_baseline setting, False - the daily average gas prices only)
         """
         self.wallet = wallet.lower()
         self.chain = chain
+        self.precision = precision
 
         self.txs_df = None
         self.token_txs_df = None
         self.internal_txs_df = None
 
-        api_endpoint = 'etherscan.io' if self.chain == 'eth' else 'bscscan.com'
-        self.data_downloader = DataDownloader(self.wallet, api_endpoint, 0)
-
-        # Load the YAML file with os to make it work in the streamlit cloud
-        current_location = os.path.dirname(os.path.realpath(__file__))
-        yaml_file = os.path.join(current_location, 'data/contracts.yaml')
-        with open(yaml_file, 'r') as file:
-            config = yaml.safe_load(file)
+        # Per token aggregates of the swaps (see build_token_trades_index) and the txs_df they were built from
+        self.token_trades_index = None
+        self.token_trades_index_source = None
 
-        self.weth_address = config['eth']['weth'].lower()
+        # Gas prices of the downloaded txs (all the wallets) for the snipe detection
+        if gas_baseline is None:
+            gas_baseline = get_gas_baseline() if gas_baseline_enabled else False
+        self.gas_baseline = gas_baseline or None
 
-        if self.chain == 'eth':
-            self.routers = config['eth']['routers']
-            # Source: https://ethplorer.io/tag/stablecoins#
-            self.stablecoins = config['eth']['stablecoins']
+        api_endpoint = 'etherscan.io' if self.chain == 'eth' else 'bscscan.com'
+        self.data_downloader = DataDownloader(self.wallet, api_endpoint, 0, incremental=incremental)
 
-        # For the implementation of the BSC chain
-        elif self.chain == 'bsc':
-            self.routers = config['bsc']['routers']
-            self.stablecoins = config['bsc']['stablecoins']
+        # Compiled contracts shared by the whole process, the addresses are already lowercase for easy comparison.
+        # All the router and stablecoin membership tests use them (frozensets and the integer codes of the addresses)
+        self.weth_address = get_chain('eth').wrapped_token
 
-        # Make the lists lowercase for easy comparison
-        self.routers = [router.lower() for router in self.routers]
-        self.stablecoins = [stablecoin.lower() for stablecoin in self.stablecoins]
+        # Stablecoins source: https://ethplorer.io/tag/stablecoins#
+        self.contracts = get_chain(self.chain)
+        self.routers = list(self.contracts.groups['routers'])
+        self.stablecoins = list(self.contracts.groups['stablecoins'])
 
+    @instrumented_stage()
     def get_data(self) -> None:
         """
         Download all the data (transactions, internal transactions, token transactions)
         Change the dtypes
         Decode Universal router input
+        Move the WETH transfers to the txs
+        Add the gas prices to the gas baseline
+
+        All the data is downloaded concurrently and every page is converted to a dataframe as soon as it arrives, so
+        the raw JSON lists are never held in memory at once. The dataframes get the compact dtypes from df_schema
 
         :return: None
         """
+        prepare_functions = {
+            'txlist': self.prepare_txs_df,
+            'tokentx': self.prepare_token_txs_df,
+            'txlistinternal': self.prepare_internal_txs_df,
+        }
 
-        txs_list = self.data_downloader.get_txs()
-        print(f"Downloaded total: {len(txs_list)} transactions")
-        # print(txs_list)
-
-        # Create a dataframe
-        txs_df = pd.DataFrame(txs_list)
-
-        if txs_df.shape[0] != 0:
-            txs_df['blockNumber'] = txs_df['blockNumber'].astype(int)
-            txs_df['timeStamp'] = txs_df['timeStamp'].astype(int)
-            txs_df['nonce'] = txs_df['nonce'].astype(int)
-            txs_df['transactionIndex'] = txs_df['transactionIndex'].astype(int)
-            txs_df['value'] = txs_df['value'].astype(
-                float) / 10 ** 18
-            txs_df['gas'] = txs_df['gas'].astype(int)
-            txs_df['gasPrice'] = txs_df['gasPrice'].astype(np.int64)
-            txs_df['isError'] = txs_df['isError'].astype(int)
-            txs_df['cumulativeGasUsed'] = txs_df['cumulativeGasUsed'].astype(int)
-            txs_df['gasUsed'] = txs_df['gasUsed'].astype(int)
-            txs_df['confirmations'] = txs_df['confirmations'].astype(int)
-
-            txs_df['hash'] = txs_df['hash'].str.lower()
-            txs_df['blockHash'] = txs_df['blockHash'].str.lower()
-            txs_df['from'] = txs_df['from'].str.lower()
-            txs_df['to'] = txs_df['to'].str.lower()
-            txs_df['blockHash'] = txs_df['blockHash'].str.lower()
+        with stage('WalletAnalyzer.download') as record:
+            page_dfs = self.data_downloader.download_concurrently(
+                list(prepare_functions), lambda action, page: prepare_functions[action](pd.DataFrame(page)))
+            record['rowsOut'] = sum(len(page_df) for action_dfs in page_dfs.values() for page_df in action_dfs)
 
-        else:
+        txs_df = self.concat_page_dfs(page_dfs['txlist'])
+        log_event('txs_downloaded', wallet=self.wallet, txs=len(txs_df))
+
+        if txs_df.shape[0] == 0:
             raise ValueError("No transactions found")
 
         txs_df = txs_df[txs_df['isError'] != 1]
         txs_df.reset_index(drop=True, inplace=True)
 
-        txs_df['txType'] = txs_df.apply(
-            lambda row: self.classify_tx(row['from'], row['to'], row['methodId'], row['value']),
-            axis=1)
+        txs_df['txType'] = self.classify_txs(txs_df)
 
         # Fees paid
-        self.txs_df['txFee'] = self.txs_df['gasPrice'] / 10 ** 18 * self.txs_df['gasUsed']
-
-        token_txs_list = self.data_downloader.get_token_txs()
-
-        token_txs_df = pd.DataFrame(token_txs_list)
-
-        if token_txs_df.shape[0] != 0:
-            token_txs_df['blockNumber'] = token_txs_df['blockNumber'].astype(int)
-            token_txs_df['timeStamp'] = token_txs_df['timeStamp'].astype(int)
-            token_txs_df['hash'] = token_txs_df['hash'].str.lower()
-            token_txs_df['nonce'] = token_txs_df['nonce'].astype(int)
-            token_txs_df['blockHash'] = token_txs_df['blockHash'].str.lower()
-            token_txs_df['from'] = token_txs_df['from'].str.lower()
-            token_txs_df['contractAddress'] = token_txs_df['contractAddress'].str.lower()
-            token_txs_df['to'] = token_txs_df['to'].str.lower()
-
-            # Delete all rows where tokenDecimal is '' to avoid errors with astype()
-            token_txs_df = token_txs_df[token_txs_df['tokenDecimal'] != '']
-            token_txs_df['tokenDecimal'] = token_txs_df['tokenDecimal'].astype(int)
-
-            # Numbers too big even for np.int64, workaround: delete n-1 last characters, n=tokenDecimal
-            token_txs_df['value'] = token_txs_df.apply(
-                lambda row: self.change_decimal(row['value'], row['tokenDecimal'], 2), axis=1)
-
-            token_txs_df['value'] = token_txs_df['value'].astype(float)
-
-            token_txs_df['tokenName'] = token_txs_df['tokenName'].str.lower()
-            token_txs_df['tokenSymbol'] = token_txs_df['tokenSymbol'].str.lower()
-            token_txs_df['transactionIndex'] = token_txs_df['transactionIndex'].astype(int)
-            token_txs_df['gas'] = token_txs_df['gas'].astype(int)
-            token_txs_df['gasPrice'] = token_txs_df['gasPrice'].astype(np.int64)
-            token_txs_df['gasUsed'] = token_txs_df['gasUsed'].astype(int)
-            token_txs_df['cumulativeGasUsed'] = token_txs_df['cumulativeGasUsed'].astype(int)
-            token_txs_df['confirmations'] = token_txs_df['confirmations'].astype(int)
-
-        internal_txs_list = self.data_downloader.get_internal_txs()
-
-        internal_txs_df = pd.DataFrame(internal_txs_list)
-
-        if internal_txs_df.shape[0] != 0:
-            internal_txs_df['blockNumber'] = internal_txs_df['blockNumber'].astype(int)
-            internal_txs_df['timeStamp'] = internal_txs_df['timeStamp'].astype(int)
-            internal_txs_df['hash'] = internal_txs_df['hash'].str.lower()
-            internal_txs_df['from'] = internal_txs_df['from'].str.lower()
-            internal_txs_df['to'] = internal_txs_df['to'].str.lower()
-            internal_txs_df['value'] = internal_txs_df.apply(
-                lambda row: self.change_decimal(row['value'], 18, 8), axis=1)
-
-            internal_txs_df['value'] = internal_txs_df['value'].astype(float)
-
-            internal_txs_df['contractAddress'] = internal_txs_df['contractAddress'].str.lower()
-            internal_txs_df['type'] = internal_txs_df['type'].str.lower()
-            internal_txs_df['gas'] = internal_txs_df['gas'].astype(int)
-            internal_txs_df['gasUsed'] = internal_txs_df['gasUsed'].astype(int)
-            internal_txs_df['isError'] = internal_txs_df['isError'].astype(int)
-            internal_txs_df['traceId'] = internal_txs_df['traceId'].str.lower()
-            internal_txs_df['errCode'] = internal_txs_df['errCode'].str.lower()
+        txs_df['txFee'] = txs_df['gasPrice'] / 10 ** 18 * txs_df['gasUsed']
 
-        self.txs_df = txs_df
-        self.token_txs_df = token_txs_df
-        self.internal_txs_df = internal_txs_df
+        # Categories are set after the pages are concatenated (the same categories for all the pages)
+        self.txs_df = apply_schema(txs_df, TXS_SCHEMA)
+        self.token_txs_df = apply_schema(self.concat_page_dfs(page_dfs['tokentx']), TOKEN_TXS_SCHEMA)
+        self.internal_txs_df = apply_schema(self.concat_page_dfs(page_dfs['txlistinternal']), INTERNAL_TXS_SCHEMA)
+
+        self.move_weth_transactions()
+
+        if self.gas_baseline is not None:
+            with stage('GasBaseline.add_txs', len(self.txs_df) + len(self.token_txs_df)) as record:
+                record['rowsOut'] = (self.gas_baseline.add_txs(self.txs_df)
+                                     + self.gas_baseline.add_txs(self.token_txs_df))
+
+    @staticmethod
+    def concat_page_dfs(dfs: list) -> pd.DataFrame:
+        """
+        Create one dataframe from the dataframes of the downloaded pages
+
+        :param dfs: list of dataframes (newest first)
+        :return: dataframe with all the txs (empty dataframe if there are no txs)
+        """
+        if len(dfs) == 0:
+            return pd.DataFrame()
+
+        return pd.concat(dfs, ignore_index=True)
+
+    @instrumented_stage()
+    def prepare_txs_df(self, txs_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Change the dtypes of the normal transactions
+
+        :param txs_df: dataframe created from the API txs
+        :return: dataframe with the changed dtypes
+        """
+        txs_df['blockNumber'] = txs_df['blockNumber'].astype(int)
+        txs_df['timeStamp'] = txs_df['timeStamp'].astype(int)
+        txs_df['nonce'] = txs_df['nonce'].astype(int)
+        txs_df['transactionIndex'] = txs_df['transactionIndex'].astype(int)
+        txs_df['value'] = scale_decimals(txs_df['value'], 18, self.precision)
+        txs_df['gas'] = txs_df['gas'].astype(int)
+        txs_df['gasPrice'] = txs_df['gasPrice'].astype(np.int64)
+        txs_df['isError'] = txs_df['isError'].astype(int)
+        txs_df['cumulativeGasUsed'] = txs_df['cumulativeGasUsed'].astype(int)
+        txs_df['gasUsed'] = txs_df['gasUsed'].astype(int)
+        txs_df['confirmations'] = txs_df['confirmations'].astype(int)
 
+        txs_df['hash'] = txs_df['hash'].str.lower()
+        txs_df['blockHash'] = txs_df['blockHash'].str.lower()
+        txs_df['from'] = txs_df['from'].str.lower()
+        txs_df['to'] = txs_df['to'].str.lower()
+
+        return apply_schema(txs_df, TXS_SCHEMA, categories=False)
+
+    @instrumented_stage()
+    def prepare_token_txs_df(self, token_txs_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Change the dtypes of the token transactions
+
+        :param token_txs_df: dataframe created from the API token txs
+        :return: dataframe with the changed dtypes
+        """
+        token_txs_df['blockNumber'] = token_txs_df['blockNumber'].astype(int)
+        token_txs_df['timeStamp'] = token_txs_df['timeStamp'].astype(int)
+        token_txs_df['hash'] = token_txs_df['hash'].str.lower()
+        token_txs_df['nonce'] = token_txs_df['nonce'].astype(int)
+        token_txs_df['blockHash'] = token_txs_df['blockHash'].str.lower()
+        token_txs_df['from'] = token_txs_df['from'].str.lower()
+        token_txs_df['contractAddress'] = token_txs_df['contractAddress'].str.lower()
+        token_txs_df['to'] = token_txs_df['to'].str.lower()
+
+        # Delete all rows where tokenDecimal is '' to avoid errors with astype()
+        token_txs_df = token_txs_df[token_txs_df['tokenDecimal'] != ''].copy()
+        token_txs_df['tokenDecimal'] = token_txs_df['tokenDecimal'].astype(int)
+
+        # Numbers too big even for np.int64, scaled as Python ints
+        token_txs_df['value'] = scale_decimals(token_txs_df['value'], token_txs_df['tokenDecimal'], self.precision)
+
+        token_txs_df['tokenName'] = token_txs_df['tokenName'].str.lower()
+        token_txs_df['tokenSymbol'] = token_txs_df['tokenSymbol'].str.lower()
+        token_txs_df['transactionIndex'] = token_txs_df['transactionIndex'].astype(int)
+        token_txs_df['gas'] = token_txs_df['gas'].astype(int)
+        token_txs_df['gasPrice'] = token_txs_df['gasPrice'].astype(np.int64)
+        token_txs_df['gasUsed'] = token_txs_df['gasUsed'].astype(int)
+        token_txs_df['cumulativeGasUsed'] = token_txs_df['cumulativeGasUsed'].astype(int)
+        token_txs_df['confirmations'] = token_txs_df['confirmations'].astype(int)
+
+        return apply_schema(token_txs_df, TOKEN_TXS_SCHEMA, categories=False)
+
+    @instrumented_stage()
+    def prepare_internal_txs_df(self, internal_txs_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Change the dtypes of the internal transactions
+
+        :param internal_txs_df: dataframe created from the API internal txs
+        :return: dataframe with the changed dtypes
+        """
+        internal_txs_df['blockNumber'] = internal_txs_df['blockNumber'].astype(int)
+        internal_txs_df['timeStamp'] = internal_txs_df['timeStamp'].astype(int)
+        internal_txs_df['hash'] = internal_txs_df['hash'].str.lower()
+        internal_txs_df['from'] = internal_txs_df['from'].str.lower()
+        internal_txs_df['to'] = internal_txs_df['to'].str.lower()
+        internal_txs_df['value'] = scale_decimals(internal_txs_df['value'], 18, self.precision)
+
+        internal_txs_df['contractAddress'] = internal_txs_df['contractAddress'].str.lower()
+        internal_txs_df['type'] = internal_txs_df['type'].str.lower()
+        internal_txs_df['gas'] = internal_txs_df['gas'].astype(int)
+        internal_txs_df['gasUsed'] = internal_txs_df['gasUsed'].astype(int)
+        internal_txs_df['isError'] = internal_txs_df['isError'].astype(int)
+        internal_txs_df['traceId'] = internal_txs_df['traceId'].str.lower()
+        internal_txs_df['errCode'] = internal_txs_df['errCode'].str.lower()
+
+        return apply_schema(internal_txs_df, INTERNAL_TXS_SCHEMA, categories=False)
+
+    def memory_report(self) -> pd.DataFrame:
+        """
+        Memory used by the txs_df, token_txs_df and internal_txs_df dataframes
+
+        :return: dataframe with the number of rows, columns and MB per table (and the total)
+        """
+        return memory_report({
+            'txs_df': self.txs_df,
+            'token_txs_df': self.token_txs_df,
+            'internal_txs_df': self.internal_txs_df,
+        })
+
+    @instrumented_stage()
     def move_weth_transactions(self) -> None:
         """
-        Move WETH transactions from token_txs_df to the txs_df
+        Move WETH transactions from token_txs_df to the txs_df, so the swaps paid or settled in WETH are counted like
+        the ETH swaps. All the WETH transfers are matched with the txs by hash at once:
+
+        - WETH sent by the wallet - the tx becomes 'swap_tx_nonzero_value' with the value of the sent WETH
+        - WETH received by the wallet (in a tx without WETH or ETH sent) - the tx becomes 'swap_tx_zero_value' and
+          the WETH is added to the internal_txs_df like received ETH
+        - WETH received for ETH (wrapping) is not a trade, the tx is not changed
+
+        Multiple WETH transfers of the same hash are summed (per direction), so the result does not depend on the
+        order of the transfers
 
         :return: None
         """
-        weth_txs = self.token_txs_df.loc[self.token_txs_df['contractAddress'] == self.weth_address]
+        if self.token_txs_df is None or 'contractAddress' not in self.token_txs_df.columns:
+            return
+
+        is_weth = self.token_txs_df['contractAddress'] == self.weth_address
+        if not is_weth.any():
+            return
+
+        weth_txs = self.token_txs_df.loc[is_weth]
+
+        # Delete WETH transfers from token_txs_df (the transfers of the swapped tokens stay)
+        self.token_txs_df = self.token_txs_df.loc[~is_weth]
 
-        # Delete WETH transactions from token_txs_df
-        self.token_txs_df = self.token_txs_df.loc[~self.token_txs_df['hash'].isin(weth_txs['hash'])]
+        is_sent = (weth_txs['from'] == self.wallet).to_numpy()
+        sent_values = weth_txs.loc[is_sent].groupby('hash', sort=False)['value'].sum()
+        received_txs = weth_txs.loc[~is_sent & ~weth_txs['hash'].isin(sent_values.index)]
 
-        # For every WETH transaction, change the 'value' and 'txType' in the txs_df - locate the transaction by hash
-        for index, row in weth_txs.iterrows():
-            self.txs_df.loc[self.txs_df['hash'] == row['hash'], 'value'] = row['value']
+        sent_rows = self.txs_df['hash'].isin(sent_values.index)
+        received_rows = self.txs_df['hash'].isin(received_txs['hash']) & (self.txs_df['value'] == 0)
 
-            if row['from'] == self.wallet:
-                self.txs_df.loc[self.txs_df['hash'] == row['hash'], 'txType'] = 'swap_tx_nonzero_value'
+        self.txs_df.loc[sent_rows, 'value'] = self.txs_df.loc[sent_rows, 'hash'].map(sent_values)
+        self.txs_df.loc[sent_rows, 'txType'] = 'swap_tx_nonzero_value'
+        self.txs_df.loc[received_rows, 'txType'] = 'swap_tx_zero_value'
 
-            else:
-                self.txs_df.loc[self.txs_df['hash'] == row['hash'], 'txType'] = 'swap_tx_zero_value'
+        # Only the WETH received in the wallet txs, one transfer per hash
+        received_txs = received_txs.loc[received_txs['hash'].isin(self.txs_df.loc[received_rows, 'hash'])]
+        weth_internal_df = received_txs.groupby('hash', sort=False).agg(
+            blockNumber=('blockNumber', 'first'), timeStamp=('timeStamp', 'first'), value=('value', 'sum')
+        ).reset_index()
+        weth_internal_df['from'] = self.weth_address
+        weth_internal_df['to'] = self.wallet
+        weth_internal_df[['gas', 'gasUsed', 'isError']] = 0
+
+        if len(weth_internal_df) > 0:
+            internal_txs_df = pd.concat([self.internal_txs_df, weth_internal_df], ignore_index=True)
+            self.internal_txs_df = apply_schema(internal_txs_df, INTERNAL_TXS_SCHEMA)
 
     def change_decimal(self, value: str, decimal: int, crop: int = 1) -> float:
         """
@@ -227,10 +327,10 @@ class WalletAnalyzer:
         elif method_id == '0x095ea7b3':
             tx_type = 'approve'
 
-        elif any(to_wallet == router for router in self.routers) and value == 0:
+        elif to_wallet in self.contracts.routers and value == 0:
             tx_type = 'swap_tx_zero_value'
 
-        elif any(to_wallet == router for router in self.routers) and value != 0:
+        elif to_wallet in self.contracts.routers and value != 0:
             tx_type = 'swap_tx_nonzero_value'
 
         else:
@@ -238,28 +338,91 @@ class WalletAnalyzer:
 
         return tx_type
 
-    def save_data(self, folder: str = "data") -> None:
+    def classify_txs(self, txs_df: pd.DataFrame) -> pd.Series:
+        """
+        Vectorized version of self.classify_tx for the whole dataframe (same tx types)
+
+        :param txs_df: dataframe with 'from', 'to', 'methodId' and 'value' columns
+        :return: Series with the type of every tx, same index as txs_df
         """
-        Save the txs_df, token_txs_df and internal_txs_df dataframes to separate CSV files in the given dir
+        values = txs_df['value']
+        if not (values >= 0).all():
+            raise ValueError("Value must be greater or equal to 0")
+
+        method_ids = txs_df['methodId']
+        nonzero_value = values != 0
+        eth_transfer = nonzero_value & (method_ids == '0x')
+        to_router = self.contracts.is_router(txs_df['to'])
 
-        :param folder: directory of the files
+        conditions = [
+            eth_transfer & (txs_df['from'] == self.wallet),
+            eth_transfer & (txs_df['to'] == self.wallet),
+            method_ids == '0x095ea7b3',
+            to_router & ~nonzero_value,
+            to_router & nonzero_value,
+        ]
+        tx_types = ['eth_transfer_out', 'eth_transfer_in', 'approve', 'swap_tx_zero_value', 'swap_tx_nonzero_value']
+
+        return pd.Series(np.select(conditions, tx_types, default='other'), index=txs_df.index, dtype=object)
+
+    @instrumented_stage()
+    def save_data(self, folder: str = "data", append: bool = False) -> None:
+        """
+        Save the txs_df, token_txs_df and internal_txs_df dataframes to the Parquet store in the given dir
+        (<folder>/<wallet>/<table>/part-*.parquet)
+
+        :param folder: directory of the store
+        :param append: whether to add only the txs from the blocks newer than the stored ones (as a new part) instead
+            of replacing the stored txs
         :return: None
         """
-        self.txs_df.to_csv(folder + f'/{self.wallet}_txs_df.csv', sep='\t', encoding='utf-8')
-        self.token_txs_df.to_csv(folder + f'/{self.wallet}_token_txs_df.csv', sep='\t', encoding='utf-8')
-        self.internal_txs_df.to_csv(folder + f'/{self.wallet}_internal_txs_df.csv', sep='\t', encoding='utf-8')
+        # Parquet support is imported only when the store is used
+        from src.tx_store import TABLES, TxStore
+
+        tx_store = TxStore(folder)
 
-    def load_data(self, folder: str = "data") -> None:
+        for table in TABLES:
+            df = getattr(self, table)
+
+            if not append:
+                tx_store.save(self.wallet, table, df)
+                continue
+
+            last_block = tx_store.max_value(self.wallet, table, 'blockNumber')
+            if last_block is not None and 'blockNumber' in df.columns:
+                df = df[df['blockNumber'] > last_block]
+
+            if len(df) > 0:
+                tx_store.append(self.wallet, table, df)
+
+    @instrumented_stage()
+    def load_data(self, folder: str = "data", start: int = None, stop: int = None, columns: dict = None) -> None:
         """
-        Same as self.get_data but loads the data from 3 CSV files located in the dir
+        Same as self.get_data but loads the data from the Parquet store located in the dir. Only the row groups in the
+        timeframe and the given columns are read
 
-        :param folder: directory of the files
+        :param folder: directory of the store
+        :param start: start timestamp (same as in self.select_data_by_timestamp)
+        :param stop: stop timestamp
+        :param columns: dict with the list of columns per table (txs_df, token_txs_df, internal_txs_df), all columns
+            of the missing tables are read
         :return: None
         """
-        self.txs_df = pd.read_csv(folder + f'/{self.wallet}_txs_df.csv', sep='\t', encoding='utf-8')
-        self.token_txs_df = pd.read_csv(folder + f'/{self.wallet}_token_txs_df.csv', sep='\t', encoding='utf-8')
-        self.internal_txs_df = pd.read_csv(folder + f'/{self.wallet}_internal_txs_df.csv', sep='\t', encoding='utf-8')
+        from src.tx_store import TABLES, TxStore
 
+        tx_store = TxStore(folder)
+        columns = columns or {}
+
+        for table in TABLES:
+            table_columns = columns.get(table)
+
+            # Needed to select the txs by timestamp later
+            if table_columns is not None and 'timeStamp' not in table_columns:
+                table_columns = list(table_columns) + ['timeStamp']
+
+            setattr(self, table, tx_store.load(self.wallet, table, table_columns, start, stop))
+
+    @instrumented_stage()
     def calculate_swap_txs(self) -> None:
         """
         Get the data about the trades from the token transactions df
@@ -269,10 +432,95 @@ class WalletAnalyzer:
 
         # swap buy - when tx send ETH from self.wallet and token_tx send tokens in self.wallet
         # swap sell - when internal_tx send ETH in self.wallet and token_tx send tokens from self.wallet
-        self.txs_df[['swapType', 'swapEth', 'tokenValue', 'tokenName', 'tokenSymbol', 'tokenCa',
-                     'tokenDecimal']] = self.txs_df.apply(
-            lambda row: self.get_info_from_token_txs(row['hash'], row['txType'], row['value']),
-            axis=1)
+        self.txs_df[TOKEN_INFO_COLUMNS] = self.join_token_txs_info(self.txs_df)
+
+    @staticmethod
+    def group_transfers_by_hash(transfers_df: pd.DataFrame, columns: list) -> pd.DataFrame:
+        """
+        Group the token/internal transfers by tx hash (one row per hash). Keeps the first transfer of every hash
+        (the given columns), the number of transfers ('count') and the sum of their values ('valueSum')
+
+        :param transfers_df: token_txs_df or internal_txs_df
+        :param columns: columns of the first transfer to keep
+        :return: dataframe indexed by hash
+        """
+        if transfers_df is None or 'hash' not in transfers_df.columns:
+            return pd.DataFrame(columns=columns + ['count', 'valueSum'], index=pd.Index([], name='hash'))
+
+        transfers_df = transfers_df.loc[transfers_df['hash'].notna()]
+
+        groups = transfers_df.drop_duplicates(subset='hash', keep='first').set_index('hash')[columns]
+
+        grouped_values = transfers_df.groupby('hash', sort=False)['value']
+        groups['count'] = grouped_values.size()
+        groups['valueSum'] = grouped_values.sum()
+
+        return groups
+
+    def join_token_txs_info(self, txs_df: pd.DataFrame, tx_types: pd.Series = None) -> pd.DataFrame:
+        """
+        Vectorized version of self.get_info_from_token_txs for the whole dataframe. Token and internal transfers are
+        grouped by hash once and joined to the txs, so the cost is linear in the number of rows
+
+        :param txs_df: dataframe with 'hash', 'txType' and 'value' columns
+        :param tx_types: tx types to use instead of the 'txType' column
+        :return: dataframe with the TOKEN_INFO_COLUMNS, same index as txs_df
+        """
+        tx_types = txs_df['txType'] if tx_types is None else tx_types
+        tx_types = tx_types.to_numpy()
+        values = txs_df['value'].to_numpy()
+        hashes = txs_df['hash'].to_numpy()
+
+        token_groups = self.group_transfers_by_hash(
+            self.token_txs_df, ['to', 'value', 'tokenName', 'tokenSymbol', 'contractAddress', 'tokenDecimal'])
+        internal_groups = self.group_transfers_by_hash(self.internal_txs_df, ['to', 'value'])
+
+        token = token_groups.reindex(hashes)
+        internal = internal_groups.reindex(hashes)
+
+        token_count = token['count'].fillna(0).to_numpy()
+        internal_count = internal['count'].fillna(0).to_numpy()
+
+        single_token_to_wallet = (token_count == 1) & (token['to'].to_numpy() == self.wallet)
+        single_internal_to_wallet = (internal_count == 1) & (internal['to'].to_numpy() == self.wallet)
+
+        buy = (tx_types == 'swap_tx_nonzero_value') & single_token_to_wallet
+        sell = (tx_types == 'swap_tx_zero_value') & single_internal_to_wallet
+        other_buy = (tx_types == 'other') & single_token_to_wallet & (values != 0)
+        other_sell = (tx_types == 'other') & (token_count != 1) & single_internal_to_wallet & (values == 0)
+        transfer_out = (tx_types == 'tokens_transfer_out') & (token_count > 0)
+
+        any_buy = buy | other_buy
+        any_sell = sell | other_sell
+        has_token = token_count > 0
+
+        swap_type = np.full(len(txs_df), np.nan, dtype=object)
+        swap_type[buy] = 'swap_buy'
+        swap_type[sell] = 'swap_sell'
+        swap_type[other_buy] = 'other_buy'
+        swap_type[other_sell] = 'other_sell'
+
+        swap_eth = np.select([any_buy, any_sell], [values, internal['value'].to_numpy()], default=np.nan)
+
+        token_value = np.select([any_buy, any_sell | transfer_out],
+                                [token['value'].to_numpy(), token['valueSum'].fillna(0).to_numpy()], default=np.nan)
+
+        # Token details of the first transfer of the hash
+        with_details = any_buy | ((any_sell | transfer_out) & has_token)
+        # other_sell txs do not get the token contract address
+        with_ca = with_details & ~other_sell
+
+        info_df = pd.DataFrame({
+            'swapType': swap_type,
+            'swapEth': swap_eth,
+            'tokenValue': token_value,
+            'tokenName': np.where(with_details, token['tokenName'].to_numpy(), np.nan),
+            'tokenSymbol': np.where(with_details, token['tokenSymbol'].to_numpy(), np.nan),
+            'tokenCa': np.where(with_ca, token['contractAddress'].to_numpy(), np.nan),
+            'tokenDecimal': np.where(with_details, token['tokenDecimal'].to_numpy(), np.nan),
+        }, index=txs_df.index)
+
+        return info_df.infer_objects()
 
     def get_info_from_token_txs(self, tx_hash: str, tx_type: str, value: float) -> pd.Series:
         """
@@ -366,30 +614,38 @@ class WalletAnalyzer:
                          index=['swapType', 'swapEth', 'tokenValue', 'tokenName', 'tokenSymbol', 'tokenCa',
                                 'tokenDecimal'])
 
+    @instrumented_stage()
     def check_snipers(self, max_allowed_overshoot: float = 1.6) -> None:
         """
-        Mark the snipe transactions (with high gas price)
+        Mark the snipe transactions (with high gas price). The gas price is compared to the gas baseline (median of
+        the same hour or day) and to the avg gas price of the day from the Etherscan export if the baseline does not
+        have enough samples
 
         :param max_allowed_overshoot: Max allowed gas price overshoot (compared to the avg gas price in the selected day)
         :return: None
         """
-        current_location = os.path.dirname(os.path.realpath(__file__))
-
-        gas_price_df = self.load_gas_price_history(os.path.join(current_location, 'data/export-AvgGasPrice.csv'))
         # Check every txs_df record if the gasPrice is greater than max_allowed_overshoot*avg gas price in the selected day
+        # The avg gas prices are looked up by the day number in the array shared by the process
         self.txs_df['dateTime'] = pd.to_datetime(self.txs_df['timeStamp'], unit='s')
-        self.txs_df['date_only'] = self.txs_df['dateTime'].dt.date
-        self.txs_df['date_only'] = pd.to_datetime(self.txs_df['date_only'])
-        self.txs_df = pd.merge(self.txs_df, gas_price_df, left_on='date_only', right_on='date', how='left')
+        avg_gas_price = get_daily_gas_prices().lookup(self.txs_df['timeStamp'])
+
+        # Median gas price of the same hour (or day) of the downloaded txs of the other wallets if there are enough
+        # samples (the own high gas prices of a sniper would raise its baseline)
+        if self.gas_baseline is not None:
+            own_hashes = pd.Index(self.txs_df['hash'])
+            if self.token_txs_df is not None and 'hash' in self.token_txs_df.columns:
+                own_hashes = own_hashes.append(pd.Index(self.token_txs_df['hash']))
+            baseline_gas_price = self.gas_baseline.lookup(self.txs_df['timeStamp'], exclude_hashes=own_hashes)
+            avg_gas_price = np.where(np.isnan(baseline_gas_price), avg_gas_price, baseline_gas_price)
+
+        avg_gas_price = pd.Series(avg_gas_price, index=self.txs_df.index)
 
         # Fill the None values
-        self.txs_df['avgGasPrice'] = self.txs_df['avgGasPrice'].fillna(99999999999)
+        avg_gas_price = avg_gas_price.fillna(99999999999)
 
-        self.txs_df['snipe'] = (self.txs_df['gasPrice'] > max_allowed_overshoot * self.txs_df['avgGasPrice']) & (
+        self.txs_df['snipe'] = (self.txs_df['gasPrice'] > max_allowed_overshoot * avg_gas_price) & (
                 self.txs_df['swapType'] == 'swap_buy')
 
-        self.txs_df = self.txs_df.drop(columns=['date_only', 'date', 'avgGasPrice'])
-
     def load_gas_price_history(self, file='data/export-AvgGasPrice.csv') -> pd.DataFrame:
         """
         Load gas price history (export data from Etherscan.io)
@@ -397,14 +653,9 @@ class WalletAnalyzer:
         :param file: CSV file with gas price history
         :return: dataframe with gas price history
         """
-        gas_price_df = pd.read_csv(file, header=0)
-
-        gas_price_df["date"] = pd.to_datetime(gas_price_df["Date(UTC)"])
-        gas_price_df["avgGasPrice"] = gas_price_df["Value (Wei)"].astype(np.int64)
-        gas_price_df = gas_price_df.drop(columns=["UnixTimeStamp", "Date(UTC)", "Value (Wei)"])
-
-        return gas_price_df
+        return read_gas_price_csv(file)
 
+    @instrumented_stage()
     def get_swap_txs(self, drop_snipes: bool = False, include_other_swap_types: bool = False,
                      drop_in_out_tokens: bool = False, drop_stablecoins_swaps: bool = True) -> pd.DataFrame:
         """
@@ -436,7 +687,7 @@ class WalletAnalyzer:
 
         # Do not consider stablecoins swaps
         if drop_stablecoins_swaps:
-            swap_txs_df = swap_txs_df.loc[~swap_txs_df['tokenCa'].isin(self.stablecoins)]
+            swap_txs_df = swap_txs_df.loc[~self.contracts.is_stablecoin(swap_txs_df['tokenCa'])]
 
         return swap_txs_df
 
@@ -467,64 +718,161 @@ class WalletAnalyzer:
 
         return df
 
+    @instrumented_stage()
     def check_token_transfers(self) -> None:
         """
         Check for token transfers in and out (including stablecoins)
 
         :return: None
         """
-        # Incoming transfers - only in 'token transfers' tab
-        # Check for tx hashes in self.token_txs_df that are not in the self.txs_df
+        self.mark_token_transfers_out()
+
+        incoming_transfers_df = self.get_incoming_token_transfers(self.txs_df['hash'])
+        self.txs_df = pd.concat([self.txs_df, incoming_transfers_df], ignore_index=True)
+        record_frame_copy(self.txs_df)
+
+    def get_incoming_token_transfers(self, known_hashes) -> pd.DataFrame:
+        """
+        Incoming token transfers - only in 'token transfers' tab (tx hashes in the token_txs_df that are not in the
+        txs_df)
+
+        :param known_hashes: hashes of the txs (Series, Index or set)
+        :return: dataframe with the new txs (None if there are no token txs)
+        """
         try:
-            incoming_transfers_df = self.token_txs_df.loc[~self.token_txs_df['hash'].isin(self.txs_df['hash'])].copy()
+            incoming_transfers_df = self.token_txs_df.loc[~self.token_txs_df['hash'].isin(known_hashes)].copy()
+        except KeyError:
+            return None
 
-            # Make sure tokens go to the self.wallet
-            incoming_transfers_df = incoming_transfers_df[incoming_transfers_df['to'] == self.wallet]
-            incoming_transfers_df['txType'] = 'tokens_transfer_in'
+        # Make sure tokens go to the self.wallet
+        incoming_transfers_df = incoming_transfers_df[incoming_transfers_df['to'] == self.wallet]
+        incoming_transfers_df['txType'] = 'tokens_transfer_in'
 
-            incoming_transfers_df.loc[
-                incoming_transfers_df['contractAddress'].isin(self.stablecoins), 'txType'] = 'stablecoins_transfer_in'
-            incoming_transfers_df['tokenValue'] = incoming_transfers_df['value'].astype(float)
-            incoming_transfers_df['value'] = 0
-            incoming_transfers_df['isError'] = 0
-            incoming_transfers_df.rename(columns={'contractAddress': 'tokenCa'}, inplace=True)
+        incoming_transfers_df.loc[
+            self.contracts.is_stablecoin(incoming_transfers_df['contractAddress']), 'txType'] = 'stablecoins_transfer_in'
+        incoming_transfers_df['tokenValue'] = incoming_transfers_df['value'].astype(float)
+        incoming_transfers_df['value'] = 0
+        incoming_transfers_df['isError'] = 0
+        incoming_transfers_df.rename(columns={'contractAddress': 'tokenCa'}, inplace=True)
 
-            self.txs_df = pd.concat([self.txs_df, incoming_transfers_df])
+        return incoming_transfers_df
 
-        except KeyError:
-            pass
+    def mark_token_transfers_out(self) -> None:
+        """
+        Out-coming transfers - in 'transactions' tab, additional info from 'token transfers' tab.
+        The 'other' txs from self.wallet with 0 value become 'tokens_transfer_out' and get the token info (joined by
+        hash for all the rows at once). Changes the txs_df in place
 
-        # Out-coming transfers - in 'transactions' tab, additional info from 'token transfers' tab
-        # Just copy info from 'token transfers' df to the 'transfers' df for the rows where 'txType' == 'other',
-        # 'from' == self.wallet, 'value' == 0
+        :return: None
+        """
         try:
             self.txs_df.loc[(self.txs_df['txType'] == 'other') & (self.txs_df['from'] == self.wallet) & (
                     self.txs_df['value'] == 0), 'txType'] = 'tokens_transfer_out'
 
-            tokens_transfer_out_df = self.txs_df.loc[self.txs_df['txType'] == 'tokens_transfer_out'].copy()
+            is_transfer_out = (self.txs_df['txType'] == 'tokens_transfer_out').to_numpy()
+            if not is_transfer_out.any():
+                return
 
-            tokens_transfer_out_df.loc[:, ['swapType', 'swapEth', 'tokenValue', 'tokenName', 'tokenSymbol', 'tokenCa',
-                                           'tokenDecimal']] = tokens_transfer_out_df.apply(
-                lambda row: self.get_info_from_token_txs(row['hash'], 'tokens_transfer_out', 0), axis=1)
+            transfers_out_df = self.txs_df.loc[is_transfer_out]
+            info_df = self.join_token_txs_info(
+                transfers_out_df, pd.Series('tokens_transfer_out', index=transfers_out_df.index))
 
-            tokens_transfer_out_df.loc[(tokens_transfer_out_df['tokenCa'].isin(self.stablecoins)) & (
-                    tokens_transfer_out_df[
-                        'txType'] == 'tokens_transfer_out'), 'txType'] = 'stablecoins_transfer_out'
+        except KeyError:
+            return
 
-            tokens_transfer_out_df.set_index('hash', inplace=True)
-            self.txs_df.set_index('hash', inplace=True)
+        # Only the found values are set (the missing ones do not overwrite the columns)
+        positions = np.flatnonzero(is_transfer_out)
+        for column in TOKEN_INFO_COLUMNS:
+            values = info_df[column].to_numpy()
+            found = pd.notna(values)
 
-            self.txs_df.update(tokens_transfer_out_df)
+            rows = np.zeros(len(self.txs_df), dtype=bool)
+            rows[positions[found]] = True
+            self.txs_df.loc[rows, column] = values[found]
 
-            self.txs_df.reset_index(inplace=True)
+        is_stablecoin = np.zeros(len(self.txs_df), dtype=bool)
+        is_stablecoin[positions] = self.contracts.is_stablecoin(info_df['tokenCa'])
+        self.txs_df.loc[is_stablecoin, 'txType'] = 'stablecoins_transfer_out'
 
-        except KeyError:
-            pass
+    @instrumented_stage()
+    def enrich_txs(self, max_allowed_overshoot: float = 1.6) -> None:
+        """
+        Same as check_token_transfers, check_internal_transfers and check_snipers, in one stage. The transfers out
+        are marked in place, the incoming token and ETH transfers are selected by the hashes known so far and the
+        final txs_df is created with one concat. The full txs_df copies of both ways are counted in the stage records
+        (frameCopies, copiedMB), so the run reports show the copies avoided
+
+        :param max_allowed_overshoot: Max allowed gas price overshoot (compared to the avg gas price in the selected day)
+        :return: None
+        """
+        self.mark_token_transfers_out()
+
+        known_hashes = pd.Index(self.txs_df['hash'])
+        incoming_transfers_df = self.get_incoming_token_transfers(known_hashes)
+
+        if incoming_transfers_df is not None:
+            known_hashes = known_hashes.append(pd.Index(incoming_transfers_df['hash']))
+        incoming_eth_transfers_df = self.get_incoming_internal_transfers(known_hashes)
+
+        self.txs_df = pd.concat([self.txs_df, incoming_transfers_df, incoming_eth_transfers_df], ignore_index=True)
+        record_frame_copy(self.txs_df)
+
+        self.check_snipers(max_allowed_overshoot)
+
+        log_event('txs_enriched', rows=len(self.txs_df))
+
+    @instrumented_stage()
+    def build_token_trades_index(self) -> pd.DataFrame:
+        """
+        Aggregate all the swaps (all swap types) per token and swap type in a single groupby. Every row is flagged
+        with the filters of get_swap_txs, so calculate_tokens_txs can answer every filter combination by masking
+        this small table
 
+        :return: dataframe indexed by tokenCa and swapType with the swapEth, tokenValue, orders (number of txs) and
+            names (number of txs with the token name) columns and the snipe, inOut, stablecoin, otherType flags
+            (no snipe flag if the snipers are not checked yet)
+        """
+        swap_txs_df = self.txs_df.loc[self.txs_df['swapType'].isin(SWAP_TYPES + OTHER_SWAP_TYPES)]
+
+        index_df = swap_txs_df.groupby(['tokenCa', 'swapType']).agg(
+            swapEth=('swapEth', 'sum'), tokenValue=('tokenValue', 'sum'), orders=('hash', 'count'),
+            names=('tokenName', 'count'))
+
+        token_ca = index_df.index.get_level_values('tokenCa')
+
+        # The snipe flag is added only after the snipers are checked
+        if 'snipe' in self.txs_df.columns:
+            snipes_ca_list = self.txs_df.loc[self.txs_df['snipe'] == True, 'tokenCa'].unique()
+            index_df['snipe'] = token_ca.isin(snipes_ca_list)
+
+        in_out_tokens_list = self.txs_df.loc[self.txs_df['txType'].isin(
+            ['tokens_transfer_in', 'tokens_transfer_out']), 'tokenCa'].unique()
+        index_df['inOut'] = token_ca.isin(in_out_tokens_list)
+        index_df['stablecoin'] = self.contracts.is_stablecoin(token_ca)
+        index_df['otherType'] = index_df.index.get_level_values('swapType').isin(OTHER_SWAP_TYPES)
+
+        self.token_trades_index = index_df
+        self.token_trades_index_source = self.txs_df
+
+        return index_df
+
+    def get_token_trades_index(self) -> pd.DataFrame:
+        """
+        Get the token trades index, it is built again if the txs_df has been replaced since the last build
+
+        :return: dataframe created by build_token_trades_index
+        """
+        if self.token_trades_index is None or self.token_trades_index_source is not self.txs_df:
+            return self.build_token_trades_index()
+
+        return self.token_trades_index
+
+    @instrumented_stage()
     def calculate_tokens_txs(self, drop_snipes: bool = False, include_other_swap_types: bool = False,
                              drop_in_out_tokens: bool = False) -> pd.DataFrame:
         """
-        Creates self.token_trades df containing aggregated info about trades per every token
+        Creates self.token_trades df containing aggregated info about trades per every token.
+        The filters mask the token trades index (see build_token_trades_index), the swaps are not grouped again
 
         :param drop_snipes: whether to drop all transaction of tokens that have snipe transactions
         :param include_other_swap_types: whether to include other swap types (other_buy, other_sell)
@@ -532,27 +880,27 @@ class WalletAnalyzer:
         :return: Dataframe with aggregated info about trades per every token and trading metrics per token
         """
 
-        # other swap types means swaps that are not made via known router, but looks like they are trades
-        swap_txs_df = self.get_swap_txs(drop_snipes, include_other_swap_types, drop_in_out_tokens)
-
-        # Basic info
-        traded_tokens_number = swap_txs_df['tokenCa'].nunique()
-        print(f"Traded tokens: {traded_tokens_number}")
-
-        trades_per_token = swap_txs_df.groupby('tokenCa')['tokenName'].count()
-        total_trades_number = trades_per_token.sum()
+        index_df = self.get_token_trades_index()
 
-        print(f"Total trades: {total_trades_number}")
+        # Same rows as get_swap_txs(drop_snipes, include_other_swap_types, drop_in_out_tokens) would return
+        mask = ~index_df['stablecoin']
+        if not include_other_swap_types:
+            mask &= ~index_df['otherType']
+        if drop_snipes:
+            mask &= ~index_df['snipe']
+        if drop_in_out_tokens:
+            mask &= ~index_df['inOut']
 
-        # Buy-sell info per token
-        txs_eth = swap_txs_df.groupby(['tokenCa', 'swapType'])['swapEth'].sum()
+        index_df = index_df.loc[mask]
 
-        txs_tokens = swap_txs_df.groupby(['tokenCa', 'swapType'])['tokenValue'].sum()
+        # Basic info
+        traded_tokens_number = index_df.index.get_level_values('tokenCa').nunique()
+        total_trades_number = index_df['names'].sum()
 
-        txs_number = swap_txs_df.groupby(['tokenCa', 'swapType'])['hash'].count()
+        log_event('tokens_traded', tokens=traded_tokens_number, trades=int(total_trades_number))
 
-        df = pd.concat([txs_eth, txs_tokens, txs_number], axis=1)
-        df.rename(columns={'hash': 'orders'}, inplace=True)
+        # Buy-sell info per token
+        df = index_df[['swapEth', 'tokenValue', 'orders']].copy()
 
         df['tokenResult'] = df.groupby('tokenCa')['tokenValue'].transform('diff')
         df['ethResult'] = df.groupby('tokenCa')['swapEth'].transform('diff')
@@ -566,28 +914,39 @@ class WalletAnalyzer:
 
         return df
 
+    @instrumented_stage()
     def check_internal_transfers(self) -> None:
         """
         For ETH transfers via contracts
 
         :return: None
         """
+        incoming_transfers_df = self.get_incoming_internal_transfers(self.txs_df['hash'])
 
-        # Incoming ETH transfers
+        if incoming_transfers_df is not None:
+            self.txs_df = pd.concat([self.txs_df, incoming_transfers_df], ignore_index=True)
+            record_frame_copy(self.txs_df)
+
+    def get_incoming_internal_transfers(self, known_hashes) -> pd.DataFrame:
+        """
+        Incoming ETH transfers (internal txs with hashes that are not in the txs_df)
+
+        :param known_hashes: hashes of the txs (Series, Index or set)
+        :return: dataframe with the new txs (None if there are no internal txs)
+        """
         try:
             incoming_transfers_df = self.internal_txs_df.loc[
-                ~self.internal_txs_df['hash'].isin(self.txs_df['hash'])].copy()
+                ~self.internal_txs_df['hash'].isin(known_hashes)].copy()
         except KeyError:
-            return
+            return None
 
         # Make sure tokens go to the self.wallet
         incoming_transfers_df = incoming_transfers_df[incoming_transfers_df['to'] == self.wallet]
         incoming_transfers_df['txType'] = 'eth_other_transfer_in'
 
-        self.txs_df = pd.concat([self.txs_df, incoming_transfers_df])
-
-        self.txs_df = self.txs_df.drop(columns=['type', 'traceId', 'errCode'])
+        return incoming_transfers_df.drop(columns=['type', 'traceId', 'errCode'], errors='ignore')
 
+    @instrumented_stage()
     def select_data_by_timestamp(self, start=None, stop=None) -> None:
         """
         Select only trades in a given timeframe
@@ -728,6 +1087,7 @@ class MetricsCalculator:
 
         return snipes_number * 100 / total_trades_number
 
+    @instrumented_stage(rows_attribute='swap_txs_df')
     def trades_per_day(self) -> pd.DataFrame:
         """
         Calculate how many trades were made every day
@@ -745,6 +1105,7 @@ class MetricsCalculator:
 
         return trades_per_day_df
 
+    @instrumented_stage(rows_attribute='swap_txs_df')
     def cumulated_daily_trading_result(self) -> pd.DataFrame:
         """
         Cumulative daily trading result (total sell-buy)
@@ -831,6 +1192,7 @@ class MetricsCalculator:
 
         return traded_tokens_number
 
+    @instrumented_stage(rows_attribute='swap_txs_df')
     def calculate_total_values(self):
         """
         Calculate basic values of the ETH/tokens flow
@@ -858,6 +1220,28 @@ class MetricsCalculator:
         return total_eth_in, total_eth_internal_in, total_eth_out, total_eth_buy, total_eth_sell, total_stablecoins_in,\
             total_stablecoins_out, total_fees_eth, count_tokens_in, count_tokens_out
 
+    @staticmethod
+    def count_trades_last_days(days: pd.Series, window_days: int) -> pd.Series:
+        """
+        Number of trades in the last window_days days (including the current trade) for every trade. The trades are
+        sorted by time, so the window starts of all the trades are found at once with a binary search
+
+        :param days: days since the first trade of every trade
+        :param window_days: number of days of the window
+        :return: Series with the number of trades (float), same index as days
+        """
+        if not days.is_monotonic_increasing:
+            # Not sorted (or with NaN) - count the trades for every trade separately
+            return days.expanding().apply(lambda window: (window >= window.iloc[-1] - window_days).sum())
+
+        days_values = days.to_numpy()
+
+        # Index of the first trade in the window of every trade
+        window_starts = np.searchsorted(days_values, days_values - window_days, side='left')
+
+        return pd.Series(np.arange(1, len(days) + 1) - window_starts, index=days.index, dtype=float)
+
+    @instrumented_stage(rows_attribute='swap_txs_df')
     def calculate_rolling_ratings(self) -> pd.DataFrame:
         """
         Calculates different types of ratings after every trade
@@ -871,34 +1255,16 @@ class MetricsCalculator:
         swap_txs_df = swap_txs_df.reset_index(drop=True)
 
         # Trades last 7d -----------------------------------------
-        def trades_last_7d(data_series):
-            # The current day in the expanding window
-            current_day = data_series.iloc[-1]
-
-            # Filter the trades in the last 7 days
-            last_7_days_trades = data_series[data_series >= (current_day - 7)]
-
-            return len(last_7_days_trades)
-
         # Create a column 'days_since_start' representing the number of days since the earliest date (temporary col)
         swap_txs_df['days_since_start'] = (swap_txs_df['dateTime'] - swap_txs_df['dateTime'].min()).dt.days
 
-        swap_txs_df['trades_last_7d'] = swap_txs_df['days_since_start'].expanding().apply(trades_last_7d)
+        swap_txs_df['trades_last_7d'] = self.count_trades_last_days(swap_txs_df['days_since_start'], 7)
 
         swap_txs_df = swap_txs_df.drop(columns=['days_since_start'])
 
         # Total traded tokens number ------------------------------
-        # Initialize an empty set to store unique tokens and a list to store cumulative counts
-        unique_tokens_seen = set()
-        cumulative_unique_tokens = []
-
-        # Iterate through the dataframe and calculate cumulative unique tokens
-        for token in swap_txs_df['tokenCa']:
-            unique_tokens_seen.add(token)
-            cumulative_unique_tokens.append(len(unique_tokens_seen))
-
-        # Add the cumulative counts to the dataframe
-        swap_txs_df['unique_tokens_traded_number'] = cumulative_unique_tokens
+        # Cumulative number of the first trades of the tokens
+        swap_txs_df['unique_tokens_traded_number'] = (~swap_txs_df['tokenCa'].duplicated()).cumsum()
 
         # Total swaps number --------------------------------------
         swap_txs_df['total_swaps'] = range(1, len(swap_txs_df) + 1)
@@ -955,20 +1321,11 @@ class MetricsCalculator:
         swap_txs_df['eth_trade_result_expanding'] = swap_txs_df['eth_trade_result'].expanding().mean()
 
         # % of how many unique traded tokens have been already sold ------
-        def calculate_tokens_with_90p_sold_up_to_index(idx, df):
-            """
-            Calculate the number of unique tokens that have been sold more than 90% up to a given index
-
-            """
-            relevant_slice = df.iloc[:idx + 1]
-            tokens_sold_more_than_90p = relevant_slice[relevant_slice['sold_more_than_90p']]['tokenCa'].unique()
-            return len(tokens_sold_more_than_90p)
-
-        # Calculate the number of tokens with more than 90% sold for each row
-        tokens_with_90p_sold_counts = [calculate_tokens_with_90p_sold_up_to_index(i, swap_txs_df) for i in
-                                       range(len(swap_txs_df))]
+        # Cumulative number of the tokens that reached 90% sold (the first such row of every token)
+        sold_90p_tokens = swap_txs_df.loc[swap_txs_df['sold_more_than_90p'], 'tokenCa']
+        first_sold_90p = (~sold_90p_tokens.duplicated()).reindex(swap_txs_df.index, fill_value=False)
 
-        swap_txs_df['total_number_of_tokens_with_more_than_90p_sold'] = tokens_with_90p_sold_counts
+        swap_txs_df['total_number_of_tokens_with_more_than_90p_sold'] = first_sold_90p.cumsum()
 
         swap_txs_df['unique_tokens_already_sold_ratio'] = swap_txs_df[
                                                               'total_number_of_tokens_with_more_than_90p_sold'] / \
@@ -1009,7 +1366,7 @@ class MetricsCalculator:
             "buy_order_size_expanding_avg",
             "eth_trade_result_ma10/buy_order_size_ma10",
             "profit_per_trade"
-        ]]
+        ]].copy()
 
         selected_columns.fillna(method='ffill', inplace=True)
 
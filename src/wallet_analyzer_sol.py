@@ -1,37 +1,156 @@
-import json
+"""Analysis of a Solana wallet"""
+import sys
 import os
 
-import pandas as pd
-import yaml
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+import json
 
-from download_wallet_txs import SolanaDataDownloader
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.chain_config import get_chain
+from src.download_wallet_txs import SolanaDataDownloader, helius_max_txs
+from src.instrumentation import instrumented_stage, log_event
+from src.solana_store import SolanaStore
+
+# Columns of the txs_df and their types in the local store
+TXS_SCHEMA = pa.schema([('hash', pa.string()), ('timeStamp', pa.int64()), ('txFee', pa.float64()),
+                        ('txType', pa.string()), ('from', pa.string()), ('to', pa.string()), ('value', pa.float64()),
+                        ('swapType', pa.string()), ('swapEth', pa.float64()), ('price', pa.float64()),
+                        ('tokenValue', pa.float64()), ('tokenName', pa.string()), ('tokenSymbol', pa.string()),
+                        ('tokenCa', pa.string()), ('tokenDecimal', pa.float64()), ('gasPrice', pa.int64()),
+                        ('gasUsed', pa.int64()), ('snipe', pa.bool_())])
+TXS_COLUMNS = TXS_SCHEMA.names
+
+# Fields of the Helius parsed txs used by the parser
+TOKEN_TRANSFER_TYPE = pa.struct([('fromUserAccount', pa.string()), ('toUserAccount', pa.string()),
+                                 ('mint', pa.string()), ('tokenAmount', pa.float64())])
+NATIVE_TRANSFER_TYPE = pa.struct([('fromUserAccount', pa.string()), ('toUserAccount', pa.string()),
+                                  ('amount', pa.int64())])
+HELIUS_TX_TYPE = pa.struct([('signature', pa.string()), ('timestamp', pa.int64()), ('fee', pa.int64()),
+                            ('type', pa.string()), ('tokenTransfers', pa.list_(TOKEN_TRANSFER_TYPE)),
+                            ('nativeTransfers', pa.list_(NATIVE_TRANSFER_TYPE))])
+
+# Number of the downloaded txs classified at once
+PARSE_BATCH_SIZE = 5000
+
+# Mint of the wrapped SOL
+SOL_MINT = "So11111111111111111111111111111111111111112"
+
+
+def to_bool_array(array: pa.Array) -> np.ndarray:
+    """
+    Arrow boolean array as a numpy array (nulls are False)
+
+    :param array: Arrow boolean array
+    :return: numpy bool array
+    """
+    return pc.fill_null(array, False).to_numpy(zero_copy_only=False)
+
+
+def last_transfer_per_tx(transfer_txs: np.ndarray, mask: np.ndarray, mints: pa.Array, amounts: np.ndarray,
+                         txs_number: int) -> tuple:
+    """
+    Mint and amount of the last selected transfer of every tx
+
+    :param transfer_txs: position of the tx of every transfer (ascending)
+    :param mask: selected transfers
+    :param mints: mint of every transfer
+    :param amounts: amount of every transfer
+    :param txs_number: number of the txs
+    :return: tuple of the mint (None if no transfer of the tx is selected) and amount (0) arrays indexed by the tx
+    """
+    positions = np.flatnonzero(mask)
+    txs = transfer_txs[positions]
+
+    # The transfers of a tx are next to each other, the last one is followed by a transfer of another tx
+    is_last = np.append(txs[1:] != txs[:-1], True) if len(txs) > 0 else np.zeros(0, dtype=bool)
+    positions = positions[is_last]
+    txs = txs[is_last]
+
+    tx_mints = np.full(txs_number, None, dtype=object)
+    tx_mints[txs] = mints.take(pa.array(positions, type=pa.int64())).to_numpy(zero_copy_only=False)
+    tx_amounts = np.zeros(txs_number)
+    tx_amounts[txs] = amounts[positions]
+
+    return tx_mints, tx_amounts
+
+
+def first_items_per_tx(lists: pa.ListArray, fields: list, txs_number: int, mask: np.ndarray = None) -> list:
+    """
+    Fields of the first item of the list of every tx
+
+    :param lists: Arrow list of structs per tx
+    :param fields: names of the struct fields
+    :param txs_number: number of the txs
+    :param mask: selected txs (None - all)
+    :return: list of object arrays indexed by the tx, one per field (None for the txs with empty lists)
+    """
+    lengths = pc.fill_null(pc.list_value_length(lists), 0).to_numpy()
+    selected = lengths > 0 if mask is None else mask & (lengths > 0)
+
+    # Position of the first item of every list in the flattened items
+    first_positions = pa.array((np.cumsum(lengths) - lengths)[selected], type=pa.int64())
+    items = pc.list_flatten(lists)
+
+    columns = []
+    for field in fields:
+        column = np.full(txs_number, None, dtype=object)
+        column[selected] = items.field(field).take(first_positions).to_numpy(zero_copy_only=False)
+        columns.append(column)
+
+    return columns
 
 
 class SolanaWalletAnalyzer:
-    def __init__(self, wallet: str):
+    def __init__(self, wallet: str, incremental: bool = False, solana_store: SolanaStore = None):
+        """
+        Create a new SolanaWalletAnalyzer
+
+        :param wallet: Wallet address
+        :param incremental: whether to download only the txs newer than the last synced tx (txs stored locally)
+        :param solana_store: local store of the parsed txs (used only if incremental is True)
+        """
         self.txs_df = None
         self.wallet = wallet
         self.transactions = None
         self.swap_txs_df = None
+        self.incremental = incremental
+        self.solana_store = solana_store if solana_store is not None else SolanaStore()
 
         # Download the transactions data
         self.data_downloader = SolanaDataDownloader(self.wallet)
 
-        # Load the YAML file with os to make it work in the streamlit cloud
-        current_location = os.path.dirname(os.path.realpath(__file__))
-        yaml_file = os.path.join(current_location, 'data/contracts.yaml')
-        with open(yaml_file, 'r') as file:
-            config = yaml.safe_load(file)
-
-        self.stablecoins = config['bsc']['stablecoins']
+        # Compiled contracts shared by the whole process (Solana mints are case sensitive)
+        self.contracts = get_chain('sol')
+        self.stablecoins = list(self.contracts.groups['stablecoins'])
 
     def load_transactions(self, file_path, limit=100):
         with open(file_path, 'r') as file:
             data = json.load(file)
         self.transactions = data['results'][:limit]
         
-    def load_txs_df(self, file_path):
-        self.txs_df = pd.read_csv(file_path)
+    @instrumented_stage()
+    def load_txs_df(self, file_path: str = None, columns: list = None) -> None:
+        """
+        Load the txs_df from a CSV file or from the local store (memory-mapped, see solana_store.py)
+
+        :param file_path: CSV file (None - the local store)
+        :param columns: columns to read from the local store (all by default)
+        :return: None
+        """
+        if file_path is not None:
+            self.txs_df = pd.read_csv(file_path)
+            return
+
+        txs_df = self.solana_store.load(self.wallet, columns)
+        self.txs_df = txs_df if len(txs_df.columns) > 0 else pd.DataFrame(columns=columns or TXS_COLUMNS)
 
     def classify_tx(self, transaction, swap_type, swap_eth, traded_token) -> tuple:
         tx_from = None
@@ -60,7 +179,7 @@ class SolanaWalletAnalyzer:
             elif transaction["nativeTransfers"][0]["fromUserAccount"] == self.wallet:
                 tx_type = "eth_transfer_out"
 
-        elif transaction["type"] == "TRANSFER" and len(token_transfers) == 1 and token_transfers[0]["mint"] in self.stablecoins:
+        elif transaction["type"] == "TRANSFER" and len(token_transfers) == 1 and token_transfers[0]["mint"] in self.contracts.stablecoins:
             value = transaction["nativeTransfers"][0]["amount"]
             tx_from = transaction["nativeTransfers"][0]["fromUserAccount"]
             tx_to = transaction["nativeTransfers"][0]["toUserAccount"]
@@ -157,47 +276,193 @@ class SolanaWalletAnalyzer:
 
         return swap_type, sol_amount, token_amount, traded_token
 
-    def get_data(self):
-        # Download the transactions data
-        self.transactions = self.data_downloader.get_txs_helius()
-
-        # Load transactions data
-        txs_list = []
-        # swap_txs_list = []
-
-        for txn in self.transactions:
-
-            swap_type, sol_amount, token_amount, traded_token = self.get_swap_info(txn)
-            tx_type, tx_from, tx_to, value = self.classify_tx(txn, swap_type, sol_amount, traded_token)
-            price = sol_amount / token_amount if token_amount != 0 else None
-
-            # Fill the txs_list
-            txs_list.append({
-                "hash": txn['signature'],
-                # "blockNumber": txn['blockNumber'],
-                "timeStamp": txn['timestamp'],
-                "txFee": txn['fee']/10**9,
-                "txType": tx_type,
-                "from": tx_from,
-                "to": tx_to,
-                "value": value,
-                "swapType": swap_type,
-                "swapEth": abs(sol_amount),
-                "price": price,
-                "tokenValue": abs(token_amount),
-                "tokenName": traded_token,
-                "tokenSymbol": None,
-                "tokenCa": traded_token,
-                "tokenDecimal": 12.0,
-                "gasPrice": 1,
-                "gasUsed": 1,
-                "snipe": False,
-            })
-
-        self.txs_df = pd.DataFrame(txs_list)
-        # self.swap_txs_df = pd.DataFrame(swap_txs_list)
-        # return self.swap_txs_df
+    @instrumented_stage()
+    def get_data(self, max_txs: int = None) -> None:
+        """
+        Download and classify the transactions. In the incremental mode only the txs newer than the last synced tx
+        (and the older ones if the stored history is shorter than max_txs) are downloaded, the txs_df is loaded from
+        the local store
+
+        :param max_txs: max number of the newest txs (None - the helius_max_txs setting, 0 - the whole history)
+        :return: None
+        """
+        if self.incremental:
+            self.sync(max_txs)
+            self.load_txs_df()
+            return
+
+        self.txs_df = self.parse_pages(self.data_downloader.iter_txs_helius(max_txs))
+
+    def parse_pages(self, pages) -> pd.DataFrame:
+        """
+        Classify the downloaded pages in batches of PARSE_BATCH_SIZE txs as they arrive (the parsed txs of the whole
+        history are never held in memory at once)
+
+        :param pages: iterable of pages (lists of the parsed txs, newest first)
+        :return: dataframe with one row per tx (TXS_COLUMNS), newest first
+        """
+        batch_dfs = []
+        batch = []
+
+        for page in pages:
+            batch.extend(page)
 
+            if len(batch) >= PARSE_BATCH_SIZE:
+                batch_dfs.append(self.parse_txs(batch))
+                batch = []
+
+        batch_dfs.append(self.parse_txs(batch))
+
+        # Txs returned twice (the history changed during the download) are dropped
+        return pd.concat(batch_dfs, ignore_index=True).drop_duplicates(subset='hash', ignore_index=True)
+
+    @instrumented_stage()
+    def sync(self, max_txs: int = None) -> None:
+        """
+        Download the txs newer than the newest stored tx to the local store (all of them, so the stored history has
+        no gaps) and backfill the older history up to max_txs txs
+
+        :param max_txs: min number of the stored txs (None - the helius_max_txs setting, 0 - the whole history)
+        :return: None
+        """
+        newest_signature = self.solana_store.load_state(self.wallet)['newest_signature']
+
+        if newest_signature is not None:
+            txs_df = self.parse_pages(self.data_downloader.iter_txs_helius(0, until=newest_signature))
+            self.solana_store.add_segment(self.wallet, self.to_table(txs_df), older=False)
+            log_event('sync_finished', wallet=self.wallet, newTxs=len(txs_df))
+
+        self.backfill(max_txs)
+
+    def backfill(self, max_txs: int = None) -> None:
+        """
+        Download the txs older than the oldest stored tx until the store has max_txs txs or the whole history. The
+        older history is downloaded only once it is needed
+
+        :param max_txs: min number of the stored txs (None - the helius_max_txs setting, 0 - the whole history)
+        :return: None
+        """
+        max_txs = helius_max_txs if max_txs is None else max_txs
+        state = self.solana_store.load_state(self.wallet)
+        stored_txs = self.solana_store.rows(self.wallet)
+
+        if state['complete'] or 0 < max_txs <= stored_txs:
+            return
+
+        missing_txs = max_txs - stored_txs if max_txs > 0 else 0
+        txs_df = self.parse_pages(self.data_downloader.iter_txs_helius(missing_txs,
+                                                                       before=state['oldest_signature']))
+
+        # The history is complete only if the signatures were listed to the first tx, fewer parsed txs than requested
+        # may be a partial download too. Failed requests raise, so the store is not changed then
+        complete = self.data_downloader.first_tx_reached
+        self.solana_store.add_segment(self.wallet, self.to_table(txs_df), older=True, complete=complete)
+        log_event('backfill_finished', wallet=self.wallet, oldTxs=len(txs_df), complete=complete)
+
+    @staticmethod
+    def to_table(txs_df: pd.DataFrame) -> pa.Table:
+        """
+        Convert the parsed txs to an Arrow table with the TXS_SCHEMA types (same types in all the store segments)
+
+        :param txs_df: dataframe with the TXS_COLUMNS
+        :return: Arrow table
+        """
+        return pa.Table.from_pandas(txs_df, schema=TXS_SCHEMA, preserve_index=False)
+
+    def parse_txs(self, transactions: list) -> pd.DataFrame:
+        """
+        Classify the Helius parsed transactions, same as get_swap_info and classify_tx for every tx. The used fields
+        are converted to Arrow arrays at once (HELIUS_TX_TYPE, the other fields are skipped), the token and native
+        transfers of all the txs are flattened into columns with the position of their tx and the swaps are found with
+        array operations on these columns
+
+        :param transactions: list of the parsed txs
+        :return: dataframe with one row per tx (TXS_COLUMNS)
+        """
+        txs = pa.array(transactions, type=HELIUS_TX_TYPE)
+        txs_number = len(txs)
+
+        # Last transfer from the wallet and last transfer to the wallet of every tx (with at least 2 transfers)
+        token_transfers = txs.field('tokenTransfers')
+        token_transfers_number = pc.fill_null(pc.list_value_length(token_transfers), 0).to_numpy()
+        transfers = pc.list_flatten(token_transfers)
+        transfer_txs = pc.list_parent_indices(token_transfers).to_numpy()
+        mints = transfers.field('mint')
+        amounts = pc.fill_null(transfers.field('tokenAmount'), 0.0).to_numpy()
+
+        is_swap_transfer = token_transfers_number[transfer_txs] >= 2
+        is_from_wallet = to_bool_array(pc.equal(transfers.field('fromUserAccount'), self.wallet))
+        is_to_wallet = ~is_from_wallet & to_bool_array(pc.equal(transfers.field('toUserAccount'), self.wallet))
+
+        from_token, from_amount = last_transfer_per_tx(transfer_txs, is_swap_transfer & is_from_wallet, mints,
+                                                       amounts, txs_number)
+        to_token, to_amount = last_transfer_per_tx(transfer_txs, is_swap_transfer & is_to_wallet, mints, amounts,
+                                                   txs_number)
+
+        is_buy = (from_token == SOL_MINT) & (to_token != SOL_MINT) & pd.notna(to_token) & (to_token != "")
+        is_sell = ~is_buy & (to_token == SOL_MINT) & (from_token != SOL_MINT) & pd.notna(from_token) & (
+                from_token != "")
+        is_swap = is_buy | is_sell
+
+        swap_type = np.select([is_buy, is_sell], ["swap_buy", "swap_sell"], None).astype(object)
+        sol_amount = np.select([is_buy, is_sell], [from_amount, to_amount], 0.0)
+        token_amount = np.select([is_buy, is_sell], [to_amount, from_amount], 0.0)
+        traded_token = np.select([is_buy, is_sell], [to_token, from_token], None).astype(object)
+        is_pumpfun = pd.Series(traded_token, dtype=object).str[-4:].eq("pump").to_numpy()
+
+        # Plain transfers: the first native transfer and the only token transfer (stablecoins)
+        native_transfers = txs.field('nativeTransfers')
+        native_from, native_to, native_amount = first_items_per_tx(
+            native_transfers, ['fromUserAccount', 'toUserAccount', 'amount'], txs_number)
+        native_amount = pd.to_numeric(pd.Series(native_amount, dtype=object)).fillna(0).to_numpy(dtype=float)
+
+        only_transfer_from, only_transfer_to, only_transfer_mint = first_items_per_tx(
+            token_transfers, ['fromUserAccount', 'toUserAccount', 'mint'], txs_number, token_transfers_number == 1)
+
+        tx_types = txs.field('type').to_numpy(zero_copy_only=False)
+        is_sol_transfer = ~is_swap & (tx_types == "TRANSFER") & (token_transfers_number == 0)
+        is_stablecoin_transfer = ~is_swap & (tx_types == "TRANSFER") & (token_transfers_number == 1) & \
+            self.contracts.is_stablecoin(only_transfer_mint)
+
+        tx_type = np.select([
+            is_swap & is_pumpfun,
+            is_swap,
+            is_sol_transfer & (native_to == self.wallet),
+            is_sol_transfer & (native_from == self.wallet),
+            is_stablecoin_transfer & (only_transfer_to == self.wallet),
+            is_stablecoin_transfer & (only_transfer_from == self.wallet),
+        ], ["pumpfun_swap", "swap", "eth_transfer_in", "eth_transfer_out", "stablecoins_transfer_in",
+            "stablecoins_transfer_out"], "other").astype(object)
+
+        is_plain_transfer = is_sol_transfer | is_stablecoin_transfer
+        value = np.select([is_swap, is_sol_transfer, is_stablecoin_transfer],
+                          [sol_amount, native_amount / 10 ** 9, native_amount], 0.0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price = np.where(token_amount != 0, sol_amount / token_amount, np.nan)
+
+        return pd.DataFrame({
+            "hash": txs.field('signature').to_numpy(zero_copy_only=False),
+            "timeStamp": txs.field('timestamp').to_numpy(zero_copy_only=False),
+            "txFee": txs.field('fee').to_numpy(zero_copy_only=False) / 10 ** 9,
+            "txType": tx_type,
+            "from": np.where(is_plain_transfer, native_from, None),
+            "to": np.where(is_plain_transfer, native_to, None),
+            "value": value,
+            "swapType": swap_type,
+            "swapEth": np.abs(sol_amount),
+            "price": price,
+            "tokenValue": np.abs(token_amount),
+            "tokenName": traded_token,
+            "tokenSymbol": None,
+            "tokenCa": traded_token,
+            "tokenDecimal": 12.0,
+            "gasPrice": 1,
+            "gasUsed": 1,
+            "snipe": False,
+        }, columns=TXS_COLUMNS)
+
+    @instrumented_stage()
     def get_swap_txs(self) -> pd.DataFrame:
         """
         Get all the swap transactions (buy and sell) from the txs_df
@@ -209,6 +474,7 @@ class SolanaWalletAnalyzer:
 
         return swap_txs_df
 
+    @instrumented_stage()
     def calculate_tokens_txs(self) -> pd.DataFrame:
         """
         Creates self.token_trades df containing aggregated info about trades per every token
@@ -221,12 +487,11 @@ class SolanaWalletAnalyzer:
 
         # Basic info
         traded_tokens_number = swap_txs_df['tokenCa'].nunique()
-        print(f"Traded tokens: {traded_tokens_number}")
 
         trades_per_token = swap_txs_df.groupby('tokenCa')['tokenName'].count()
         total_trades_number = trades_per_token.sum()
 
-        print(f"Total trades: {total_trades_number}")
+        log_event('tokens_traded', tokens=traded_tokens_number, trades=int(total_trades_number))
 
         # Buy-sell info per token
         txs_eth = swap_txs_df.groupby(['tokenCa', 'swapType'])['swapEth'].sum()
@@ -0,0 +1,71 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pandas as pd
+from src.batch_runner import analyze_wallet, load_wallets, run_batch
+from src.gas_baseline import GasBaseline
+
+WALLET = '0xdEcfCe6476A66BF8Cb1a9f3005ce5496363A99de'
+FILES = {'txlist': 'txs', 'tokentx': 'token_txs', 'txlistinternal': 'internal_txs'}
+
+
+def download_fixtures(self, actions, page_callback):
+    pages = {}
+    for action in actions:
+        with open(f'fixtures/{FILES[action]}.json', 'r') as file:
+            pages[action] = [page_callback(action, json.load(file))]
+    return pages
+
+
+@patch('src.download_wallet_txs.DataDownloader.download_concurrently', download_fixtures)
+def test_analyze_wallet(tmp_path):
+    # The shared gas baseline in src/cache is not changed by the test
+    with patch('src.wallet_analyzer_eth.get_gas_baseline', lambda: GasBaseline(str(tmp_path / 'gas_baseline.sqlite'))):
+        result = analyze_wallet(WALLET, incremental=False)
+
+    assert result['status'] == 'ok'
+    assert result['wallet'] == WALLET.lower()
+    assert result['total_swaps_number'] > 0
+    assert 0 <= result['win_ratio_percent'] <= 100
+
+
+@patch('src.wallet_analyzer_eth.WalletAnalyzer.get_data', side_effect=ValueError("No transactions found"))
+def test_analyze_wallet_error(mock_get_data):
+    result = analyze_wallet(WALLET, incremental=False)
+
+    assert result['status'] == 'error'
+    assert result['error'] == "ValueError: No transactions found"
+
+
+def fake_analyze_wallet(wallet, chain, incremental):
+    if wallet == '0x3':
+        raise MemoryError()
+    return {'wallet': wallet, 'status': 'ok' if wallet != '0x2' else 'error', 'error': None, 'seconds': 0.1,
+            'final_trade_result': 1.5}
+
+
+@patch('src.batch_runner.ProcessPoolExecutor', ThreadPoolExecutor)
+@patch('src.batch_runner.analyze_wallet', side_effect=fake_analyze_wallet)
+def test_run_batch_and_resume(mock_analyze_wallet, tmp_path):
+    results_file = str(tmp_path / 'results.csv')
+
+    results_df = run_batch(['0x1', '0x2', '0x3', '0x1'], results_file, workers=2)
+
+    assert sorted(results_df['wallet']) == ['0x1', '0x2', '0x3']
+    assert results_df.set_index('wallet')['status'].to_dict() == {'0x1': 'ok', '0x2': 'error', '0x3': 'error'}
+    assert len(pd.read_csv(results_file)) == 3
+
+    # Only the wallets with errors and the new wallets are analyzed again
+    mock_analyze_wallet.reset_mock()
+    results_df = run_batch(['0x1', '0x2', '0x3', '0x4'], results_file, workers=2)
+
+    assert sorted(call.args[0] for call in mock_analyze_wallet.call_args_list) == ['0x2', '0x3', '0x4']
+    assert sorted(results_df['wallet']) == ['0x1', '0x2', '0x3', '0x4']
+
+
+def test_load_wallets(tmp_path):
+    wallets_file = tmp_path / 'wallets.txt'
+    wallets_file.write_text("# candidates\n0xAA\n\n0xbb\n0xaa\n")
+
+    assert load_wallets(str(wallets_file)) == ['0xaa', '0xbb']
@@ -0,0 +1,56 @@
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from src.chain_config import ChainRegistry, get_chain, get_registry, load_config
+
+
+def test_chains_compiled():
+    eth = get_chain('eth')
+    sol = get_chain('sol')
+
+    assert get_chain('eth') is eth
+    assert isinstance(eth.routers, frozenset) and all(router == router.lower() for router in eth.routers)
+    assert eth.wrapped_token == load_config()['eth']['weth'].lower()
+    # Solana addresses are case sensitive
+    assert sol.wrapped_token == 'So11111111111111111111111111111111111111112'
+    assert set(sol.stablecoins) == set(load_config()['sol']['stablecoins'])
+    assert sol.routers == frozenset()
+
+    with pytest.raises(ValueError):
+        get_registry().get('btc')
+
+
+@pytest.mark.parametrize('dtype', [object, 'category'])
+def test_isin_same_as_pandas(dtype):
+    eth = get_chain('eth')
+    router = eth.groups['routers'][0]
+    stablecoin = eth.groups['stablecoins'][0]
+    addresses = pd.Series([router, stablecoin, '0x1', None, router, stablecoin.upper()], dtype=dtype)
+
+    assert list(eth.codes([router, '0x1'])) == [0, -1]
+    assert list(eth.is_router(addresses)) == list(addresses.isin(eth.routers))
+    assert list(eth.is_stablecoin(addresses)) == list(addresses.isin(eth.stablecoins))
+    assert list(eth.is_stablecoin(pd.Index(addresses))) == list(addresses.isin(eth.stablecoins))
+
+
+def test_hot_reload(tmp_path):
+    config_file = tmp_path / 'contracts.yaml'
+    config_file.write_text('eth:\n  routers:\n    - "0xAA"\n  stablecoins: []\n  weth: "0xBB"\n')
+
+    registry = ChainRegistry(str(config_file))
+    eth = registry.get('eth')
+    assert eth.routers == frozenset(['0xaa']) and eth.wrapped_token == '0xbb'
+    assert registry.reload() is False
+
+    config_file.write_text('eth:\n  routers:\n    - "0xAA"\n    - "0xCC"\n  stablecoins: ["0xDD"]\n  weth: "0xBB"\n')
+
+    # The file is not checked again within chain_config_check_seconds
+    with patch('src.chain_config.chain_config_check_seconds', 60):
+        assert registry.check() is False
+    with patch('src.chain_config.chain_config_check_seconds', 0):
+        assert registry.check() is True
+    assert registry.get('eth').routers == frozenset(['0xaa', '0xcc'])
+    assert list(registry.get('eth').is_stablecoin(['0xdd', '0xaa'])) == [True, False]
+    # The contracts taken before the reload do not change
+    assert eth.routers == frozenset(['0xaa'])
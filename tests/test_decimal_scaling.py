@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from src.decimal_scaling import scale_decimals
+
+
+def test_scale_decimals_per_value_decimals():
+    values = pd.Series(['1500000000000000000', '2500000', '7'])
+
+    result = scale_decimals(values, [18, 6, 0])
+
+    assert result.tolist() == [1.5, 2.5, 7.0]
+
+
+def test_scale_decimals_24_decimals_small_value():
+    # The old string cropping workaround changed values shorter than the decimals to 0
+    result = scale_decimals(pd.Series(['123456789']), 24)
+
+    assert result.iloc[0] == 123456789 / 10 ** 24
+
+
+def test_scale_decimals_value_too_big_for_int64():
+    result = scale_decimals(pd.Series(['1234567890123456789012345678901234567890']), 24)
+
+    assert result.iloc[0] == 1234567890123456.8
+
+
+def test_scale_decimals_invalid_value():
+    result = scale_decimals(pd.Series(['12', 'abc', None]), 1)
+
+    assert result.iloc[0] == 1.2
+    assert np.isnan(result.iloc[1])
+    assert np.isnan(result.iloc[2])
+
+
+def test_scale_decimals_precision():
+    result = scale_decimals(pd.Series(['1234567']), 6, precision=2)
+
+    assert result.iloc[0] == 1.23
+
+
+def test_scale_decimals_exact():
+    result = scale_decimals(pd.Series(['1234567890123456789012345678901234567890']), 24, exact=True)
+
+    assert result.iloc[0] == Decimal('1234567890123456.789012345678901234567890')
@@ -0,0 +1,51 @@
+import pandas as pd
+from src.df_schema import TXS_SCHEMA, apply_schema, memory_report
+
+
+def make_txs_df():
+    return pd.DataFrame({
+        'blockNumber': [19376795, 19376796],
+        'nonce': [1, 2],
+        'gasPrice': [30 * 10 ** 9, 31 * 10 ** 9],
+        'from': ['0xaa', '0xaa'],
+        'to': ['0xbb', '0xcc'],
+        'txType': ['approve', 'other'],
+        'input': ['0x095ea7b3' + '0' * 128, '0x'],
+        'blockHash': ['0x01', '0x02'],
+    })
+
+
+def test_apply_schema():
+    txs_df = apply_schema(make_txs_df(), TXS_SCHEMA)
+
+    assert 'input' not in txs_df.columns
+    assert 'blockHash' not in txs_df.columns
+    assert txs_df['blockNumber'].dtype == 'uint32'
+    assert txs_df['gasPrice'].dtype == 'int64'
+    assert txs_df['from'].dtype == 'category'
+
+    # All the tx types are categories, so they can be assigned later
+    txs_df.loc[0, 'txType'] = 'tokens_transfer_out'
+    assert txs_df['txType'].tolist() == ['tokens_transfer_out', 'other']
+
+
+def test_apply_schema_without_categories():
+    txs_df = apply_schema(make_txs_df(), TXS_SCHEMA, categories=False)
+
+    assert txs_df['from'].dtype == object
+    assert txs_df['nonce'].dtype == 'uint32'
+
+
+def test_apply_schema_values_out_of_range():
+    txs_df = make_txs_df()
+    txs_df['nonce'] = [-1, 2 ** 40]
+
+    assert apply_schema(txs_df, TXS_SCHEMA)['nonce'].tolist() == [-1, 2 ** 40]
+
+
+def test_memory_report():
+    txs_df = pd.concat([make_txs_df()] * 100, ignore_index=True)
+    report = memory_report({'txs_df': txs_df, 'compact_txs_df': apply_schema(txs_df, TXS_SCHEMA)})
+
+    assert report.loc['total', 'rows'] == 400
+    assert report.loc['compact_txs_df', 'memoryMB'] < report.loc['txs_df', 'memoryMB']
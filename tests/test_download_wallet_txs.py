@@ -1,6 +1,14 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from src.download_wallet_txs import DataDownloader
+from src.download_wallet_txs import DataDownloader, SolanaDataDownloader, split_block_range
+from src.rate_limiting import TokenBucket
+from src.sync_store import SyncStore
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit():
+    with patch('src.download_wallet_txs.get_bucket', lambda *args, **kwargs: TokenBucket(10 ** 6)):
+        yield
 
 
 def test_data_downloader_initialization():
@@ -15,8 +23,9 @@ def test_data_downloader_initialization():
     assert downloader.startblock == startblock
 
 
-@patch('download_wallet_txs.requests.request')
-def test_get_txs_success(mock_request):
+@patch('src.download_wallet_txs.get_session')
+def test_get_txs_success(get_session):
+    mock_request = get_session.return_value.request
     # Setup
     mock_response = MagicMock()
     mock_response.json.return_value = {'result': ['tx1', 'tx2']}
@@ -31,8 +40,9 @@ def test_get_txs_success(mock_request):
     assert txs == ['tx1', 'tx2']
 
 
-@patch('download_wallet_txs.requests.request')
-def test_get_txs_empty_response(mock_request):
+@patch('src.download_wallet_txs.get_session')
+def test_get_txs_empty_response(get_session):
+    mock_request = get_session.return_value.request
     # Setup
     mock_response = MagicMock()
     mock_response.json.return_value = {'result': None}
@@ -47,3 +57,142 @@ def test_get_txs_empty_response(mock_request):
     assert txs == []
 
 
+
+@patch('src.download_wallet_txs.get_session')
+def test_get_txs_incremental(get_session, tmp_path):
+    mock_request = get_session.return_value.request
+    old_txs = [{'hash': '0x2', 'blockNumber': '10'}, {'hash': '0x1', 'blockNumber': '5'}]
+    new_txs = [{'hash': '0x3', 'blockNumber': '12'}, {'hash': '0x2', 'blockNumber': '10'}]
+
+    downloader = DataDownloader("0x12345", incremental=True, sync_store=SyncStore(str(tmp_path)))
+
+    mock_request.return_value.json.return_value = {'result': old_txs}
+    assert downloader.get_txs() == old_txs
+    assert 'startblock=0&' in mock_request.call_args[0][1]
+
+    # Only the blocks from the last synced block are downloaded, duplicates are removed
+    mock_request.return_value.json.return_value = {'result': new_txs}
+    assert downloader.get_txs() == [new_txs[0]] + old_txs
+    assert 'startblock=10&' in mock_request.call_args[0][1]
+
+
+def mock_api_response(txs):
+    """Mock the API: return max 'offset' txs (newest first) between 'startblock' and 'endblock' from the url"""
+    def request(method, url, **kwargs):
+        params = dict(param.split('=') for param in url.split('?')[1].split('&'))
+        result = [tx for tx in txs if int(params['startblock']) <= int(tx['blockNumber']) <= int(params['endblock'])]
+
+        response = MagicMock()
+        response.json.return_value = {'result': result[:int(params['offset'])]}
+        return response
+
+    return request
+
+
+@patch('src.download_wallet_txs.get_session')
+def test_get_txs_more_than_one_page(get_session):
+    mock_request = get_session.return_value.request
+    txs = [{'hash': f'0x{i}', 'blockNumber': str(100 - i // 2)} for i in range(9)]
+    mock_request.side_effect = mock_api_response(txs)
+
+    downloader = DataDownloader("0x12345", page_size=3)
+    pages = list(downloader.iter_action_pages('txlist'))
+
+    assert [tx for page in pages for tx in page] == txs
+    assert all(len(page) <= 3 for page in pages)
+
+
+@patch('src.download_wallet_txs.get_session')
+def test_sync_resume_from_checkpoint(get_session, tmp_path):
+    mock_request = get_session.return_value.request
+    txs = [{'hash': f'0x{i}', 'blockNumber': str(100 - i)} for i in range(7)]
+    mock_request.side_effect = mock_api_response(txs)
+
+    store = SyncStore(str(tmp_path))
+    downloader = DataDownloader("0x12345", incremental=True, sync_store=store, page_size=3)
+
+    # Interrupt the sync after the first page
+    pages = downloader.iter_pages('txlist', 0)
+    store.start_segment("0x12345", downloader.endpoint, 'txlist', 0)
+    store.append_page("0x12345", downloader.endpoint, 'txlist', next(pages))
+
+    assert store.get_pending("0x12345", downloader.endpoint, 'txlist')['endblock'] == 98
+
+    assert downloader.get_txs() == txs
+    assert store.last_block("0x12345", downloader.endpoint, 'txlist') == 100
+    assert store.get_pending("0x12345", downloader.endpoint, 'txlist') is None
+
+
+@patch('src.download_wallet_txs.get_session')
+def test_download_concurrently(get_session):
+    mock_request = get_session.return_value.request
+    txs = [{'hash': f'0x{i}', 'blockNumber': str(100 - i // 2)} for i in range(20)]
+    token_txs = [{'hash': f'0x{i}', 'blockNumber': str(100 - i)} for i in range(2)]
+    mock_apis = {'txlist': mock_api_response(txs), 'tokentx': mock_api_response(token_txs),
+                 'txlistinternal': mock_api_response([])}
+    mock_request.side_effect = lambda method, url, **kwargs: mock_apis[url.split('action=')[1].split('&')[0]](method, url)
+
+    downloader = DataDownloader("0x12345", page_size=3, block_ranges=3)
+    pages = downloader.download_concurrently()
+
+    assert [tx for page in pages['txlist'] for tx in page] == txs
+    assert [tx for page in pages['tokentx'] for tx in page] == token_txs
+    assert pages['txlistinternal'] == []
+
+
+def test_split_block_range():
+    assert split_block_range(0, 99, 3) == [(66, 99), (33, 65), (0, 32)]
+    assert split_block_range(5, 6, 4) == [(6, 6), (5, 5)]
+
+
+def mock_helius_response(txs, failed_signature=None):
+    """Mock the Helius APIs: signatures after 'before' (RPC) and parsed txs between 'before' and 'until', the
+    requests with failed_signature as 'before' fail"""
+    signatures = [tx['signature'] for tx in txs]
+
+    def request(method, url, params=None, json=None, **kwargs):
+        options = json['params'][1] if method == 'POST' else params
+        start = signatures.index(options['before']) + 1 if 'before' in options else 0
+        stop = signatures.index(options['until']) if 'until' in options else len(txs)
+
+        response = MagicMock()
+        response.status_code = 200
+        if failed_signature is not None and options.get('before') == failed_signature:
+            response.status_code = 400
+            response.json.return_value = {'error': {'code': -32600, 'message': 'Invalid request'}}
+        elif method == 'POST':
+            response.json.return_value = {'result': [{'signature': signature} for signature in
+                                                     signatures[start:stop][:options['limit']]]}
+        else:
+            response.json.return_value = txs[start:stop][:options['limit']]
+        return response
+
+    return request
+
+
+@pytest.mark.parametrize('max_txs, expected_txs_number', [(0, 1050), (150, 150), (100, 100), (5000, 1050)])
+@patch('src.download_wallet_txs.get_session')
+def test_iter_txs_helius(get_session, max_txs, expected_txs_number):
+    mock_request = get_session.return_value.request
+    txs = [{'signature': f'sig{i}', 'timestamp': 2000 - i} for i in range(1050)]
+    mock_request.side_effect = mock_helius_response(txs)
+
+    pages = list(SolanaDataDownloader("wallet").iter_txs_helius(max_txs, workers=3))
+
+    assert [tx for page in pages for tx in page] == txs[:expected_txs_number]
+    assert all(len(page) <= 100 for page in pages)
+    # One request per slice of 100 txs
+    parsed_requests = [call for call in mock_request.call_args_list if call.args[0] == 'GET']
+    assert len(parsed_requests) == -(-expected_txs_number // 100)
+
+
+
+@pytest.mark.parametrize('failed_signature', ['sig199', 'sig999'])
+@patch('src.download_wallet_txs.get_session')
+def test_iter_txs_helius_error(get_session, failed_signature):
+    txs = [{'signature': f'sig{i}', 'timestamp': 2000 - i} for i in range(1050)]
+    get_session.return_value.request.side_effect = mock_helius_response(txs, failed_signature)
+
+    # Failed listing of the signatures (sig999) or download of a slice (sig199)
+    with pytest.raises(ValueError):
+        list(SolanaDataDownloader("wallet").iter_txs_helius(0, workers=3))
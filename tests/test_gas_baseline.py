@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from src.gas_baseline import GasBaseline
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+START = 1700000000 // DAY * DAY
+
+
+def make_txs_df(timestamps, gas_prices, first_hash=0) -> pd.DataFrame:
+    return pd.DataFrame({
+        'hash': [f'0x{i:x}' for i in range(first_hash, first_hash + len(timestamps))],
+        'blockNumber': np.arange(len(timestamps)),
+        'timeStamp': timestamps,
+        'gasPrice': gas_prices,
+    })
+
+
+def test_add_txs_and_percentiles(tmp_path):
+    gas_baseline = GasBaseline(str(tmp_path / 'gas_baseline.sqlite'), min_samples=3)
+
+    txs_df = make_txs_df([START + i for i in range(5)], [10, 20, 30, 40, 50])
+
+    assert gas_baseline.add_txs(txs_df) == 5
+    # Known hashes are skipped (the same tx downloaded for other wallets)
+    assert gas_baseline.add_txs(txs_df) == 0
+
+    hours_df = gas_baseline.get_percentiles('hour')
+
+    assert hours_df.index.tolist() == [START // HOUR]
+    assert hours_df[['count', 'p25', 'p50', 'p90']].values.tolist() == [[5, 20, 30, 46]]
+
+    # Percentiles updated with the new samples of the hour
+    gas_baseline.add_txs(make_txs_df([START + 10, START + 11], [60, 70], first_hash=5))
+
+    assert gas_baseline.get_percentiles('hour')['p50'].tolist() == [40]
+
+
+def test_lookup_hour_then_day(tmp_path):
+    gas_baseline = GasBaseline(str(tmp_path / 'gas_baseline.sqlite'), min_samples=3)
+
+    # 3 samples in the first hour, 1 in the second hour - only the day has enough samples
+    gas_baseline.add_txs(make_txs_df([START, START + 1, START + 2, START + HOUR], [10, 20, 30, 100]))
+
+    gas_prices = gas_baseline.lookup(pd.Series([START + 5, START + HOUR + 5, START + DAY, np.nan]))
+
+    np.testing.assert_array_equal(gas_prices, [20, 25, np.nan, np.nan])
+
+
+def test_lookup_exclude_hashes(tmp_path):
+    gas_baseline = GasBaseline(str(tmp_path / 'gas_baseline.sqlite'), min_samples=3)
+
+    # Other wallets: 3 samples in the first hour. The analyzed wallet: 2 high gas prices in the first hour and the
+    # only samples of the second day
+    gas_baseline.add_txs(make_txs_df([START, START + 1, START + 2], [10, 20, 30]))
+    own_txs_df = make_txs_df([START + 3, START + 4, START + DAY, START + DAY + 1, START + DAY + 2], [500, 600, 1, 2, 3],
+                             first_hash=3)
+    gas_baseline.add_txs(own_txs_df)
+
+    timestamps = pd.Series([START + 5, START + DAY + 5])
+    np.testing.assert_array_equal(gas_baseline.lookup(timestamps), [30, 2])
+    np.testing.assert_array_equal(gas_baseline.lookup(timestamps, exclude_hashes=own_txs_df['hash']), [20, np.nan])
+
+
+def test_import_file(tmp_path):
+    gas_baseline = GasBaseline(str(tmp_path / 'gas_baseline.sqlite'), min_samples=1)
+
+    file = str(tmp_path / 'txs.csv')
+    make_txs_df([START, START + DAY], [10, 20]).assign(hash=['0xA', '0xB'], other=1).to_csv(file, index=False)
+
+    assert gas_baseline.import_file(file, chunk_size=1) == 2
+    assert gas_baseline.get_percentiles('day')['p50'].tolist() == [10, 20]
+    assert gas_baseline.add_txs(make_txs_df([START], [10]).assign(hash=['0xa'])) == 0
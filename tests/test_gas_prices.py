@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pandas as pd
+from src.gas_prices import DailyGasPrices, clear_loaded, get_daily_gas_prices, read_gas_price_csv
+
+GAS_PRICE_FILE = '../src/data/export-AvgGasPrice.csv'
+
+
+def test_lookup_same_as_merge_by_date():
+    gas_price_df = read_gas_price_csv(GAS_PRICE_FILE)
+    timestamps = np.random.default_rng(0).integers(1400000000, 1800000000, 1000)
+
+    txs_df = pd.DataFrame({'timeStamp': timestamps})
+    txs_df['date_only'] = pd.to_datetime(txs_df['timeStamp'], unit='s').dt.normalize()
+    expected = pd.merge(txs_df, gas_price_df, left_on='date_only', right_on='date', how='left')['avgGasPrice']
+
+    avg_gas_prices = DailyGasPrices.from_csv(GAS_PRICE_FILE).lookup(timestamps)
+
+    assert np.isnan(avg_gas_prices).any()
+    np.testing.assert_array_equal(avg_gas_prices, expected.to_numpy(dtype=float))
+
+
+def test_lookup_missing_timestamps():
+    daily_gas_prices = DailyGasPrices(np.array([-1, 5, 7], dtype=np.int64))
+
+    avg_gas_prices = daily_gas_prices.lookup(pd.Series([10, 86400, 2 * 86400 + 5, 3 * 86400, np.nan, -5]))
+
+    np.testing.assert_array_equal(avg_gas_prices, [np.nan, 5, 7, np.nan, np.nan, np.nan])
+
+
+def test_load_memory_mapped_cache(tmp_path):
+    cache_file = str(tmp_path / 'avg_gas_price.npy')
+
+    daily_gas_prices = DailyGasPrices.load(GAS_PRICE_FILE, cache_file)
+
+    assert os.path.exists(cache_file)
+    assert isinstance(daily_gas_prices.prices, np.memmap)
+    assert daily_gas_prices.prices.dtype == np.int64
+
+    # Not created again if the CSV file is older
+    os.utime(cache_file, (0, os.path.getmtime(GAS_PRICE_FILE) + 1))
+    mtime = os.path.getmtime(cache_file)
+    DailyGasPrices.load(GAS_PRICE_FILE, cache_file)
+
+    assert os.path.getmtime(cache_file) == mtime
+
+
+def test_get_daily_gas_prices_loaded_once(tmp_path):
+    cache_file = str(tmp_path / 'avg_gas_price.npy')
+    clear_loaded()
+
+    daily_gas_prices = get_daily_gas_prices(GAS_PRICE_FILE, cache_file)
+
+    assert get_daily_gas_prices(GAS_PRICE_FILE, cache_file) is daily_gas_prices
+
+    clear_loaded()
+
+    assert get_daily_gas_prices(GAS_PRICE_FILE, cache_file) is not daily_gas_prices
@@ -0,0 +1,119 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+from src.gas_baseline import GasBaseline
+from src.instrumentation import EventFormatter, get_run_report, instrumented_stage, start_run, submit_in_context
+from src.rate_limiting import TokenBucket, request_with_retry
+from src.wallet_analyzer_eth import WalletAnalyzer
+
+
+class Pipeline:
+    def __init__(self):
+        self.txs_df = pd.DataFrame({'value': range(10)})
+
+    @instrumented_stage()
+    def select(self):
+        self.txs_df = self.txs_df.iloc[:4]
+        return self.nested(self.txs_df)
+
+    @instrumented_stage(name='nested')
+    def nested(self, df):
+        return df.iloc[:1]
+
+    @instrumented_stage()
+    def fail(self):
+        raise ValueError("no txs")
+
+
+def test_stages_recorded_only_in_run():
+    pipeline = Pipeline()
+    pipeline.select()
+    assert get_run_report() is None
+
+    with start_run('0x1') as run_report:
+        Pipeline().select()
+        with pytest.raises(ValueError):
+            pipeline.fail()
+
+    stages = {record['stage']: record for record in run_report.stages}
+    assert stages['nested']['parent'] == 'Pipeline.select'
+    assert (stages['nested']['rowsIn'], stages['nested']['rowsOut']) == (4, 1)
+    assert (stages['Pipeline.select']['rowsIn'], stages['Pipeline.select']['rowsOut']) == (10, 1)
+    assert stages['Pipeline.fail']['error'] == "ValueError: no txs"
+    assert all(record['seconds'] >= 0 and record['peakRssMB'] > 0 for record in run_report.stages)
+    assert run_report.seconds > 0
+
+
+def test_downloads_recorded_from_threads():
+    response = MagicMock()
+    response.status_code = 200
+    response.content = b'{"result": []}'
+    response.from_cache = False
+    session = MagicMock()
+    session.request.return_value = response
+
+    def download(number):
+        return request_with_retry(session, "GET", f"https://api.etherscan.io/api?page={number}&apikey=secret",
+                                  TokenBucket(10 ** 6))
+
+    with start_run('0x1') as run_report:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [submit_in_context(executor, download, number) for number in range(8)]
+            [future.result() for future in futures]
+
+    report = json.loads(run_report.to_json())
+
+    assert len(report['downloads']) == 8
+    assert report['downloadedBytes'] == 8 * len(response.content)
+    assert {download['url'] for download in report['downloads']} == {'https://api.etherscan.io/api'}
+    assert run_report.summary().loc['downloads', 'bytes'] == 8 * len(response.content)
+
+
+def download_fixtures(self, actions, page_callback):
+    files = {'txlist': 'txs', 'tokentx': 'token_txs', 'txlistinternal': 'internal_txs'}
+    pages = {}
+    for action in actions:
+        with open(f'fixtures/{files[action]}.json', 'r') as file:
+            pages[action] = [page_callback(action, json.load(file))]
+    return pages
+
+
+@patch('src.download_wallet_txs.DataDownloader.download_concurrently', download_fixtures)
+def test_pipeline_report(tmp_path):
+    report_file = str(tmp_path / 'report.json')
+
+    with start_run('0x1', profiler='cprofile', report_file=report_file) as run_report:
+        wallet_analyzer = WalletAnalyzer('0xdEcfCe6476A66BF8Cb1a9f3005ce5496363A99de', 'eth',
+                                         gas_baseline=GasBaseline(str(tmp_path / 'gas_baseline.sqlite')))
+        wallet_analyzer.get_data()
+        wallet_analyzer.calculate_swap_txs()
+        wallet_analyzer.enrich_txs()
+
+    summary_df = run_report.summary()
+    assert {'WalletAnalyzer.get_data', 'WalletAnalyzer.download', 'WalletAnalyzer.prepare_txs_df',
+            'WalletAnalyzer.calculate_swap_txs', 'WalletAnalyzer.enrich_txs',
+            'WalletAnalyzer.check_snipers'} <= set(summary_df.index)
+    # All the downloaded rows (with the token and internal txs) and the txs without errors
+    rows_out = summary_df['rowsOut']
+    assert rows_out['WalletAnalyzer.download'] > rows_out['WalletAnalyzer.get_data'] > 0
+
+    stages_df = run_report.stages_df()
+    assert (stages_df.loc[stages_df['stage'] == 'WalletAnalyzer.check_snipers', 'parent'] ==
+            'WalletAnalyzer.enrich_txs').all()
+    assert 'cumulative' in run_report.profile
+
+    with open(report_file, 'r') as file:
+        assert json.load(file)['name'] == '0x1'
+
+
+def test_event_formatter():
+    record = logging.LogRecord('wallet_analyzer', logging.INFO, __file__, 1, 'txs_enriched', None, None)
+    record.event = 'txs_enriched'
+    record.fields = {'rows': 10, 'snipes': 2}
+
+    assert EventFormatter().format(record) == 'txs_enriched rows=10 snipes=2'
+    assert json.loads(EventFormatter(json_lines=True).format(record))['rows'] == 10
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+import requests
+from unittest.mock import MagicMock
+from src.download_wallet_txs import is_etherscan_rate_limited
+from src.rate_limiting import TokenBucket, RateLimitError, request_with_retry
+
+
+def make_response(status_code=200, json_data=None, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json_data if json_data is not None else {}
+    response.headers = headers or {}
+    return response
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=20, capacity=2)
+
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+
+    # 2 calls from the burst, 2 calls at 20 calls/s
+    assert 0.08 <= time.monotonic() - start < 0.5
+
+
+def test_request_with_retry_429_retry_after():
+    session = MagicMock()
+    session.request.side_effect = [make_response(429, headers={'Retry-After': '0'}), make_response(200)]
+
+    response = request_with_retry(session, "GET", "https://api.helius.xyz/v0", TokenBucket(10 ** 6))
+
+    assert response.status_code == 200
+    assert session.request.call_count == 2
+
+
+def test_request_with_retry_etherscan_rate_limit():
+    rate_limited = make_response(200, {'status': '0', 'message': 'NOTOK', 'result': 'Max rate limit reached'})
+    no_txs = make_response(200, {'status': '0', 'message': 'No transactions found', 'result': []})
+    session = MagicMock()
+    session.request.side_effect = [rate_limited, no_txs]
+
+    response = request_with_retry(session, "GET", "https://api.etherscan.io/api", TokenBucket(10 ** 6),
+                                  is_etherscan_rate_limited, base_delay=0.001)
+
+    assert response is no_txs
+
+
+def test_request_with_retry_connection_error():
+    session = MagicMock()
+    session.request.side_effect = [requests.ConnectionError("reset"), make_response(200)]
+
+    response = request_with_retry(session, "GET", "https://api.etherscan.io/api", TokenBucket(10 ** 6),
+                                  base_delay=0.001)
+
+    assert response.status_code == 200
+
+
+def test_request_with_retry_gives_up():
+    session = MagicMock()
+    session.request.return_value = make_response(503)
+
+    with pytest.raises(RateLimitError):
+        request_with_retry(session, "GET", "https://api.etherscan.io/api", TokenBucket(10 ** 6), max_retries=2,
+                           base_delay=0.001)
+
+    assert session.request.call_count == 3
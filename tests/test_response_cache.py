@@ -0,0 +1,102 @@
+import io
+import json
+
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from src.download_wallet_txs import DataDownloader
+from src.rate_limiting import TokenBucket
+from src.response_cache import ResponseCache
+
+
+class FakeAdapter(HTTPAdapter):
+    """
+    Return the given JSON for every request and count the sent requests
+    """
+    def __init__(self, data):
+        super().__init__()
+        self.data = data
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        raw = HTTPResponse(body=io.BytesIO(json.dumps(self.data).encode()), status=200, preload_content=False,
+                           request_url=request.url)
+        return self.build_response(request, raw)
+
+
+def make_cache(tmp_path, data, **kwargs):
+    cache = ResponseCache(str(tmp_path / 'http_cache'), **kwargs)
+    adapter = FakeAdapter(data)
+    cache.session.mount('https://', adapter)
+    return cache, adapter
+
+
+def test_cache_hits_and_misses(tmp_path):
+    cache, adapter = make_cache(tmp_path, {'status': '1', 'result': []})
+
+    url = "https://api.etherscan.io/api?action=txlist&startblock=0"
+    cache.request("GET", url + "&apikey=key1", action='txlist')
+    response = cache.request("GET", url + "&apikey=key2", action='txlist')
+
+    # API key is not a part of the cache key
+    assert response.from_cache
+    assert adapter.sent == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+    assert cache.is_cached("GET", url + "&apikey=key3")
+
+
+def test_finalized_responses_never_expire(tmp_path):
+    cache, _ = make_cache(tmp_path, {'status': '1', 'result': []})
+
+    cache.request("GET", "https://api.etherscan.io/api?endblock=100", action='txlist', finalized=True)
+    cache.request("GET", "https://api.etherscan.io/api?endblock=99999999", action='txlist')
+
+    expires = {response.url.split('=')[-1]: response.expires for response in cache.session.cache.responses.values()}
+
+    assert expires['100'] is None
+    assert expires['99999999'] is not None
+
+
+def test_errors_are_not_cached(tmp_path):
+    cache, adapter = make_cache(tmp_path, {'status': '0', 'message': 'NOTOK', 'result': 'Max rate limit reached'})
+
+    cache.request("GET", "https://api.etherscan.io/api?action=txlist", action='txlist')
+    cache.request("GET", "https://api.etherscan.io/api?action=txlist", action='txlist')
+
+    assert adapter.sent == 2
+
+
+def test_disabled_cache(tmp_path):
+    cache, adapter = make_cache(tmp_path, {'status': '1', 'result': []}, enabled=False)
+
+    cache.request("GET", "https://api.etherscan.io/api?action=txlist", action='txlist')
+    cache.request("GET", "https://api.etherscan.io/api?action=txlist", action='txlist')
+
+    assert adapter.sent == 2
+    assert cache.stats()['hits'] == 0
+
+
+def test_evict_oldest_responses(tmp_path):
+    cache, _ = make_cache(tmp_path, {'status': '1', 'result': ['x' * 1000] * 100}, max_size_mb=0.5)
+
+    for startblock in range(20):
+        cache.request("GET", f"https://api.etherscan.io/api?startblock={startblock}", action='txlist',
+                      finalized=True)
+
+    cache.evict()
+
+    assert cache.size() <= cache.max_size_bytes
+    assert not cache.is_cached("GET", "https://api.etherscan.io/api?startblock=0")
+    assert cache.is_cached("GET", "https://api.etherscan.io/api?startblock=19")
+
+
+def test_downloader_caches_finalized_ranges_forever(tmp_path):
+    cache, _ = make_cache(tmp_path, {'status': '1', 'result': [{'blockNumber': '1000'}]})
+    data_downloader = DataDownloader('0x1', 'etherscan.io', http_session=cache, rate_limiter=TokenBucket(10 ** 6))
+
+    data_downloader.request_txs('txlist', 0)
+
+    assert data_downloader.newest_block == 1000
+    assert data_downloader.is_finalized(800)
+    assert not data_downloader.is_finalized(900)
@@ -0,0 +1,70 @@
+import pandas as pd
+from src.tx_store import TxStore
+
+WALLET = '0xcecfce5556a66bf8cb1a9f3005ce5496363a88aa'
+
+
+def make_txs_df(block_numbers):
+    return pd.DataFrame({
+        'blockNumber': block_numbers,
+        'timeStamp': [1700000000 + 12 * block_number for block_number in block_numbers],
+        'hash': [f'0x{block_number:064x}' for block_number in block_numbers],
+        'value': [0.1 * block_number for block_number in block_numbers],
+    })
+
+
+def test_save_and_load_keep_dtypes(tmp_path):
+    tx_store = TxStore(str(tmp_path))
+    txs_df = make_txs_df([3, 2, 1])
+
+    tx_store.save(WALLET, 'txs_df', txs_df)
+
+    pd.testing.assert_frame_equal(tx_store.load(WALLET, 'txs_df'), txs_df)
+
+
+def test_append_and_max_block(tmp_path):
+    tx_store = TxStore(str(tmp_path))
+
+    tx_store.append(WALLET, 'txs_df', make_txs_df([2, 1]))
+    tx_store.append(WALLET, 'txs_df', make_txs_df([4, 3]))
+
+    assert len(tx_store.get_parts(WALLET, 'txs_df')) == 2
+    assert tx_store.max_value(WALLET, 'txs_df', 'blockNumber') == 4
+    assert tx_store.load(WALLET, 'txs_df')['blockNumber'].tolist() == [2, 1, 4, 3]
+
+    # Save replaces all the parts
+    tx_store.save(WALLET, 'txs_df', make_txs_df([5]))
+    assert tx_store.load(WALLET, 'txs_df')['blockNumber'].tolist() == [5]
+
+
+def test_append_after_save_keeps_order(tmp_path):
+    tx_store = TxStore(str(tmp_path))
+
+    tx_store.append(WALLET, 'txs_df', make_txs_df([2, 1]))
+    tx_store.save(WALLET, 'txs_df', make_txs_df([4, 3]))
+    tx_store.append(WALLET, 'txs_df', make_txs_df([6, 5]))
+    tx_store.append(WALLET, 'txs_df', make_txs_df([7]))
+
+    # The part numbers do not depend on the random suffixes
+    numbers = [part.split('part-')[-1].split('-')[0] for part in tx_store.get_parts(WALLET, 'txs_df')]
+    assert numbers == ['000001', '000002', '000003']
+    assert tx_store.load(WALLET, 'txs_df')['blockNumber'].tolist() == [4, 3, 6, 5, 7]
+
+
+def test_load_columns_and_time_range(tmp_path):
+    tx_store = TxStore(str(tmp_path))
+    txs_df = make_txs_df(list(range(10, 0, -1)))
+    tx_store.save(WALLET, 'txs_df', txs_df)
+
+    loaded_df = tx_store.load(WALLET, 'txs_df', columns=['hash', 'timeStamp'], start=txs_df['timeStamp'].iloc[7],
+                              stop=txs_df['timeStamp'].iloc[2])
+
+    assert loaded_df.columns.tolist() == ['hash', 'timeStamp']
+    assert loaded_df['hash'].tolist() == txs_df['hash'].iloc[2:8].tolist()
+
+    by_block_df = tx_store.load(WALLET, 'txs_df', start=5, column='blockNumber')
+    assert by_block_df['blockNumber'].tolist() == [10, 9, 8, 7, 6, 5]
+
+
+def test_load_missing_table(tmp_path):
+    assert TxStore(str(tmp_path)).load(WALLET, 'internal_txs_df').empty
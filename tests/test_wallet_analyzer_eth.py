@@ -1,5 +1,11 @@
+import io
+import json
+from unittest.mock import patch
+
 import pytest
-from src.wallet_analyzer_eth import WalletAnalyzer
+from src.instrumentation import start_run
+from src.wallet_analyzer_eth import MetricsCalculator, WalletAnalyzer
+import numpy as np
 import pandas as pd
 
 # Sample data for testing
@@ -143,3 +149,263 @@ def test_drop_in_out_tokens(wallet_analyzer_with_data):
     assert df_after is not None
     assert len(df_after) > 0
 
+
+def test_join_token_txs_info_same_as_get_info_from_token_txs(wallet_analyzer):
+    other_wallet = "0x3f5ce5fbfe3e9af3971dd833d26ba9b5c936f0be"
+
+    wallet_analyzer.token_txs_df = pd.DataFrame({
+        'hash': ['0x1', '0x2', '0x2', '0x3', '0x4', '0x5', '0x5', '0x7'],
+        'to': [OWN_WALLET_ADDRESS, other_wallet, other_wallet, OWN_WALLET_ADDRESS, other_wallet, other_wallet,
+               other_wallet, OWN_WALLET_ADDRESS],
+        'value': [100.0, 20.0, 30.0, 5.0, 7.0, 1.0, 2.0, 3.0],
+        'tokenName': ['a', 'b', 'b', 'c', 'd', 'e', 'e', 'f'],
+        'tokenSymbol': ['a', 'b', 'b', 'c', 'd', 'e', 'e', 'f'],
+        'contractAddress': ['0xa', '0xb', '0xb', '0xc', '0xd', '0xe', '0xe', '0xf'],
+        'tokenDecimal': [18, 9, 9, 18, 6, 18, 18, 18],
+    })
+    wallet_analyzer.internal_txs_df = pd.DataFrame({
+        'hash': ['0x2', '0x5', '0x6'],
+        'to': [OWN_WALLET_ADDRESS, OWN_WALLET_ADDRESS, OWN_WALLET_ADDRESS],
+        'value': [0.3, 0.2, 0.1],
+    })
+    txs_df = pd.DataFrame({
+        'hash': ['0x1', '0x2', '0x3', '0x4', '0x5', '0x6', '0x7', '0x8'],
+        'txType': ['swap_tx_nonzero_value', 'swap_tx_zero_value', 'other', 'tokens_transfer_out', 'other',
+                   'swap_tx_zero_value', 'other', 'approve'],
+        'value': [0.5, 0.0, 0.1, 0.0, 0.0, 0.0, 0.0, 0.0],
+    })
+
+    expected = txs_df.apply(lambda row: wallet_analyzer.get_info_from_token_txs(row['hash'], row['txType'],
+                                                                                row['value']), axis=1)
+    result = wallet_analyzer.join_token_txs_info(txs_df)
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert result['swapType'].tolist()[:3] == ['swap_buy', 'swap_sell', 'other_buy']
+
+
+def test_classify_txs_same_as_classify_tx(wallet_analyzer):
+    other_wallet = "0x3f5ce5fbfe3e9af3971dd833d26ba9b5c936f0be"
+    router = "0x3fC91A3afd70395Cd496C647d5a6CC9D4B2b7FAD".lower()
+
+    txs_df = pd.DataFrame({
+        'from': [OWN_WALLET_ADDRESS, other_wallet, OWN_WALLET_ADDRESS, OWN_WALLET_ADDRESS, OWN_WALLET_ADDRESS,
+                 OWN_WALLET_ADDRESS, other_wallet, OWN_WALLET_ADDRESS],
+        'to': [other_wallet, OWN_WALLET_ADDRESS, other_wallet, router, router, other_wallet, other_wallet,
+               OWN_WALLET_ADDRESS],
+        'methodId': ['0x', '0x', '0x095ea7b3', '0x343', '0x343', '0x343', '0x', '0x'],
+        'value': [0.5, 0.5, 0.1, 0, 0.1, 0.1, 0.2, 0],
+    })
+
+    expected = [wallet_analyzer.classify_tx(row['from'], row['to'], row['methodId'], row['value'])
+                for _, row in txs_df.iterrows()]
+
+    assert wallet_analyzer.classify_txs(txs_df).tolist() == expected
+
+
+def test_classify_txs_minus_value(wallet_analyzer):
+    txs_df = pd.DataFrame({'from': [OWN_WALLET_ADDRESS], 'to': [OWN_WALLET_ADDRESS], 'methodId': ['0x'],
+                           'value': [-1.5]})
+
+    with pytest.raises(ValueError):
+        wallet_analyzer.classify_txs(txs_df)
+
+
+def test_save_and_load_data(wallet_analyzer, tmp_path):
+    txs_df = pd.DataFrame({'blockNumber': [3, 2, 1], 'timeStamp': [300, 200, 100], 'hash': ['0x3', '0x2', '0x1']})
+    wallet_analyzer.txs_df = txs_df
+    wallet_analyzer.token_txs_df = txs_df.copy()
+    wallet_analyzer.internal_txs_df = pd.DataFrame()
+    wallet_analyzer.save_data(str(tmp_path))
+
+    wallet_analyzer.txs_df = txs_df[txs_df['blockNumber'] > 1]
+    wallet_analyzer.save_data(str(tmp_path), append=True)
+
+    wallet_analyzer.load_data(str(tmp_path), start=200, columns={'txs_df': ['hash']})
+
+    assert wallet_analyzer.txs_df.columns.tolist() == ['hash', 'timeStamp']
+    assert wallet_analyzer.txs_df['hash'].tolist() == ['0x3', '0x2']
+    assert wallet_analyzer.token_txs_df['blockNumber'].tolist() == [3, 2]
+    assert wallet_analyzer.internal_txs_df.empty
+
+
+def test_count_trades_last_days_same_as_expanding():
+    days = pd.Series([0, 0, 1, 3, 7, 8, 8, 15, 30, 31])
+
+    expected = days.expanding().apply(lambda window: len(window[window >= window.iloc[-1] - 7]))
+
+    pd.testing.assert_series_equal(MetricsCalculator.count_trades_last_days(days, 7), expected)
+
+    # Not sorted
+    days = days.iloc[::-1].reset_index(drop=True)
+    expected = days.expanding().apply(lambda window: len(window[window >= window.iloc[-1] - 7]))
+
+    pd.testing.assert_series_equal(MetricsCalculator.count_trades_last_days(days, 7), expected)
+
+
+def test_calculate_rolling_ratings_unique_tokens():
+    rng = np.random.default_rng(0)
+    swaps_number = 300
+    swap_txs_df = pd.DataFrame({
+        'blockNumber': np.arange(swaps_number),
+        'dateTime': pd.to_datetime(1700000000 + np.sort(rng.integers(0, 60 * 86400, swaps_number)), unit='s'),
+        'tokenCa': rng.choice([f'0x{i:040x}' for i in range(40)], swaps_number),
+        'swapType': rng.choice(['swap_buy', 'swap_sell'], swaps_number),
+        'swapEth': rng.random(swaps_number),
+        'tokenValue': rng.random(swaps_number) * 1000,
+    })
+
+    ratings_df = MetricsCalculator(swap_txs_df, swap_txs_df, pd.DataFrame()).calculate_rolling_ratings()
+
+    # Same as the row by row versions
+    days = (swap_txs_df['dateTime'] - swap_txs_df['dateTime'].min()).dt.days
+    trades_last_7d = [((days[:i + 1]) >= days[i] - 7).sum() for i in range(swaps_number)]
+    unique_tokens = [swap_txs_df['tokenCa'][:i + 1].nunique() for i in range(swaps_number)]
+
+    assert ratings_df['trades_last_7d'].tolist() == trades_last_7d
+    assert ratings_df['unique_tokens_traded_number'].tolist() == unique_tokens
+
+    token_buys = swap_txs_df['tokenValue'].where(swap_txs_df['swapType'] == 'swap_buy', 0)
+    token_sells = swap_txs_df['tokenValue'].where(swap_txs_df['swapType'] == 'swap_sell', 0)
+    sold_more_than_90p = token_sells.groupby(swap_txs_df['tokenCa']).cumsum() / token_buys.groupby(
+        swap_txs_df['tokenCa']).cumsum() >= 0.9
+    tokens_sold_90p = [swap_txs_df['tokenCa'][:i + 1][sold_more_than_90p[:i + 1]].nunique()
+                       for i in range(swaps_number)]
+
+    assert ratings_df['unique_tokens_already_sold_ratio'].tolist() == \
+           (pd.Series(tokens_sold_90p) / pd.Series(unique_tokens)).tolist()
+
+
+@pytest.mark.parametrize('drop_snipes', [False, True])
+@pytest.mark.parametrize('include_other_swap_types', [False, True])
+@pytest.mark.parametrize('drop_in_out_tokens', [False, True])
+def test_calculate_tokens_txs_same_as_grouping_swap_txs(wallet_analyzer_with_data, drop_snipes,
+                                                        include_other_swap_types, drop_in_out_tokens):
+    # Stablecoin swap to check the stablecoins flag
+    stablecoin = wallet_analyzer_with_data.stablecoins[0]
+    wallet_analyzer_with_data.txs_df.loc[0, ['swapType', 'tokenCa']] = ['swap_buy', stablecoin]
+
+    token_trades_df = wallet_analyzer_with_data.calculate_tokens_txs(drop_snipes, include_other_swap_types,
+                                                                     drop_in_out_tokens)
+
+    # Grouped from the filtered swaps
+    swap_txs_df = wallet_analyzer_with_data.get_swap_txs(drop_snipes, include_other_swap_types, drop_in_out_tokens)
+    expected = pd.concat([swap_txs_df.groupby(['tokenCa', 'swapType'])['swapEth'].sum(),
+                          swap_txs_df.groupby(['tokenCa', 'swapType'])['tokenValue'].sum(),
+                          swap_txs_df.groupby(['tokenCa', 'swapType'])['hash'].count().rename('orders')], axis=1)
+
+    assert len(token_trades_df) > 0
+    pd.testing.assert_frame_equal(token_trades_df[['swapEth', 'tokenValue', 'orders']], expected)
+
+
+def test_token_trades_index_built_once(wallet_analyzer_with_data):
+    index_df = wallet_analyzer_with_data.get_token_trades_index()
+
+    assert wallet_analyzer_with_data.get_token_trades_index() is index_df
+    assert index_df[['snipe', 'inOut', 'otherType']].any().all()
+
+    # Built again for the new txs
+    wallet_analyzer_with_data.txs_df = wallet_analyzer_with_data.txs_df.iloc[:100]
+
+    assert wallet_analyzer_with_data.get_token_trades_index() is not index_df
+
+
+def test_move_weth_transactions(wallet_analyzer):
+    other_wallet = "0x3f5ce5fbfe3e9af3971dd833d26ba9b5c936f0be"
+    weth = wallet_analyzer.weth_address
+
+    wallet_analyzer.txs_df = pd.DataFrame({
+        'hash': ['0x1', '0x2', '0x3', '0x4'],
+        'txType': ['swap_tx_zero_value', 'swap_tx_zero_value', 'swap_tx_nonzero_value', 'approve'],
+        'value': [0.0, 0.0, 0.5, 0.0],
+    })
+    wallet_analyzer.token_txs_df = pd.DataFrame({
+        'hash': ['0x1', '0x1', '0x1', '0x2', '0x2', '0x3', '0x5'],
+        'blockNumber': [1, 1, 1, 2, 2, 3, 5],
+        'timeStamp': [10, 10, 10, 20, 20, 30, 50],
+        'from': [OWN_WALLET_ADDRESS, OWN_WALLET_ADDRESS, other_wallet, OWN_WALLET_ADDRESS, other_wallet, other_wallet,
+                 other_wallet],
+        'to': [other_wallet, other_wallet, OWN_WALLET_ADDRESS, other_wallet, OWN_WALLET_ADDRESS, OWN_WALLET_ADDRESS,
+               OWN_WALLET_ADDRESS],
+        'contractAddress': [weth, weth, '0xa', '0xb', weth, weth, weth],
+        'value': [0.1, 0.2, 100.0, 50.0, 0.3, 0.5, 0.7],
+        'tokenName': ['weth', 'weth', 'a', 'b', 'weth', 'weth', 'weth'],
+        'tokenSymbol': ['weth', 'weth', 'a', 'b', 'weth', 'weth', 'weth'],
+        'tokenDecimal': [18] * 7,
+    })
+    wallet_analyzer.internal_txs_df = pd.DataFrame()
+
+    wallet_analyzer.move_weth_transactions()
+
+    # WETH sent - buy with the sum of the sent WETH, WETH received - sell, ETH wrapped to WETH - not changed
+    assert wallet_analyzer.txs_df['txType'].tolist() == ['swap_tx_nonzero_value', 'swap_tx_zero_value',
+                                                         'swap_tx_nonzero_value', 'approve']
+    assert wallet_analyzer.txs_df['value'].tolist() == pytest.approx([0.3, 0.0, 0.5, 0.0])
+    assert wallet_analyzer.token_txs_df['contractAddress'].tolist() == ['0xa', '0xb']
+    assert wallet_analyzer.internal_txs_df[['hash', 'to', 'value']].values.tolist() == [
+        ['0x2', OWN_WALLET_ADDRESS, 0.3]]
+
+    info_df = wallet_analyzer.join_token_txs_info(wallet_analyzer.txs_df)
+
+    assert info_df['swapType'].tolist()[:2] == ['swap_buy', 'swap_sell']
+    assert info_df['swapEth'].tolist()[:2] == pytest.approx([0.3, 0.3])
+
+
+def test_move_weth_transactions_order_of_transfers(wallet_analyzer):
+    other_wallet = "0x3f5ce5fbfe3e9af3971dd833d26ba9b5c936f0be"
+    token_txs_df = pd.DataFrame({
+        'hash': ['0x1'] * 3,
+        'blockNumber': [1] * 3,
+        'timeStamp': [10] * 3,
+        'from': [OWN_WALLET_ADDRESS, other_wallet, OWN_WALLET_ADDRESS],
+        'to': [other_wallet, OWN_WALLET_ADDRESS, other_wallet],
+        'contractAddress': [wallet_analyzer.weth_address] * 3,
+        'value': [0.1, 0.05, 0.2],
+    })
+
+    results = []
+    for df in [token_txs_df, token_txs_df.iloc[::-1]]:
+        wallet_analyzer.txs_df = pd.DataFrame({'hash': ['0x1'], 'txType': ['swap_tx_zero_value'], 'value': [0.0]})
+        wallet_analyzer.token_txs_df = df
+        wallet_analyzer.internal_txs_df = pd.DataFrame()
+        wallet_analyzer.move_weth_transactions()
+        results.append(wallet_analyzer.txs_df)
+
+    pd.testing.assert_frame_equal(results[0], results[1])
+    assert results[0]['value'].tolist() == pytest.approx([0.3])
+
+
+def download_fixtures(self, actions, page_callback):
+    files = {'txlist': 'txs', 'tokentx': 'token_txs', 'txlistinternal': 'internal_txs'}
+    pages = {}
+    for action in actions:
+        with open(f'fixtures/{files[action]}.json', 'r') as file:
+            pages[action] = [page_callback(action, json.load(file))]
+    return pages
+
+
+@pytest.mark.parametrize('steps', ['separate', 'enrich'])
+@patch('src.download_wallet_txs.DataDownloader.download_concurrently', download_fixtures)
+def test_enrich_txs_same_as_baseline(steps):
+    # Snipes are compared with the daily average gas prices
+    wallet_analyzer = WalletAnalyzer('0xdEcfCe6476A66BF8Cb1a9f3005ce5496363A99de', CHAIN, gas_baseline=False)
+    wallet_analyzer.get_data()
+    wallet_analyzer.calculate_swap_txs()
+
+    with start_run('0x1') as run_report:
+        if steps == 'separate':
+            wallet_analyzer.check_token_transfers()
+            wallet_analyzer.check_internal_transfers()
+            wallet_analyzer.check_snipers()
+        else:
+            wallet_analyzer.enrich_txs()
+
+    # Full copies of the txs_df: one concat per step or one in total
+    assert run_report.stages_df()['frameCopies'].sum() == (2 if steps == 'separate' else 1)
+
+    # Enriched txs_df of the fixtures created by the step by step enrichment before enrich_txs was added, both are
+    # compared as written to a csv file (the dtypes are not compared)
+    expected_df = pd.read_csv('fixtures/enriched_txs_df.csv')
+    txs_df = pd.read_csv(io.StringIO(wallet_analyzer.txs_df.to_csv(index=False)))
+
+    pd.testing.assert_frame_equal(txs_df, expected_df, check_dtype=False)
+    assert {'tokens_transfer_in', 'tokens_transfer_out', 'eth_other_transfer_in'} <= set(txs_df['txType'])
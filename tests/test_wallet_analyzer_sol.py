@@ -0,0 +1,134 @@
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.solana_store import SolanaStore
+from src.wallet_analyzer_sol import SOL_MINT, TXS_COLUMNS, SolanaWalletAnalyzer
+from test_download_wallet_txs import mock_helius_response
+
+WALLET = 'WaLLet1111111111111111111111111111111111111'
+
+
+@pytest.fixture
+def wallet_analyzer():
+    return SolanaWalletAnalyzer(WALLET)
+
+
+def random_txs(stablecoin: str, txs_number: int = 500, seed: int = 0) -> list:
+    """Helius parsed txs: swaps, SOL and token transfers between the wallet and other accounts"""
+    rng = np.random.default_rng(seed)
+    accounts = [WALLET, 'pool', 'other']
+    mints = [SOL_MINT, 'token1', 'token2pump', stablecoin, '', None]
+
+    txs = []
+    for i in range(txs_number):
+        token_transfers = [{'fromUserAccount': rng.choice(accounts), 'toUserAccount': rng.choice(accounts),
+                            'mint': mints[rng.integers(len(mints))], 'tokenAmount': float(rng.integers(1, 1000))}
+                           for _ in range(rng.choice([0, 1, 1, 2, 2, 2, 3]))]
+        native_transfers = [{'fromUserAccount': rng.choice(accounts), 'toUserAccount': rng.choice(accounts),
+                             'amount': int(rng.integers(1, 10 ** 10))} for _ in range(rng.integers(1, 3))]
+        tx = {'signature': f'sig{i}', 'timestamp': 1700000000 - i, 'fee': 5000, 'type': rng.choice(
+            ['SWAP', 'TRANSFER', 'UNKNOWN']), 'tokenTransfers': token_transfers, 'nativeTransfers': native_transfers}
+        if rng.random() < 0.05:
+            del tx['tokenTransfers']
+        txs.append(tx)
+
+    return txs
+
+
+def parse_txs_by_row(wallet_analyzer, transactions):
+    """Previous parser: get_swap_info and classify_tx for every tx"""
+    rows = []
+    for txn in transactions:
+        swap_type, sol_amount, token_amount, traded_token = wallet_analyzer.get_swap_info(txn)
+        tx_type, tx_from, tx_to, value = wallet_analyzer.classify_tx(txn, swap_type, sol_amount, traded_token)
+        rows.append({'hash': txn['signature'], 'timeStamp': txn['timestamp'], 'txFee': txn['fee'] / 10 ** 9,
+                     'txType': tx_type, 'from': tx_from, 'to': tx_to, 'value': value, 'swapType': swap_type,
+                     'swapEth': abs(sol_amount), 'price': sol_amount / token_amount if token_amount != 0 else None,
+                     'tokenValue': abs(token_amount), 'tokenName': traded_token, 'tokenSymbol': None,
+                     'tokenCa': traded_token, 'tokenDecimal': 12.0, 'gasPrice': 1, 'gasUsed': 1, 'snipe': False})
+
+    return pd.DataFrame(rows, columns=TXS_COLUMNS)
+
+
+def test_parse_txs_same_as_per_tx_classification(wallet_analyzer):
+    transactions = random_txs(wallet_analyzer.stablecoins[0])
+
+    txs_df = wallet_analyzer.parse_txs(transactions)
+    expected_df = parse_txs_by_row(wallet_analyzer, transactions)
+
+    assert {'swap', 'pumpfun_swap', 'eth_transfer_in', 'eth_transfer_out', 'stablecoins_transfer_in',
+            'stablecoins_transfer_out', 'other'} <= set(txs_df['txType'])
+    pd.testing.assert_frame_equal(txs_df, expected_df, check_dtype=False)
+
+
+def test_parse_txs_empty(wallet_analyzer):
+    txs_df = wallet_analyzer.parse_txs([])
+
+    assert len(txs_df) == 0
+    assert list(txs_df.columns) == TXS_COLUMNS
+
+
+@patch('src.download_wallet_txs.get_session')
+def test_incremental_sync(get_session, tmp_path):
+    mock_request = get_session.return_value.request
+    store = SolanaStore(str(tmp_path))
+    wallet_analyzer = SolanaWalletAnalyzer(WALLET, incremental=True, solana_store=store)
+    txs = random_txs(wallet_analyzer.stablecoins[0], 1050)
+    mock_request.side_effect = mock_helius_response(txs)
+
+    wallet_analyzer.get_data(max_txs=300)
+    assert list(wallet_analyzer.txs_df['hash']) == [tx['signature'] for tx in txs[:300]]
+
+    # Only the new txs are downloaded
+    new_txs = random_txs(wallet_analyzer.stablecoins[0], 20, seed=1)
+    for tx in new_txs:
+        tx['signature'] = 'new' + tx['signature']
+    txs = new_txs + txs
+    mock_request.side_effect = mock_helius_response(txs)
+    mock_request.reset_mock()
+
+    wallet_analyzer.get_data(max_txs=300)
+    assert list(wallet_analyzer.txs_df['hash']) == [tx['signature'] for tx in txs[:320]]
+    assert [call.kwargs['params'].get('until') for call in mock_request.call_args_list
+            if call.args[0] == 'GET'] == ['sig0']
+
+    # The older history is downloaded once more txs are needed
+    wallet_analyzer.get_data(max_txs=500)
+    assert len(wallet_analyzer.txs_df) == 500
+    assert store.load_state(WALLET)['complete'] is False
+
+    wallet_analyzer.get_data(max_txs=0)
+    state = store.load_state(WALLET)
+    assert (state['newest_signature'], state['oldest_signature'], state['complete']) == ('newsig0', 'sig1049', True)
+    pd.testing.assert_frame_equal(wallet_analyzer.txs_df, wallet_analyzer.parse_txs(txs), check_dtype=False)
+
+    mock_request.reset_mock()
+    wallet_analyzer.load_txs_df(columns=['hash', 'txType'])
+    assert list(wallet_analyzer.txs_df.columns) == ['hash', 'txType'] and len(wallet_analyzer.txs_df) == 1070
+    mock_request.assert_not_called()
+
+
+@patch('src.download_wallet_txs.get_session')
+def test_incremental_sync_error(get_session, tmp_path):
+    mock_request = get_session.return_value.request
+    store = SolanaStore(str(tmp_path))
+    wallet_analyzer = SolanaWalletAnalyzer(WALLET, incremental=True, solana_store=store)
+    txs = random_txs(wallet_analyzer.stablecoins[0], 1050)
+    mock_request.side_effect = mock_helius_response(txs)
+
+    wallet_analyzer.get_data(max_txs=300)
+    state = store.load_state(WALLET)
+
+    # One slice of the older txs fails, nothing is stored and the synced range does not move
+    mock_request.side_effect = mock_helius_response(txs, failed_signature='sig699')
+    with pytest.raises(ValueError):
+        wallet_analyzer.get_data(max_txs=0)
+    assert store.load_state(WALLET) == state
+
+    # The history is complete only once all the slices are downloaded
+    mock_request.side_effect = mock_helius_response(txs)
+    wallet_analyzer.get_data(max_txs=0)
+    assert store.load_state(WALLET)['complete'] is True
+    assert list(wallet_analyzer.txs_df['hash']) == [tx['signature'] for tx in txs]